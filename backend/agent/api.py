@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 from .handlers.versioning.api import router as agent_versioning_router
-from .utils import initialize, cleanup
+from .utils import initialize, cleanup, restore_running_agent_runs
 from .handlers.agent_runs import router as agent_runs_router
 from .handlers.agent_crud import router as agent_crud_router
 from .handlers.agent_tools import router as agent_tools_router
@@ -19,5 +19,5 @@ router.include_router(agent_json_router)
 router.include_router(threads_router)
 router.include_router(projects_router)
 
-# Re-export the initialize and cleanup functions
-__all__ = ['router', 'initialize', 'cleanup']
\ No newline at end of file
+# Re-export the initialize, cleanup and orphaned run recovery functions
+__all__ = ['router', 'initialize', 'cleanup', 'restore_running_agent_runs']
\ No newline at end of file
@@ -261,3 +261,38 @@ def _extract_agentpress_tools_for_run(agentpress_config: Dict[str, Any]) -> Dict
     return run_tools
 
 
+
+
+def get_agent_tool_defaults() -> Dict[str, Dict[str, bool]]:
+    """Agentpress tools that extract_agent_config uses instead of the current version's.
+
+    Keyed like the agent_tool_defaults table: Suna default agents take the
+    central SUNA_CONFIG tools, agents without a version the default tool set.
+    """
+    from agent.suna_config import SUNA_CONFIG
+
+    return {
+        kind: {
+            tool_name: bool(tool_config.get('enabled', False))
+            for tool_name, tool_config in _extract_agentpress_tools_for_run(tools).items()
+        }
+        for kind, tools in (
+            ('suna_default', SUNA_CONFIG['agentpress_tools']),
+            ('no_version', _get_default_agentpress_tools()),
+        )
+    }
+
+
+async def sync_agent_tool_defaults(client) -> None:
+    """Write get_agent_tool_defaults to the agent_tool_defaults table.
+
+    The database computes the tool facets used to filter and sort agent
+    listings from it, so it must follow the tools defined here.
+    """
+    try:
+        await client.table('agent_tool_defaults').upsert([
+            {'kind': kind, 'agentpress_tools': tools}
+            for kind, tools in get_agent_tool_defaults().items()
+        ]).execute()
+    except Exception as e:
+        logger.warning(f"Failed to sync agent tool defaults: {str(e)}")
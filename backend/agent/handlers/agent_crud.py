@@ -510,6 +510,7 @@ async def get_agents(
     user_id: str = Depends(verify_and_get_user_id_from_jwt),
     page: Optional[int] = Query(1, ge=1, description="Page number (1-based)"),
     limit: Optional[int] = Query(20, ge=1, le=100, description="Number of items per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page; faster than page for deep pages"),
     search: Optional[str] = Query(None, description="Search in name and description"),
     sort_by: Optional[str] = Query("created_at", description="Sort field: name, created_at, updated_at, tools_count"),
     sort_order: Optional[str] = Query("desc", description="Sort order: asc, desc"),
@@ -531,7 +532,8 @@ async def get_agents(
         
         pagination_params = PaginationParams(
             page=page,
-            page_size=limit
+            page_size=limit,
+            cursor=cursor
         )
         
         filters = AgentFilters(
@@ -566,7 +568,8 @@ async def get_agents(
                 total_items=paginated_result.pagination.total_items,
                 total_pages=paginated_result.pagination.total_pages,
                 has_next=paginated_result.pagination.has_next,
-                has_previous=paginated_result.pagination.has_previous
+                has_previous=paginated_result.pagination.has_previous,
+                next_cursor=paginated_result.pagination.next_cursor
             )
         )
         
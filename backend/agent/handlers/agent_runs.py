@@ -12,9 +12,12 @@ from utils.auth_utils import verify_and_get_user_id_from_jwt, get_user_id_from_s
 from utils.logger import logger, structlog
 from services.billing import check_billing_status, can_use_model
 from utils.config import config
-from services import redis
+from services import redis, active_runs, run_scheduler
+from services.run_stream import (
+    RunResponseStream, CONTROL_FIELD, DATA_FIELD, TERMINAL_STATUSES, parse_entry_id, response_status, hub as run_stream_hub
+)
 from sandbox.sandbox import create_sandbox, delete_sandbox
-from run_agent_background import run_agent_background
+from run_agent_background import update_agent_run_status
 from models import model_manager
 
 from ..models import AgentStartRequest, AgentVersionResponse, AgentResponse, ThreadAgentResponse, InitiateAgentResponse
@@ -225,18 +228,27 @@ async def start_agent(
         await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
     except Exception as e:
         logger.warning(f"Failed to register agent run in Redis ({instance_key}): {str(e)}")
+    try:
+        await active_runs.register_run(account_id, agent_run_id, thread_id)
+    except Exception as e:
+        logger.warning(f"Failed to add agent run {agent_run_id} to active runs of {account_id}: {str(e)}")
 
     request_id = structlog.contextvars.get_contextvars().get('request_id')
 
-    run_agent_background.send(
-        agent_run_id=agent_run_id, thread_id=thread_id, instance_id=utils.instance_id,
-        project_id=project_id,
-        model_name=model_name,  # Already resolved above
-        enable_thinking=body.enable_thinking, reasoning_effort=body.reasoning_effort,
-        stream=body.stream, enable_context_manager=body.enable_context_manager,
-        agent_config=agent_config,  # Pass agent configuration
-        request_id=request_id,
-    )
+    try:
+        await run_scheduler.submit(
+            account_id, agent_run_id,
+            thread_id=thread_id, instance_id=utils.instance_id,
+            project_id=project_id,
+            model_name=model_name,  # Already resolved above
+            enable_thinking=body.enable_thinking, reasoning_effort=body.reasoning_effort,
+            stream=body.stream, enable_context_manager=body.enable_context_manager,
+            agent_config=agent_config,  # Pass agent configuration
+            request_id=request_id,
+        )
+    except run_scheduler.RunQueueFullError as e:
+        await update_agent_run_status(client, agent_run_id, "failed", error=str(e))
+        raise HTTPException(status_code=429, detail={"message": str(e)})
 
     return {"agent_run_id": agent_run_id, "status": "running"}
 
@@ -434,9 +446,14 @@ async def get_thread_agent(thread_id: str, user_id: str = Depends(verify_and_get
 async def stream_agent_run(
     agent_run_id: str,
     token: Optional[str] = None,
+    last_event_id: Optional[str] = None,
     request: Request = None
 ):
-    """Stream the responses of an agent run using Redis Lists and Pub/Sub."""
+    """Stream the responses of an agent run from its Redis Stream.
+
+    Each SSE event carries the stream entry ID, so a reconnecting client can
+    resume after its Last-Event-ID header (or last_event_id query parameter).
+    """
     logger.debug(f"Starting stream for agent run: {agent_run_id}")
     client = await utils.db.client
 
@@ -448,159 +465,92 @@ async def stream_agent_run(
         user_id=user_id,
     )
 
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    response_channel = f"agent_run:{agent_run_id}:new_response"
-    control_channel = f"agent_run:{agent_run_id}:control" # Global control channel
+    resume_after_id = (request.headers.get("last-event-id") if request else None) or last_event_id
+    if resume_after_id:
+        try:
+            parse_entry_id(resume_after_id)
+        except ValueError:
+            logger.warning(f"Ignoring malformed Last-Event-ID '{resume_after_id}' for {agent_run_id}")
+            resume_after_id = None
+    response_stream = RunResponseStream(agent_run_id)
+
+    def format_entry(entry_id: str, fields: dict):
+        """Return (sse_frame, terminate) for a stream entry."""
+        if CONTROL_FIELD in fields:
+            control_signal = fields[CONTROL_FIELD]
+            logger.debug(f"Received control signal '{control_signal}' for {agent_run_id}")
+            return f"id: {entry_id}\ndata: {json.dumps({'type': 'status', 'status': control_signal})}\n\n", True
+        # Stored responses are already JSON; forward them as-is
+        response_json = fields[DATA_FIELD]
+        status = response_status(response_json)
+        terminate = status in TERMINAL_STATUSES
+        if terminate:
+            logger.debug(f"Detected run completion via status message in stream: {status}")
+        return f"id: {entry_id}\ndata: {response_json}\n\n", terminate
 
     async def stream_generator(agent_run_data):
-        logger.debug(f"Streaming responses for {agent_run_id} using Redis list {response_list_key} and channel {response_channel}")
-        last_processed_index = -1
-        # Single pubsub used for response + control
-        listener_task = None
-        terminate_stream = False
+        logger.debug(f"Streaming responses for {agent_run_id} using Redis stream {response_stream.key} (resume after: {resume_after_id})")
+        last_yielded_id = resume_after_id
+        queue = None
         initial_yield_complete = False
 
         try:
-            # 1. Fetch and yield initial responses from Redis list
-            initial_responses_json = await redis.lrange(response_list_key, 0, -1)
-            initial_responses = []
-            if initial_responses_json:
-                initial_responses = [json.loads(r) for r in initial_responses_json]
-                logger.debug(f"Sending {len(initial_responses)} initial responses for {agent_run_id}")
-                for response in initial_responses:
-                    yield f"data: {json.dumps(response)}\n\n"
-                last_processed_index = len(initial_responses) - 1
-            initial_yield_complete = True
-
-            # 2. Check run status
+            # 1. Join the shared consumer first so nothing appended after the backlog read is missed
             current_status = agent_run_data.get('status') if agent_run_data else None
+            if current_status == 'running':
+                queue = await run_stream_hub.subscribe(agent_run_id)
+
+            # 2. Yield the backlog after the client's last seen entry
+            backlog = await response_stream.read(after_id=resume_after_id)
+            if backlog:
+                logger.debug(f"Sending {len(backlog)} initial responses for {agent_run_id}")
+            for entry_id, fields in backlog:
+                frame, terminate = format_entry(entry_id, fields)
+                yield frame
+                last_yielded_id = entry_id
+                if terminate:
+                    return
+            initial_yield_complete = True
 
+            # 3. Check run status
             if current_status != 'running':
                 logger.debug(f"Agent run {agent_run_id} is not running (status: {current_status}). Ending stream.")
                 yield f"data: {json.dumps({'type': 'status', 'status': 'completed'})}\n\n"
                 return
-          
+
             structlog.contextvars.bind_contextvars(
                 thread_id=agent_run_data.get('thread_id'),
             )
 
-            # 3. Use a single Pub/Sub connection subscribed to both channels
-            pubsub = await redis.create_pubsub()
-            await pubsub.subscribe(response_channel, control_channel)
-            logger.debug(f"Subscribed to channels: {response_channel}, {control_channel}")
-
-            # Queue to communicate between listeners and the main generator loop
-            message_queue = asyncio.Queue()
-
-            async def listen_messages():
-                listener = pubsub.listen()
-                task = asyncio.create_task(listener.__anext__())
+            # 4. Yield new entries fanned out by the shared consumer, skipping any already sent
+            while True:
+                entry = await queue.get()
+                if entry is None:
+                    logger.error(f"Stream consumer failed for {agent_run_id}")
+                    yield f"data: {json.dumps({'type': 'status', 'status': 'error'})}\n\n"
+                    break
 
-                while not terminate_stream:
-                    done, _ = await asyncio.wait([task], return_when=asyncio.FIRST_COMPLETED)
-                    for finished in done:
-                        try:
-                            message = finished.result()
-                            if message and isinstance(message, dict) and message.get("type") == "message":
-                                channel = message.get("channel")
-                                data = message.get("data")
-                                if isinstance(data, bytes):
-                                    data = data.decode('utf-8')
-
-                                if channel == response_channel and data == "new":
-                                    await message_queue.put({"type": "new_response"})
-                                elif channel == control_channel and data in ["STOP", "END_STREAM", "ERROR"]:
-                                    logger.debug(f"Received control signal '{data}' for {agent_run_id}")
-                                    await message_queue.put({"type": "control", "data": data})
-                                    return  # Stop listening on control signal
-
-                        except StopAsyncIteration:
-                            logger.warning(f"Listener stopped for {agent_run_id}.")
-                            await message_queue.put({"type": "error", "data": "Listener stopped unexpectedly"})
-                            return
-                        except Exception as e:
-                            logger.error(f"Error in listener for {agent_run_id}: {e}")
-                            await message_queue.put({"type": "error", "data": "Listener failed"})
-                            return
-                        finally:
-                            # Resubscribe to the next message if continuing
-                            if not terminate_stream:
-                                task = asyncio.create_task(listener.__anext__())
-
-
-            listener_task = asyncio.create_task(listen_messages())
-
-            # 4. Main loop to process messages from the queue
-            while not terminate_stream:
-                try:
-                    queue_item = await message_queue.get()
-
-                    if queue_item["type"] == "new_response":
-                        # Fetch new responses from Redis list starting after the last processed index
-                        new_start_index = last_processed_index + 1
-                        new_responses_json = await redis.lrange(response_list_key, new_start_index, -1)
-
-                        if new_responses_json:
-                            new_responses = [json.loads(r) for r in new_responses_json]
-                            num_new = len(new_responses)
-                            # logger.debug(f"Received {num_new} new responses for {agent_run_id} (index {new_start_index} onwards)")
-                            for response in new_responses:
-                                yield f"data: {json.dumps(response)}\n\n"
-                                # Check if this response signals completion
-                                if response.get('type') == 'status' and response.get('status') in ['completed', 'failed', 'stopped']:
-                                    logger.debug(f"Detected run completion via status message in stream: {response.get('status')}")
-                                    terminate_stream = True
-                                    break # Stop processing further new responses
-                            last_processed_index += num_new
-                        if terminate_stream: break
-
-                    elif queue_item["type"] == "control":
-                        control_signal = queue_item["data"]
-                        terminate_stream = True # Stop the stream on any control signal
-                        yield f"data: {json.dumps({'type': 'status', 'status': control_signal})}\n\n"
-                        break
-
-                    elif queue_item["type"] == "error":
-                        logger.error(f"Listener error for {agent_run_id}: {queue_item['data']}")
-                        terminate_stream = True
-                        yield f"data: {json.dumps({'type': 'status', 'status': 'error'})}\n\n"
-                        break
-
-                except asyncio.CancelledError:
-                     logger.debug(f"Stream generator main loop cancelled for {agent_run_id}")
-                     terminate_stream = True
-                     break
-                except Exception as loop_err:
-                    logger.error(f"Error in stream generator main loop for {agent_run_id}: {loop_err}", exc_info=True)
-                    terminate_stream = True
-                    yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Stream failed: {loop_err}'})}\n\n"
+                entry_id, fields = entry
+                if last_yielded_id and parse_entry_id(entry_id) <= parse_entry_id(last_yielded_id):
+                    continue
+                frame, terminate = format_entry(entry_id, fields)
+                yield frame
+                last_yielded_id = entry_id
+                if terminate:
                     break
 
+        except asyncio.CancelledError:
+            logger.debug(f"Stream generator cancelled for {agent_run_id}")
         except Exception as e:
-            logger.error(f"Error setting up stream for agent run {agent_run_id}: {e}", exc_info=True)
-            # Only yield error if initial yield didn't happen
+            logger.error(f"Error streaming agent run {agent_run_id}: {e}", exc_info=True)
             if not initial_yield_complete:
-                 yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Failed to start stream: {e}'})}\n\n"
+                yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Failed to start stream: {e}'})}\n\n"
+            else:
+                yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Stream failed: {e}'})}\n\n"
         finally:
-            terminate_stream = True
-            # Graceful shutdown order: unsubscribe → close → cancel
-            try:
-                if 'pubsub' in locals() and pubsub:
-                    await pubsub.unsubscribe(response_channel, control_channel)
-                    await pubsub.close()
-            except Exception as e:
-                logger.debug(f"Error during pubsub cleanup for {agent_run_id}: {e}")
-
-            if listener_task:
-                listener_task.cancel()
-                try:
-                    await listener_task  # Reap inner tasks & swallow their errors
-                except asyncio.CancelledError:
-                    pass
-                except Exception as e:
-                    logger.debug(f"listener_task ended with: {e}")
-            # Wait briefly for tasks to cancel
-            await asyncio.sleep(0.1)
+            if queue is not None:
+                run_stream_hub.unsubscribe(agent_run_id, queue)
+                logger.debug(f"Run stream hub stats: {run_stream_hub.stats()}")
             logger.debug(f"Streaming cleanup complete for agent run: {agent_run_id}")
 
     return StreamingResponse(stream_generator(agent_run_data), media_type="text/event-stream", headers={
@@ -750,7 +700,6 @@ async def initiate_agent_with_files(
         raise HTTPException(status_code=402, detail={"message": message, "subscription": subscription})
 
     # Check agent run limit (maximum parallel runs in past 24 hours)
-    limit_check = await check_agent_run_limit(client, account_id)
     if not limit_check['can_start']:
         error_detail = {
             "message": f"Maximum of {config.MAX_PARALLEL_AGENT_RUNS} parallel agent runs allowed within 24 hours. You currently have {limit_check['running_count']} running.",
@@ -961,22 +910,33 @@ async def initiate_agent_with_files(
             await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
         except Exception as e:
             logger.warning(f"Failed to register agent run in Redis ({instance_key}): {str(e)}")
+        try:
+            await active_runs.register_run(account_id, agent_run_id, thread_id)
+        except Exception as e:
+            logger.warning(f"Failed to add agent run {agent_run_id} to active runs of {account_id}: {str(e)}")
 
         request_id = structlog.contextvars.get_contextvars().get('request_id')
 
         # Run agent in background
-        run_agent_background.send(
-            agent_run_id=agent_run_id, thread_id=thread_id, instance_id=utils.instance_id,
-            project_id=project_id,
-            model_name=model_name,  # Already resolved above
-            enable_thinking=enable_thinking, reasoning_effort=reasoning_effort,
-            stream=stream, enable_context_manager=enable_context_manager,
-            agent_config=agent_config,  # Pass agent configuration
-            request_id=request_id,
-        )
+        try:
+            await run_scheduler.submit(
+                account_id, agent_run_id,
+                thread_id=thread_id, instance_id=utils.instance_id,
+                project_id=project_id,
+                model_name=model_name,  # Already resolved above
+                enable_thinking=enable_thinking, reasoning_effort=reasoning_effort,
+                stream=stream, enable_context_manager=enable_context_manager,
+                agent_config=agent_config,  # Pass agent configuration
+                request_id=request_id,
+            )
+        except run_scheduler.RunQueueFullError as e:
+            await update_agent_run_status(client, agent_run_id, "failed", error=str(e))
+            raise HTTPException(status_code=429, detail={"message": str(e)})
 
         return {"thread_id": thread_id, "agent_run_id": agent_run_id}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in agent initiation: {str(e)}\n{traceback.format_exc()}")
         # TODO: Clean up created project/thread if initiation fails mid-way
@@ -4,6 +4,8 @@ from utils.logger import logger
 from agent.config_helper import extract_agent_config
 from utils.query_utils import batch_query_in
 
+AGENT_SORT_COLUMNS = ("name", "created_at", "updated_at", "tools_count")
+
 
 class AgentFilters:
     def __init__(
@@ -57,25 +59,43 @@ class AgentService:
         pagination_params: PaginationParams,
         filters: AgentFilters
     ) -> PaginatedResponse[Dict[str, Any]]:
-        """Get only agents (not templates) with pagination"""
+        """Get only agents (not templates) with pagination.
+
+        Tool filters and the tools_count sort use the facet columns kept on
+        agents by trigger_agents_tool_facets, so everything runs in the DB.
+        """
         base_query = self._build_base_query(user_id, filters)
         count_query = self._build_count_query(user_id, filters)
+        sort_column = filters.sort_by if filters.sort_by in AGENT_SORT_COLUMNS else "created_at"
+        descending = filters.sort_order == "desc"
         
-        needs_post_processing = (
-            filters.has_mcp_tools is not None or 
-            filters.has_agentpress_tools is not None or 
-            len(filters.tools) > 0 or
-            filters.sort_by == "tools_count"
-        )
-        
-        if needs_post_processing:
-            return await self._get_agents_with_complex_filtering(
-                user_id, pagination_params, filters, base_query
+        if pagination_params.cursor or pagination_params.page == 1:
+            paginated_result = await PaginationService.paginate_keyset(
+                base_query=base_query,
+                params=pagination_params,
+                sort_field=sort_column,
+                descending=descending,
+                id_field="agent_id",
+                count_query=count_query
             )
         else:
-            return await self._get_agents_database_paginated(
-                base_query, count_query, pagination_params, filters
+            # Page numbers without a cursor still work, at OFFSET cost
+            paginated_result = await PaginationService.paginate_database_query(
+                base_query=base_query.order(sort_column, desc=descending).order("agent_id", desc=descending),
+                params=pagination_params,
+                count_query=count_query
             )
+        
+        version_map = await self._load_agent_versions_batch(paginated_result.data)
+        agent_responses = []
+        for agent_data in paginated_result.data:
+            agent_response = await self._transform_agent_data(agent_data, version_map.get(agent_data['agent_id']))
+            agent_responses.append(agent_response)
+        
+        return PaginatedResponse(
+            data=agent_responses,
+            pagination=paginated_result.pagination
+        )
 
     async def _get_user_templates_paginated(
         self,
@@ -127,9 +147,7 @@ class AgentService:
             logger.error(f"Error fetching templates for user {user_id}: {e}", exc_info=True)
             raise
 
-    def _build_base_query(self, user_id: str, filters: AgentFilters):
-        query = self.db.table('agents').select('*').eq("account_id", user_id)
-        
+    def _apply_filters(self, query, filters: AgentFilters):
         if filters.search:
             search_term = f"%{filters.search}%"
             query = query.or_(f"name.ilike.{search_term},description.ilike.{search_term}")
@@ -137,92 +155,25 @@ class AgentService:
         if filters.has_default is not None:
             query = query.eq("is_default", filters.has_default)
         
-        if filters.sort_by != "tools_count":
-            sort_column = filters.sort_by if filters.sort_by in ["name", "created_at", "updated_at"] else "created_at"
-            query = query.order(sort_column, desc=(filters.sort_order == "desc"))
+        if filters.has_mcp_tools is not None:
+            query = query.eq("has_mcp_tools", filters.has_mcp_tools)
         
-        return query
-
-    def _build_count_query(self, user_id: str, filters: AgentFilters):
-        query = self.db.table('agents').select('*', count='exact').eq("account_id", user_id)
+        if filters.has_agentpress_tools is not None:
+            query = query.eq("has_agentpress_tools", filters.has_agentpress_tools)
         
-        if filters.search:
-            search_term = f"%{filters.search}%"
-            query = query.or_(f"name.ilike.{search_term},description.ilike.{search_term}")
+        if filters.tools:
+            # Agents with any of the requested tools
+            query = query.overlaps("tool_names", filters.tools)
         
-        if filters.has_default is not None:
-            query = query.eq("is_default", filters.has_default)
-            
         return query
 
-    async def _get_agents_database_paginated(
-        self, 
-        base_query, 
-        count_query, 
-        pagination_params: PaginationParams,
-        filters: AgentFilters
-    ) -> PaginatedResponse[Dict[str, Any]]:
-        paginated_result = await PaginationService.paginate_database_query(
-            base_query=base_query,
-            params=pagination_params,
-            count_query=count_query
-        )
-        
-        agent_responses = []
-        for agent_data in paginated_result.data:
-            agent_response = await self._transform_agent_data(agent_data)
-            agent_responses.append(agent_response)
-        
-        return PaginatedResponse(
-            data=agent_responses,
-            pagination=paginated_result.pagination
-        )
+    def _build_base_query(self, user_id: str, filters: AgentFilters):
+        query = self.db.table('agents').select('*').eq("account_id", user_id)
+        return self._apply_filters(query, filters)
 
-    async def _get_agents_with_complex_filtering(
-        self,
-        user_id: str,
-        pagination_params: PaginationParams, 
-        filters: AgentFilters,
-        base_query
-    ) -> PaginatedResponse[Dict[str, Any]]:
-        all_agents_result = await base_query.execute()
-        all_agents = all_agents_result.data or []
-        
-        if not all_agents:
-            return PaginatedResponse(
-                data=[],
-                pagination=PaginationService.PaginationMeta(
-                    current_page=pagination_params.page,
-                    page_size=pagination_params.page_size,
-                    total_items=0,
-                    total_pages=0,
-                    has_next=False,
-                    has_previous=False
-                )
-            )
-        
-        version_map = await self._load_agent_versions_batch(all_agents)
-        
-        filtered_agents = []
-        for agent_data in all_agents:
-            if await self._passes_complex_filters(agent_data, version_map, filters):
-                filtered_agents.append(agent_data)
-        
-        if filters.sort_by == "tools_count":
-            filtered_agents = await self._sort_by_tools_count(filtered_agents, version_map)
-        elif filters.sort_order == "desc":
-            filtered_agents.reverse()
-        
-        # Transform to proper response format
-        agent_responses = []
-        for agent_data in filtered_agents:
-            agent_response = await self._transform_agent_data(agent_data, version_map.get(agent_data['agent_id']))
-            agent_responses.append(agent_response)
-        
-        return await PaginationService.paginate_filtered_dataset(
-            all_items=agent_responses,
-            params=pagination_params
-        )
+    def _build_count_query(self, user_id: str, filters: AgentFilters):
+        query = self.db.table('agents').select('agent_id', count='exact').eq("account_id", user_id)
+        return self._apply_filters(query, filters)
 
     async def _load_agent_versions_batch(self, agents: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
         version_map = {}
@@ -263,69 +214,6 @@ class AgentService:
         
         return version_map
 
-    async def _passes_complex_filters(
-        self, 
-        agent_data: Dict[str, Any], 
-        version_map: Dict[str, Dict[str, Any]], 
-        filters: AgentFilters
-    ) -> bool:
-        version_data = version_map.get(agent_data['agent_id'])
-        agent_config = extract_agent_config(agent_data, version_data)
-        
-        configured_mcps = agent_config['configured_mcps']
-        agentpress_tools = agent_config['agentpress_tools']
-        
-        if filters.has_mcp_tools is not None:
-            has_mcp = bool(configured_mcps and len(configured_mcps) > 0)
-            if filters.has_mcp_tools != has_mcp:
-                return False
-        
-        if filters.has_agentpress_tools is not None:
-            has_enabled_tools = any(
-                tool_data and isinstance(tool_data, dict) and tool_data.get('enabled', False)
-                for tool_data in agentpress_tools.values()
-            )
-            if filters.has_agentpress_tools != has_enabled_tools:
-                return False
-        
-        if filters.tools:
-            agent_tools = set()
-
-            for mcp in configured_mcps:
-                if isinstance(mcp, dict) and 'name' in mcp:
-                    agent_tools.add(f"mcp:{mcp['name']}")
-            
-            for tool_name, tool_data in agentpress_tools.items():
-                if tool_data and isinstance(tool_data, dict) and tool_data.get('enabled', False):
-                    agent_tools.add(f"agentpress:{tool_name}")
-            
-            if not any(tool in agent_tools for tool in filters.tools):
-                return False
-        
-        return True
-
-    async def _sort_by_tools_count(
-        self, 
-        agents: List[Dict[str, Any]], 
-        version_map: Dict[str, Dict[str, Any]]
-    ) -> List[Dict[str, Any]]:
-        def get_tools_count(agent_data):
-            version_data = version_map.get(agent_data['agent_id'])
-            agent_config = extract_agent_config(agent_data, version_data)
-            
-            configured_mcps = agent_config['configured_mcps']
-            agentpress_tools = agent_config['agentpress_tools']
-            
-            mcp_count = len(configured_mcps) if configured_mcps else 0
-            agentpress_count = sum(
-                1 for tool_data in agentpress_tools.values()
-                if tool_data and isinstance(tool_data, dict) and tool_data.get('enabled', False)
-            ) if agentpress_tools else 0
-            
-            return mcp_count + agentpress_count
-        
-        return sorted(agents, key=get_tools_count, reverse=True)
-
     async def _transform_agent_data(
         self, 
         agent_data: Dict[str, Any], 
@@ -1,86 +1,86 @@
 import json
+import hashlib
 import traceback
 import uuid
 from datetime import datetime, timezone
-from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends, Form, Query
+from typing import Optional, Dict, Any, List, AsyncIterator
+from fastapi import APIRouter, HTTPException, Depends, Form, Query, Request, Response
+from fastapi.responses import StreamingResponse
 
 from utils.auth_utils import verify_and_get_user_id_from_jwt, verify_and_authorize_thread_access, require_thread_access, AuthorizedThreadAccess
 from utils.logger import logger
+from utils.pagination import PaginationService, PaginationParams
 from sandbox.sandbox import create_sandbox, delete_sandbox
+from agentpress.message_cache import invalidate_thread_messages
 
 from ..models import CreateThreadResponse, MessageCreateRequest
 from .. import utils
 
 router = APIRouter()
 
+# Only the fields the thread list returns, with the project embedded in the same query
+THREAD_LIST_COLUMNS = (
+    "thread_id, account_id, project_id, metadata, is_public, created_at, updated_at, "
+    "project:projects(project_id, account_id, name, description, sandbox, is_public, created_at, updated_at)"
+)
+
+
+def _json_response_with_etag(request: Request, body: Dict[str, Any]) -> Response:
+    """Serialize body with an ETag; 304 when the client's If-None-Match matches."""
+    payload = json.dumps(body, separators=(",", ":"), default=str).encode()
+    etag = f'W/"{hashlib.sha256(payload).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+
 @router.get("/threads")
 async def get_user_threads(
+    request: Request,
     user_id: str = Depends(verify_and_get_user_id_from_jwt),
     page: Optional[int] = Query(1, ge=1, description="Page number (1-based)"),
-    limit: Optional[int] = Query(1000, ge=1, le=1000, description="Number of items per page (max 1000)")
+    limit: Optional[int] = Query(1000, ge=1, le=1000, description="Number of items per page (max 1000)"),
+    cursor: Optional[str] = Query(None, description="pagination.next_cursor of the previous page; faster than page for deep pages")
 ):
-    """Get all threads for the current user with associated project data."""
-    logger.debug(f"Fetching threads with project data for user: {user_id} (page={page}, limit={limit})")
+    """Get the current user's threads with associated project data, newest first.
+    
+    Pages are read by (created_at, thread_id) position; pass pagination.next_cursor
+    back as cursor to get the next page. The response carries an ETag, and a
+    request with a matching If-None-Match gets 304 Not Modified.
+    """
+    logger.debug(f"Fetching threads with project data for user: {user_id} (page={page}, limit={limit}, cursor={bool(cursor)})")
     client = await utils.db.client
     try:
-        offset = (page - 1) * limit
-        
-        # First, get threads for the user
-        threads_result = await client.table('threads').select('*').eq('account_id', user_id).order('created_at', desc=True).execute()
+        pagination_params = PaginationParams(page=page, page_size=limit, cursor=cursor, max_page_size=1000)
+        base_query = client.table('threads').select(THREAD_LIST_COLUMNS).eq('account_id', user_id)
+        count_query = client.table('threads').select('thread_id', count='exact').eq('account_id', user_id).limit(1)
         
-        if not threads_result.data:
-            logger.debug(f"No threads found for user: {user_id}")
-            return {
-                "threads": [],
-                "pagination": {
-                    "page": page,
-                    "limit": limit,
-                    "total": 0,
-                    "pages": 0
-                }
-            }
-        
-        total_count = len(threads_result.data)
-        
-        # Apply pagination to threads
-        paginated_threads = threads_result.data[offset:offset + limit]
-        
-        # Extract unique project IDs from threads that have them
-        project_ids = [
-            thread['project_id'] for thread in paginated_threads 
-            if thread.get('project_id')
-        ]
-        unique_project_ids = list(set(project_ids)) if project_ids else []
-        
-        # Fetch projects if we have project IDs
-        projects_by_id = {}
-        if unique_project_ids:
-            from utils.query_utils import batch_query_in
-            
-            projects_data = await batch_query_in(
-                client=client,
-                table_name='projects',
-                select_fields='*',
-                in_field='project_id',
-                in_values=unique_project_ids
+        if cursor or page == 1:
+            paginated_result = await PaginationService.paginate_keyset(
+                base_query=base_query,
+                params=pagination_params,
+                sort_field='created_at',
+                descending=True,
+                id_field='thread_id',
+                count_query=count_query
+            )
+        else:
+            paginated_result = await PaginationService.paginate_database_query(
+                base_query=base_query.order('created_at', desc=True).order('thread_id', desc=True),
+                params=pagination_params,
+                count_query=count_query
             )
-            
-            logger.debug(f"[API] Retrieved {len(projects_data)} projects")
-            # Create a lookup map of projects by ID
-            projects_by_id = {
-                project['project_id']: project 
-                for project in projects_data
-            }
         
-        # Map threads with their associated projects
         mapped_threads = []
-        for thread in paginated_threads:
+        for thread in paginated_result.data:
+            project = thread.get('project')
             project_data = None
-            if thread.get('project_id') and thread['project_id'] in projects_by_id:
-                project = projects_by_id[thread['project_id']]
+            if project:
                 project_data = {
                     "project_id": project['project_id'],
+                    "account_id": project.get('account_id'),
                     "name": project.get('name', ''),
                     "description": project.get('description', ''),
                     "sandbox": project.get('sandbox', {}),
@@ -89,30 +89,29 @@ async def get_user_threads(
                     "updated_at": project['updated_at']
                 }
             
-            mapped_thread = {
+            mapped_threads.append({
                 "thread_id": thread['thread_id'],
+                "account_id": thread['account_id'],
                 "project_id": thread.get('project_id'),
                 "metadata": thread.get('metadata', {}),
                 "is_public": thread.get('is_public', False),
                 "created_at": thread['created_at'],
                 "updated_at": thread['updated_at'],
                 "project": project_data
-            }
-            mapped_threads.append(mapped_thread)
-        
-        total_pages = (total_count + limit - 1) // limit if total_count else 0
+            })
         
-        logger.debug(f"[API] Mapped threads for frontend: {len(mapped_threads)} threads, {len(projects_by_id)} unique projects")
+        logger.debug(f"[API] Mapped threads for frontend: {len(mapped_threads)} threads")
         
-        return {
+        return _json_response_with_etag(request, {
             "threads": mapped_threads,
             "pagination": {
                 "page": page,
                 "limit": limit,
-                "total": total_count,
-                "pages": total_pages
+                "total": paginated_result.pagination.total_items,
+                "pages": paginated_result.pagination.total_pages,
+                "next_cursor": paginated_result.pagination.next_cursor
             }
-        }
+        })
         
     except Exception as e:
         logger.error(f"Error fetching threads for user {user_id}: {str(e)}")
@@ -301,32 +300,179 @@ async def create_thread(
         # TODO: Clean up created project/thread if creation fails mid-way
         raise HTTPException(status_code=500, detail=f"Failed to create thread: {str(e)}")
 
+MESSAGE_FIELDS = (
+    'message_id', 'thread_id', 'type', 'is_llm_message', 'content', 'metadata', 'created_at', 'updated_at',
+    'agent_id', 'agent_version_id', 'retry_of', 'attempt', 'idempotency_key'
+)
+# Always selected, since cursors are built from them
+MESSAGE_CURSOR_FIELDS = ('message_id', 'created_at')
+MESSAGE_BATCH_SIZE = 1000
+DEFAULT_MESSAGE_PAGE_SIZE = 100
+
+
+def _message_select_fields(fields: Optional[str]) -> str:
+    if not fields:
+        return '*'
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = set(requested) - set(MESSAGE_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown message fields: {', '.join(sorted(unknown))}")
+    return ', '.join(dict.fromkeys([*MESSAGE_CURSOR_FIELDS, *requested]))
+
+
+def _message_cursor(message_id: str, created_at: str) -> str:
+    return PaginationService.create_cursor(message_id, 'created_at', created_at)
+
+
+async def _fetch_message_page(
+    client,
+    thread_id: str,
+    select_fields: str,
+    newest_first: bool,
+    position: Optional[Dict[str, Any]],
+    limit: int,
+    exclude_types: List[str]
+) -> List[Dict[str, Any]]:
+    """Read up to limit messages past position in (created_at, message_id) order."""
+    query = client.table('messages').select(select_fields).eq('thread_id', thread_id)
+    if exclude_types:
+        query = query.not_.in_('type', exclude_types)
+    if position:
+        query = PaginationService.apply_keyset_cursor(
+            query, 'created_at', position['sort_value'], 'message_id', position['id'], newest_first
+        )
+    query = query.order('created_at', desc=newest_first).order('message_id', desc=newest_first).limit(limit)
+    result = await query.execute()
+    return result.data or []
+
+
+async def _stream_messages_json(pages: AsyncIterator[List[Dict[str, Any]]], extra: Optional[Dict[str, Any]] = None) -> AsyncIterator[bytes]:
+    """Encode {"messages": [...], **extra} page by page instead of building one large body.
+
+    The status line is already sent when a later page fails, so the body is
+    still closed as valid JSON and carries an "error" key instead of a 500.
+    """
+    yield b'{"messages":['
+    first = True
+    error = None
+    try:
+        async for page in pages:
+            if not page:
+                continue
+            encoded = b",".join(json.dumps(message, separators=(",", ":"), default=str).encode() for message in page)
+            yield encoded if first else b"," + encoded
+            first = False
+    except Exception as e:
+        logger.error(f"Error streaming messages, response truncated: {str(e)}")
+        error = f"Failed to fetch messages: {str(e)}"
+    yield b"]"
+    if error:
+        yield f',"error":{json.dumps(error)}'.encode()
+    for key, value in (extra or {}).items():
+        yield f",{json.dumps(key)}:{json.dumps(value, separators=(',', ':'), default=str)}".encode()
+    yield b"}"
+
+
 @router.get("/threads/{thread_id}/messages")
 async def get_thread_messages(
     thread_id: str,
     user_id: str = Depends(verify_and_get_user_id_from_jwt),
-    order: str = Query("desc", description="Order by created_at: 'asc' or 'desc'")
+    order: str = Query("desc", description="Order by created_at: 'asc' or 'desc'"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit together with the cursors to get the whole thread"),
+    before: Optional[str] = Query(None, description="Cursor: return the messages just older than this position"),
+    after: Optional[str] = Query(None, description="Cursor: return the messages just newer than this position"),
+    since_message_id: Optional[str] = Query(None, description="Delta mode: return the messages newer than this message"),
+    fields: Optional[str] = Query(None, description="Comma-separated message columns to return, e.g. to skip content"),
+    exclude_types: Optional[str] = Query(None, description="Comma-separated message types to skip, e.g. 'tool,cost,summary'")
 ):
-    """Get all messages for a thread, fetching in batches of 1000 from the DB to avoid large queries."""
-    logger.debug(f"Fetching all messages for thread: {thread_id}, order={order}")
+    """Get the messages of a thread.
+    
+    Without limit or a cursor the whole thread is returned. Otherwise a page of
+    up to limit (default 100) messages is returned in the requested order with
+    pagination.before_cursor (pass as before= for the next older page),
+    pagination.after_cursor (pass as after= to fetch newer messages) and
+    pagination.has_more, which refers to the direction the page was read in.
+    The first page holds the newest messages for order=desc and the oldest for
+    order=asc. since_message_id reads forward from that message, like after=.
+    
+    The body is JSON-encoded and streamed page by page. If reading a later
+    page of the whole thread fails, the messages read so far are returned
+    with an "error" key; clients must treat such a response as incomplete.
+    """
+    logger.debug(f"Fetching messages for thread: {thread_id}, order={order}, limit={limit}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    if sum(1 for value in (before, after, since_message_id) if value) > 1:
+        raise HTTPException(status_code=400, detail="Use only one of before, after and since_message_id")
+    
     client = await utils.db.client
     await verify_and_authorize_thread_access(client, thread_id, user_id)
+    select_fields = _message_select_fields(fields)
+    excluded_types = [message_type.strip() for message_type in exclude_types.split(',') if message_type.strip()] if exclude_types else []
+    
     try:
-        batch_size = 1000
-        offset = 0
-        all_messages = []
-        while True:
-            query = client.table('messages').select('*').eq('thread_id', thread_id)
-            query = query.order('created_at', desc=(order == "desc"))
-            query = query.range(offset, offset + batch_size - 1)
-            messages_result = await query.execute()
-            batch = messages_result.data or []
-            all_messages.extend(batch)
-            logger.debug(f"Fetched batch of {len(batch)} messages (offset {offset})")
-            if len(batch) < batch_size:
-                break
-            offset += batch_size
-        return {"messages": all_messages}
+        position = None
+        newest_first = order == "desc"
+        if before or after:
+            cursor = PaginationService.parse_cursor(before or after)
+            if not cursor or cursor.get('sort_field') != 'created_at':
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            position = {'sort_value': cursor['sort_value'], 'id': cursor['id']}
+            newest_first = bool(before)
+        elif since_message_id:
+            since_result = await client.table('messages').select('message_id, created_at').eq('thread_id', thread_id).eq('message_id', since_message_id).execute()
+            if not since_result.data:
+                raise HTTPException(status_code=404, detail="Message not found in this thread")
+            position = {'sort_value': since_result.data[0]['created_at'], 'id': since_result.data[0]['message_id']}
+            newest_first = False
+        
+        if limit is None and position is None:
+            # Whole thread; the first page is read here so that errors still become a 500
+            first_page = await _fetch_message_page(client, thread_id, select_fields, newest_first, None, MESSAGE_BATCH_SIZE, excluded_types)
+            
+            async def all_pages():
+                page = first_page
+                while True:
+                    yield page
+                    if len(page) < MESSAGE_BATCH_SIZE:
+                        return
+                    last = page[-1]
+                    page = await _fetch_message_page(
+                        client, thread_id, select_fields, newest_first,
+                        {'sort_value': last['created_at'], 'id': last['message_id']},
+                        MESSAGE_BATCH_SIZE, excluded_types
+                    )
+            
+            return StreamingResponse(_stream_messages_json(all_pages()), media_type="application/json")
+        
+        page_size = limit or DEFAULT_MESSAGE_PAGE_SIZE
+        rows = await _fetch_message_page(client, thread_id, select_fields, newest_first, position, page_size + 1, excluded_types)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        
+        position_cursor = _message_cursor(position['id'], position['sort_value']) if position else None
+        if rows:
+            oldest, newest = (rows[-1], rows[0]) if newest_first else (rows[0], rows[-1])
+            before_cursor = _message_cursor(oldest['message_id'], oldest['created_at'])
+            after_cursor = _message_cursor(newest['message_id'], newest['created_at'])
+        else:
+            before_cursor = after_cursor = position_cursor
+        
+        if newest_first != (order == "desc"):
+            rows.reverse()
+        
+        async def single_page():
+            yield rows
+        
+        pagination = {
+            "limit": page_size,
+            "has_more": has_more,
+            "before_cursor": before_cursor,
+            "after_cursor": after_cursor
+        }
+        return StreamingResponse(_stream_messages_json(single_page(), {"pagination": pagination}), media_type="application/json")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching messages for thread {thread_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch messages: {str(e)}")
@@ -485,6 +631,7 @@ async def delete_message(
     try:
         # Don't allow users to delete the "status" messages
         await client.table('messages').delete().eq('message_id', message_id).eq('is_llm_message', True).eq('thread_id', thread_id).execute()
+        await invalidate_thread_messages(thread_id)
         return {"message": "Message deleted successfully"}
     except Exception as e:
         logger.error(f"Error deleting message {message_id} from thread {thread_id}: {str(e)}")
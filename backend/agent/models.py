@@ -109,6 +109,7 @@ class PaginationInfo(BaseModel):
     total_pages: int
     has_next: bool
     has_previous: bool
+    next_cursor: Optional[str] = None
 
 class AgentsResponse(BaseModel):
     agents: List[AgentResponse]
@@ -1,5 +1,6 @@
 import os
 import json
+import time
 import asyncio
 import datetime
 from typing import Optional, Dict, List, Any, AsyncGenerator
@@ -13,6 +14,7 @@ from dotenv import load_dotenv
 from utils.config import config
 from agent.prompts.agent_builder_prompt import get_agent_builder_prompt
 from agentpress.thread_manager import ThreadManager
+from agentpress.message_cache import invalidate_thread_messages
 from agentpress.response_processor import ProcessorConfig
 from agent.tools.sb_shell_tool import SandboxShellTool
 from agent.tools.sb_files_tool import SandboxFilesTool
@@ -32,6 +34,11 @@ from services.langfuse import langfuse
 from langfuse.client import StatefulTraceClient
 
 from agent.tools.mcp_tool_wrapper import MCPToolWrapper
+from agent.tools.utils.mcp_session_pool import mcp_session_pool
+from services.http_client import http_pool
+from services import run_checkpoint
+from services.run_checkpoint import RunCheckpoint
+from knowledge_base.retrieval import knowledge_base_index
 from agent.tools.task_list_tool import TaskListTool
 from agentpress.tool import SchemaType
 from agent.tools.sb_sheets_tool import SandboxSheetsTool
@@ -55,6 +62,7 @@ class AgentConfig:
     enable_context_manager: bool = True
     agent_config: Optional[dict] = None
     trace: Optional[StatefulTraceClient] = None
+    checkpoint: Optional[RunCheckpoint] = None
 
 
 class ToolManager:
@@ -272,7 +280,8 @@ class PromptManager:
     async def build_system_prompt(model_name: str, agent_config: Optional[dict], 
                                   thread_id: str, 
                                   mcp_wrapper_instance: Optional[MCPToolWrapper],
-                                  client=None) -> dict:
+                                  client=None,
+                                  latest_user_message: Optional[str] = None) -> dict:
         
         default_system_content = get_system_prompt()
         
@@ -306,14 +315,20 @@ class PromptManager:
             try:
                 logger.debug(f"Retrieving agent knowledge base context for agent {agent_config['agent_id']}")
                 
-                # Use only agent-based knowledge base context
-                kb_result = await client.rpc('get_agent_knowledge_base_context', {
-                    'p_agent_id': agent_config['agent_id']
-                }).execute()
+                # Large knowledge bases contribute only the chunks relevant to the
+                # latest user message; small ones are still included whole
+                kb_context = None
+                if latest_user_message and latest_user_message.strip():
+                    kb_context = await knowledge_base_index.retrieve_context(client, agent_config['agent_id'], latest_user_message)
                 
-                if kb_result.data and kb_result.data.strip():
-                    logger.debug(f"Found agent knowledge base context, adding to system prompt (length: {len(kb_result.data)} chars)")
-                    # logger.debug(f"Knowledge base data object: {kb_result.data[:500]}..." if len(kb_result.data) > 500 else f"Knowledge base data object: {kb_result.data}")
+                if kb_context is None:
+                    kb_result = await client.rpc('get_agent_knowledge_base_context', {
+                        'p_agent_id': agent_config['agent_id']
+                    }).execute()
+                    kb_context = kb_result.data
+                
+                if kb_context and kb_context.strip():
+                    logger.debug(f"Found agent knowledge base context, adding to system prompt (length: {len(kb_context)} chars)")
                     
                     # Construct a well-formatted knowledge base section
                     kb_section = f"""
@@ -321,7 +336,7 @@ class PromptManager:
                     === AGENT KNOWLEDGE BASE ===
                     NOTICE: The following is your specialized knowledge base. This information should be considered authoritative for your responses and should take precedence over general knowledge when relevant.
 
-                    {kb_result.data}
+                    {kb_context}
 
                     === END AGENT KNOWLEDGE BASE ===
 
@@ -571,20 +586,37 @@ class AgentRunner:
             return 8192
         return None
     
+    async def _save_checkpoint(self):
+        try:
+            await run_checkpoint.save_checkpoint(self.config.checkpoint)
+        except Exception as e:
+            # Only resumability is lost; the run itself can go on
+            logger.warning(f"Failed to checkpoint agent run {self.config.checkpoint.agent_run_id}: {str(e)}")
+
+    async def _get_latest_message(self):
+        return await self.client.table('messages').select('*').eq('thread_id', self.config.thread_id).in_('type', ['assistant', 'tool', 'user']).order('created_at', desc=True).limit(1).execute()
+
+    async def _discard_interrupted_assistant_message(self, message_id: str) -> bool:
+        """Delete the assistant message saved by an interrupted iteration before it is re-run.
+
+        The iteration stopped before the tools called in the message ran, so
+        left in the thread it would reach the LLM with calls that never got results.
+        """
+        try:
+            await self.client.table('messages').delete().eq('message_id', message_id).eq('thread_id', self.config.thread_id).execute()
+        except Exception as e:
+            logger.error(f"Failed to delete interrupted assistant message {message_id} of thread {self.config.thread_id}: {str(e)}")
+            return False
+        self.thread_manager.message_cache.invalidate(self.config.thread_id)
+        await invalidate_thread_messages(self.config.thread_id)
+        return True
+
     async def run(self) -> AsyncGenerator[Dict[str, Any], None]:
         await self.setup()
         await self.setup_tools()
         mcp_wrapper_instance = await self.setup_mcp_tools()
         
-        system_message = await PromptManager.build_system_prompt(
-            self.config.model_name, self.config.agent_config, 
-            self.config.thread_id, 
-            mcp_wrapper_instance, self.client
-        )
-        logger.debug(f"model_name received: {self.config.model_name}")
-        iteration_count = 0
-        continue_execution = True
-
+        latest_user_text = None
         latest_user_message = await self.client.table('messages').select('*').eq('thread_id', self.config.thread_id).eq('type', 'user').order('created_at', desc=True).limit(1).execute()
         if latest_user_message.data and len(latest_user_message.data) > 0:
             data = latest_user_message.data[0]['content']
@@ -592,6 +624,28 @@ class AgentRunner:
                 data = json.loads(data)
             if self.config.trace:
                 self.config.trace.update(input=data['content'])
+            if isinstance(data.get('content'), str):
+                latest_user_text = data['content']
+            elif isinstance(data.get('content'), list):
+                latest_user_text = " ".join(
+                    part.get('text', '') for part in data['content'] if isinstance(part, dict) and part.get('type') == 'text'
+                )
+
+        system_message = await PromptManager.build_system_prompt(
+            self.config.model_name, self.config.agent_config, 
+            self.config.thread_id, 
+            mcp_wrapper_instance, self.client,
+            latest_user_message=latest_user_text
+        )
+        logger.debug(f"model_name received: {self.config.model_name}")
+        checkpoint = self.config.checkpoint
+        iteration_count = checkpoint.iteration_count if checkpoint else 0
+        resumed_state = checkpoint.continuous_state if checkpoint else None
+        resuming = bool(checkpoint and checkpoint.resumes)
+        if resuming:
+            logger.debug(f"Resuming thread {self.config.thread_id} after {iteration_count} iterations (resume {checkpoint.resumes})")
+        continue_execution = True
+        last_checkpoint_save = time.monotonic()
 
         message_manager = MessageManager(self.client, self.config.thread_id, self.config.model_name, self.config.trace, 
                                          agent_config=self.config.agent_config, enable_context_manager=self.config.enable_context_manager)
@@ -609,12 +663,35 @@ class AgentRunner:
                 }
                 break
 
-            latest_message = await self.client.table('messages').select('*').eq('thread_id', self.config.thread_id).in_('type', ['assistant', 'tool', 'user']).order('created_at', desc=True).limit(1).execute()
+            latest_message = await self._get_latest_message()
             if latest_message.data and len(latest_message.data) > 0:
                 message_type = latest_message.data[0].get('type')
                 if message_type == 'assistant':
-                    continue_execution = False
-                    break
+                    message_id = latest_message.data[0].get('message_id')
+                    if resuming and run_checkpoint.should_rerun_interrupted_iteration(checkpoint, message_id):
+                        # Its tool calls never got results, so the LLM must not see it again
+                        if not await self._discard_interrupted_assistant_message(message_id):
+                            break
+                        logger.debug(f"Re-running iteration {iteration_count} of thread {self.config.thread_id}: it was interrupted after saving its assistant message")
+                        latest_message = await self._get_latest_message()
+                    else:
+                        continue_execution = False
+                        break
+            resuming = False
+
+            continuous_state: Dict[str, Any] = {}
+            if resumed_state and resumed_state.get('auto_continue_count'):
+                # Pick up the auto-continue chain the interrupted worker was in
+                continuous_state = resumed_state
+            resumed_state = None
+            if checkpoint:
+                checkpoint.iteration_count = iteration_count - 1
+                checkpoint.iteration_finished = False
+                checkpoint.continuous_state = continuous_state
+                if latest_message.data:
+                    checkpoint.last_message_id = latest_message.data[0].get('message_id')
+                await self._save_checkpoint()
+                last_checkpoint_save = time.monotonic()
 
             temporary_message = await message_manager.build_temporary_message()
             max_tokens = self.get_max_tokens()
@@ -644,7 +721,8 @@ class AgentRunner:
                     enable_thinking=self.config.enable_thinking,
                     reasoning_effort=self.config.reasoning_effort,
                     enable_context_manager=self.config.enable_context_manager,
-                    generation=generation
+                    generation=generation,
+                    continuous_state=continuous_state
                 )
 
                 if isinstance(response, dict) and "status" in response and response["status"] == "error":
@@ -711,6 +789,11 @@ class AgentRunner:
                                 except Exception:
                                     pass
 
+                            # continuous_state is updated in place, so this captures finished auto-continue segments
+                            if checkpoint and time.monotonic() - last_checkpoint_save >= run_checkpoint.CHECKPOINT_INTERVAL_SECONDS:
+                                await self._save_checkpoint()
+                                last_checkpoint_save = time.monotonic()
+
                             yield chunk
                     else:
                         error_detected = True
@@ -748,6 +831,18 @@ class AgentRunner:
             if generation:
                 generation.end(output=full_response)
 
+            if checkpoint:
+                checkpoint.iteration_count = iteration_count
+                checkpoint.iteration_finished = True
+                checkpoint.continuous_state = None
+                await self._save_checkpoint()
+                last_checkpoint_save = time.monotonic()
+
+        logger.debug(f"Message cache stats for thread {self.config.thread_id}: {self.thread_manager.message_cache.stats()}")
+        logger.debug(f"MCP session pool stats: {mcp_session_pool.stats()}")
+        logger.debug(f"HTTP client pool stats: {http_pool.stats()}")
+        logger.debug(f"Knowledge base index stats: {knowledge_base_index.stats()}")
+        logger.debug(f"Prompt cache planner stats for thread {self.config.thread_id}: {self.thread_manager.prompt_cache_planner.stats()}")
         asyncio.create_task(asyncio.to_thread(lambda: langfuse.flush()))
 
 
@@ -763,7 +858,8 @@ async def run_agent(
     reasoning_effort: Optional[str] = 'low',
     enable_context_manager: bool = True,
     agent_config: Optional[dict] = None,    
-    trace: Optional[StatefulTraceClient] = None
+    trace: Optional[StatefulTraceClient] = None,
+    checkpoint: Optional[RunCheckpoint] = None
 ):
     effective_model = model_name
     is_tier_default = model_name in ["Kimi K2", "Claude Sonnet 4", "openai/gpt-5-mini"]
@@ -787,7 +883,8 @@ async def run_agent(
         reasoning_effort=reasoning_effort,
         enable_context_manager=enable_context_manager,
         agent_config=agent_config,
-        trace=trace
+        trace=trace,
+        checkpoint=checkpoint
     )
     
     runner = AgentRunner(config)
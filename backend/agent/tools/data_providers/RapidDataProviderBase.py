@@ -1,5 +1,5 @@
 import os
-import requests
+from services.http_client import http_pool
 from typing import Dict, Any, Optional, TypedDict, Literal
 
 
@@ -19,7 +19,7 @@ class RapidDataProviderBase:
     def get_endpoints(self):
         return self.endpoints
     
-    def call_endpoint(
+    async def call_endpoint(
             self,
             route: str,
             payload: Optional[Dict[str, Any]] = None
@@ -53,9 +53,9 @@ class RapidDataProviderBase:
         method = endpoint.get('method', 'GET').upper()
         
         if method == 'GET':
-            response = requests.get(url, params=payload, headers=headers)
+            response = await http_pool.get(url, params=payload, headers=headers)
         elif method == 'POST':
-            response = requests.post(url, json=payload, headers=headers)
+            response = await http_pool.post(url, json=payload, headers=headers)
         else:
             raise ValueError(f"Unsupported HTTP method: {method}")
         return response.json()
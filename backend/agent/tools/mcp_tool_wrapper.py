@@ -2,7 +2,6 @@ from typing import Any, Dict, List, Optional
 from agentpress.tool import Tool, ToolResult, ToolSchema, SchemaType
 from mcp_module import mcp_service
 from utils.logger import logger
-import inspect
 import asyncio
 import time
 import hashlib
@@ -271,11 +270,7 @@ class MCPToolWrapper(Tool):
     
     def _register_schemas(self):
         self._schemas.clear()
-
-        for name, method in inspect.getmembers(self, predicate=inspect.ismethod):
-            if hasattr(method, 'tool_schemas'):
-                self._schemas[name] = method.tool_schemas
-                logger.debug(f"Registered schemas for method '{name}' in {self.__class__.__name__}")
+        self._schemas.update(self.get_class_schemas())
         
         if hasattr(self, '_dynamic_tools') and self._dynamic_tools:
             for tool_name, tool_data in self._dynamic_tools.items():
@@ -9,7 +9,7 @@ from agentpress.tool import ToolResult, openapi_schema, usage_example
 from sandbox.tool_base import SandboxToolsBase
 from agentpress.thread_manager import ThreadManager
 import json
-import requests
+from services.http_client import http_pool
 
 # Add common image MIME types if mimetypes module is limited
 mimetypes.add_type("image/webp", ".webp")
@@ -106,38 +106,33 @@ class SandboxVisionTool(SandboxToolsBase):
         parsed_url = urlparse(file_path)
         return parsed_url.scheme in ('http', 'https')
     
-    def download_image_from_url(self, url: str) -> Tuple[bytes, str]:
+    async def download_image_from_url(self, url: str) -> Tuple[bytes, str]:
         """Download image from a URL"""
-        try:
-            headers = {
-                "User-Agent": "Mozilla/5.0"  # Some servers block default Python
-            }
+        headers = {
+            "User-Agent": "Mozilla/5.0"  # Some servers block default Python
+        }
 
-            # HEAD request to get the image size
-            head_response = requests.head(url, timeout=10, headers=headers, stream=True)
-            head_response.raise_for_status()
-            
-            # Check content length
-            content_length = int(head_response.headers.get('Content-Length'))
-            if content_length and content_length > MAX_IMAGE_SIZE:
-                raise Exception(f"Image is too large ({(content_length)/(1024*1024):.2f}MB) for the maximum allowed size of {MAX_IMAGE_SIZE/(1024*1024):.2f}MB")
-            
-            # Download the image
-            response = requests.get(url, timeout=10, headers=headers, stream=True)
+        async with http_pool.stream("GET", url, timeout=10, headers=headers, follow_redirects=True) as response:
             response.raise_for_status()
 
-            image_bytes = response.content
-            if len(image_bytes) > MAX_IMAGE_SIZE:
-                raise Exception(f"Downloaded image is too large ({(len(image_bytes))/(1024*1024):.2f}MB). Maximum allowed size of {MAX_IMAGE_SIZE/(1024*1024):.2f}MB")
-
             # Get MIME type
             mime_type = response.headers.get('Content-Type')
             if not mime_type or not mime_type.startswith('image/'):
                 raise Exception(f"URL does not point to an image (Content-Type: {mime_type}): {url}")
-            
-            return image_bytes, mime_type
-        except Exception as e:
-            return self.fail_response(f"Failed to download image from URL: {str(e)}")
+
+            # Check content length before reading the body
+            content_length = int(response.headers.get('Content-Length') or 0)
+            if content_length > MAX_IMAGE_SIZE:
+                raise Exception(f"Image is too large ({(content_length)/(1024*1024):.2f}MB) for the maximum allowed size of {MAX_IMAGE_SIZE/(1024*1024):.2f}MB")
+
+            # Download the image, stopping as soon as it exceeds the limit
+            image_bytes = bytearray()
+            async for chunk in response.aiter_bytes():
+                image_bytes.extend(chunk)
+                if len(image_bytes) > MAX_IMAGE_SIZE:
+                    raise Exception(f"Downloaded image is too large (over {MAX_IMAGE_SIZE/(1024*1024):.2f}MB). Maximum allowed size of {MAX_IMAGE_SIZE/(1024*1024):.2f}MB")
+
+        return bytes(image_bytes), mime_type
     
     @openapi_schema({
         "type": "function",
@@ -177,7 +172,7 @@ class SandboxVisionTool(SandboxToolsBase):
             is_url = self.is_url(file_path)
             if is_url:
                 try:
-                    image_bytes, mime_type = self.download_image_from_url(file_path)
+                    image_bytes, mime_type = await self.download_image_from_url(file_path)
                     original_size = len(image_bytes)
                     cleaned_path = file_path
                 except Exception as e:
@@ -0,0 +1,288 @@
+"""
+Pooled MCP client sessions shared by every tool call in the process.
+
+Opening an MCP connection means a transport handshake plus session.initialize(),
+and for stdio servers a new process. MCPSessionPool keeps one initialized
+ClientSession per server config alive across tool calls, and:
+
+- limits concurrent calls per server
+- pings sessions that have been idle before reusing them
+- reconnects when a session is found dead or its transport breaks
+- closes sessions that have not been used for idle_timeout seconds
+
+The mcp transports are anyio context managers that must be entered and exited
+by the same task, so each pooled session is owned by a background task that
+holds the connection open until the session is closed.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from contextlib import AsyncExitStack
+from typing import Any, AsyncContextManager, Callable, Dict, Optional
+
+import anyio
+from mcp import ClientSession
+from mcp.shared.exceptions import McpError
+
+from utils.logger import logger
+
+TransportFactory = Callable[[], AsyncContextManager]
+
+DEFAULT_IDLE_TIMEOUT = 300
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_CONNECT_TIMEOUT = 30
+DEFAULT_CALL_TIMEOUT = 30
+# Sessions unused for longer than this are pinged before the next call
+HEALTH_CHECK_AFTER = 30
+PING_TIMEOUT = 5
+
+# Raised when the transport under a session has gone away; the request never
+# reached the server, so the call is safe to retry on a fresh session.
+_TRANSPORT_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+
+
+def session_key(server_config: Dict[str, Any]) -> str:
+    """Pool key for a server config (transport, URL/command, headers, env)."""
+    config_str = json.dumps(server_config, sort_keys=True, default=str)
+    return hashlib.sha256(config_str.encode()).hexdigest()
+
+
+class PooledMCPSession:
+    """A single long-lived, initialized ClientSession."""
+
+    def __init__(self, key: str, label: str, transport_factory: TransportFactory, max_concurrency: int):
+        self.key = key
+        self.label = label
+        self.transport_factory = transport_factory
+        self.session: Optional[ClientSession] = None
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self._ready = asyncio.Event()
+        self._close = asyncio.Event()
+        self._error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def open(self, timeout: float):
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise TimeoutError(f"Timed out connecting to MCP server {self.label}")
+        if self._error is not None:
+            raise self._error
+
+    async def _run(self):
+        try:
+            async with AsyncExitStack() as stack:
+                streams = await stack.enter_async_context(self.transport_factory())
+                session = await stack.enter_async_context(ClientSession(streams[0], streams[1]))
+                await session.initialize()
+                self.session = session
+                self._ready.set()
+                await self._close.wait()
+        except asyncio.CancelledError:
+            pass
+        except BaseException as e:
+            if not self._ready.is_set():
+                self._error = e
+            else:
+                logger.warning(f"MCP session for {self.label} closed unexpectedly: {str(e)}")
+        finally:
+            self.session = None
+            self._ready.set()
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def check_health(self) -> bool:
+        """Ping the server if the session has been idle for a while."""
+        if not self.alive:
+            return False
+        if time.monotonic() - self.last_used < HEALTH_CHECK_AFTER:
+            return True
+        try:
+            await asyncio.wait_for(self.session.send_ping(), PING_TIMEOUT)
+            return True
+        except Exception as e:
+            logger.debug(f"MCP session for {self.label} failed health check: {str(e)}")
+            return False
+
+    async def close(self):
+        self._close.set()
+        if self._task is None or self._task.done():
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), 5)
+        except Exception:
+            self._task.cancel()
+
+
+class MCPSessionPool:
+    """Process-wide pool of MCP sessions keyed by server config."""
+
+    def __init__(
+        self,
+        idle_timeout: int = DEFAULT_IDLE_TIMEOUT,
+        max_concurrency_per_server: int = DEFAULT_MAX_CONCURRENCY,
+        connect_timeout: int = DEFAULT_CONNECT_TIMEOUT,
+    ):
+        self.idle_timeout = idle_timeout
+        self.max_concurrency_per_server = max_concurrency_per_server
+        self.connect_timeout = connect_timeout
+        self._sessions: Dict[str, PooledMCPSession] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.connects = 0
+        self.reuses = 0
+        self.reconnects = 0
+        self.evictions = 0
+
+    def _check_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Sessions and locks are bound to the loop that created them
+            self._close_on_previous_loop()
+            self._sessions.clear()
+            self._locks.clear()
+            self._reaper = None
+            self._loop = loop
+
+    def _close_on_previous_loop(self):
+        """Ask the sessions of the previous loop to close; only that loop can run their owner tasks.
+
+        If the loop is already closed, its tasks and transports went with it.
+        """
+        if self._loop is None or self._loop.is_closed() or not (self._sessions or self._reaper):
+            return
+        for pooled in self._sessions.values():
+            self._loop.call_soon_threadsafe(pooled._close.set)
+        if self._reaper is not None:
+            self._loop.call_soon_threadsafe(self._reaper.cancel)
+        if self._sessions:
+            logger.debug(f"Closing {len(self._sessions)} MCP sessions left on a previous event loop")
+
+    async def _acquire(self, key: str, label: str, transport_factory: TransportFactory) -> PooledMCPSession:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            pooled = self._sessions.get(key)
+            if pooled is not None:
+                if await pooled.check_health():
+                    self.reuses += 1
+                    return pooled
+                logger.debug(f"Reconnecting MCP session for {label}")
+                self.reconnects += 1
+                await self._discard(key, pooled)
+
+            pooled = PooledMCPSession(key, label, transport_factory, self.max_concurrency_per_server)
+            await pooled.open(self.connect_timeout)
+            self._sessions[key] = pooled
+            self.connects += 1
+            self._ensure_reaper()
+            logger.debug(f"Opened pooled MCP session for {label} ({len(self._sessions)} open)")
+            return pooled
+
+    async def _discard(self, key: str, pooled: PooledMCPSession):
+        if self._sessions.get(key) is pooled:
+            del self._sessions[key]
+        await pooled.close()
+
+    async def call_tool(
+        self,
+        server_config: Dict[str, Any],
+        transport_factory: TransportFactory,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        timeout: float = DEFAULT_CALL_TIMEOUT,
+        label: Optional[str] = None,
+    ):
+        """Call a tool on a pooled session, connecting on first use.
+
+        Args:
+            server_config: Everything that identifies the connection; used as the pool key
+            transport_factory: Returns the mcp transport context manager for the server
+            tool_name: Name of the tool on the MCP server
+            arguments: Tool arguments
+            timeout: Timeout for the tool call itself, excluding connecting
+            label: Name used in logs instead of the config, which may hold credentials
+
+        Returns:
+            The CallToolResult from the server
+        """
+        self._check_loop()
+        key = session_key(server_config)
+        label = label or (server_config.get("url") or "").split("?")[0] or server_config.get("command") or key[:12]
+
+        for attempt in range(2):
+            pooled = await self._acquire(key, label, transport_factory)
+            async with pooled.semaphore:
+                if not pooled.alive:
+                    # Discarded while this call was waiting for a slot
+                    continue
+                pooled.in_use += 1
+                try:
+                    result = await asyncio.wait_for(pooled.session.call_tool(tool_name, arguments), timeout)
+                    pooled.last_used = time.monotonic()
+                    return result
+                except McpError:
+                    # Protocol-level error from a healthy session
+                    pooled.last_used = time.monotonic()
+                    raise
+                except _TRANSPORT_ERRORS as e:
+                    logger.warning(f"MCP transport for {label} is closed, reconnecting: {str(e)}")
+                    await self._discard(key, pooled)
+                    self.reconnects += 1
+                    if attempt:
+                        raise
+                except Exception:
+                    # State of the session is unknown (e.g. timed out mid-call); don't reuse it
+                    await self._discard(key, pooled)
+                    raise
+                finally:
+                    pooled.in_use -= 1
+        raise ConnectionError(f"MCP session for {label} closed before the call could be sent")
+
+    def _ensure_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._evict_idle())
+
+    async def _evict_idle(self):
+        try:
+            while self._sessions:
+                await asyncio.sleep(min(self.idle_timeout, 60))
+                now = time.monotonic()
+                for key, pooled in list(self._sessions.items()):
+                    if pooled.in_use == 0 and (not pooled.alive or now - pooled.last_used > self.idle_timeout):
+                        await self._discard(key, pooled)
+                        self.evictions += 1
+                        logger.debug(f"Evicted idle MCP session for {pooled.label}")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"MCP session reaper failed: {str(e)}", exc_info=True)
+
+    async def close_all(self):
+        """Close every pooled session."""
+        if self._reaper and not self._reaper.done():
+            self._reaper.cancel()
+        sessions, self._sessions = self._sessions, {}
+        for pooled in sessions.values():
+            await pooled.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "open": len(self._sessions),
+            "in_use": sum(pooled.in_use for pooled in self._sessions.values()),
+            "connects": self.connects,
+            "reuses": self.reuses,
+            "reconnects": self.reconnects,
+            "evictions": self.evictions,
+        }
+
+
+mcp_session_pool = MCPSessionPool()
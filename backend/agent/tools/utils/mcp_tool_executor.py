@@ -1,13 +1,13 @@
 import json
-import asyncio
 from typing import Dict, Any
 from agentpress.tool import ToolResult
-from mcp import ClientSession, StdioServerParameters
+from mcp import StdioServerParameters
 from mcp.client.sse import sse_client
 from mcp.client.stdio import stdio_client
 from mcp.client.streamable_http import streamablehttp_client
 from mcp_module import mcp_service
 from utils.logger import logger
+from agent.tools.utils.mcp_session_pool import mcp_session_pool
 
 
 class MCPToolExecutor:
@@ -114,12 +114,14 @@ class MCPToolExecutor:
             
             url = "https://remote.mcp.pipedream.net"
             
-            async with asyncio.timeout(30):
-                async with streamablehttp_client(url, headers=headers) as (read_stream, write_stream, _):
-                    async with ClientSession(read_stream, write_stream) as session:
-                        await session.initialize()
-                        result = await session.call_tool(original_tool_name, arguments)
-                        return self._create_success_result(self._extract_content(result))
+            result = await mcp_session_pool.call_tool(
+                {"transport": "http", "url": url, "headers": headers},
+                lambda: streamablehttp_client(url, headers=headers),
+                original_tool_name,
+                arguments,
+                label=f"pipedream:{app_slug}"
+            )
+            return self._create_success_result(self._extract_content(result))
                         
         except Exception as e:
             logger.error(f"Error executing Pipedream MCP tool: {str(e)}")
@@ -132,23 +134,21 @@ class MCPToolExecutor:
         url = custom_config['url']
         headers = custom_config.get('headers', {})
         
-        async with asyncio.timeout(30):
+        def transport():
             try:
-                async with sse_client(url, headers=headers) as (read, write):
-                    async with ClientSession(read, write) as session:
-                        await session.initialize()
-                        result = await session.call_tool(original_tool_name, arguments)
-                        return self._create_success_result(self._extract_content(result))
-                        
+                return sse_client(url, headers=headers)
             except TypeError as e:
                 if "unexpected keyword argument" in str(e):
-                    async with sse_client(url) as (read, write):
-                        async with ClientSession(read, write) as session:
-                            await session.initialize()
-                            result = await session.call_tool(original_tool_name, arguments)
-                            return self._create_success_result(self._extract_content(result))
-                else:
-                    raise
+                    return sse_client(url)
+                raise
+        
+        result = await mcp_session_pool.call_tool(
+            {"transport": "sse", "url": url, "headers": headers},
+            transport,
+            original_tool_name,
+            arguments
+        )
+        return self._create_success_result(self._extract_content(result))
     
     async def _execute_http_tool(self, tool_name: str, arguments: Dict[str, Any], tool_info: Dict[str, Any]) -> ToolResult:
         custom_config = tool_info['custom_config']
@@ -157,12 +157,13 @@ class MCPToolExecutor:
         url = custom_config['url']
         
         try:
-            async with asyncio.timeout(30):
-                async with streamablehttp_client(url) as (read, write, _):
-                    async with ClientSession(read, write) as session:
-                        await session.initialize()
-                        result = await session.call_tool(original_tool_name, arguments)
-                        return self._create_success_result(self._extract_content(result))
+            result = await mcp_session_pool.call_tool(
+                {"transport": "http", "url": url},
+                lambda: streamablehttp_client(url),
+                original_tool_name,
+                arguments
+            )
+            return self._create_success_result(self._extract_content(result))
                         
         except Exception as e:
             logger.error(f"Error executing HTTP MCP tool: {str(e)}")
@@ -178,12 +179,14 @@ class MCPToolExecutor:
             env=custom_config.get("env", {})
         )
         
-        async with asyncio.timeout(30):
-            async with stdio_client(server_params) as (read, write):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    result = await session.call_tool(original_tool_name, arguments)
-                    return self._create_success_result(self._extract_content(result))
+        result = await mcp_session_pool.call_tool(
+            {"transport": "stdio", "command": server_params.command, "args": server_params.args, "env": server_params.env},
+            lambda: stdio_client(server_params),
+            original_tool_name,
+            arguments,
+            label=server_params.command
+        )
+        return self._create_success_result(self._extract_content(result))
     
     async def _resolve_external_user_id(self, custom_config: Dict[str, Any]) -> str:
         profile_id = custom_config.get('profile_id')
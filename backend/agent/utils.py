@@ -1,14 +1,16 @@
-import json
+import asyncio
+import time
 import traceback
 import uuid
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime, timezone, timedelta
 from fastapi import HTTPException
 from utils.cache import Cache
 from utils.logger import logger
 from utils.config import config
 from utils.auth_utils import verify_and_authorize_thread_access
-from services import redis
+from services import redis, active_runs, run_checkpoint, run_scheduler
+from services.run_stream import RunResponseStream
 from services.supabase import DBConnection
 from services.llm import make_llm_api_call
 from run_agent_background import update_agent_run_status, _cleanup_redis_response_list
@@ -37,6 +39,10 @@ async def cleanup():
                 parts = key.split(":")
                 if len(parts) == 3:
                     agent_run_id = parts[2]
+                    if await run_checkpoint.is_resumable(agent_run_id):
+                        # Owned by a worker, or resumed by the orphan sweep
+                        logger.debug(f"Leaving resumable agent run {agent_run_id} running")
+                        continue
                     await stop_agent_run_with_helpers(agent_run_id, error_message=f"Instance {instance_id} shutting down")
                 else:
                     logger.warning(f"Unexpected key format found: {key}")
@@ -50,22 +56,71 @@ async def cleanup():
     await redis.close()
     logger.debug("Completed cleanup of agent API resources")
 
+async def restore_running_agent_runs():
+    """Resume checkpointed agent runs whose worker died, and tick the run scheduler, until cancelled.
+
+    The scheduler otherwise reclaims expired slots and dispatches queued runs
+    only when a run is submitted or released, so after a worker crash on a
+    quiet system its queue would not move. Every API instance runs this loop;
+    a Redis lock lets one sweep at a time.
+    """
+    while True:
+        try:
+            await asyncio.sleep(run_checkpoint.ORPHAN_SWEEP_INTERVAL_SECONDS)
+            if not await redis.set("agent_run_orphan_sweep", instance_id, nx=True, ex=run_checkpoint.ORPHAN_SWEEP_INTERVAL_SECONDS):
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to take the agent run sweep lock: {str(e)}")
+            continue
+
+        try:
+            await _resume_orphaned_runs()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to restore orphaned agent runs: {str(e)}")
+
+        try:
+            dispatched = await run_scheduler.dispatch()
+            if dispatched:
+                logger.info(f"Scheduler tick dispatched {len(dispatched)} queued agent runs")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to dispatch queued agent runs: {str(e)}")
+
+async def _resume_orphaned_runs():
+    orphaned = await run_checkpoint.find_orphaned_runs()
+    if not orphaned:
+        return
+
+    client = await db.client
+    result = await client.table('agent_runs').select('id, status').in_('id', orphaned).execute()
+    running = {row['id'] for row in result.data or [] if row.get('status') == 'running'}
+
+    for agent_run_id in orphaned:
+        if agent_run_id not in running:
+            await run_checkpoint.clear_checkpoint(agent_run_id)
+            # Its final status was written without freeing the scheduler slot
+            await run_scheduler.release(agent_run_id)
+            continue
+        checkpoint = await run_checkpoint.load_checkpoint(agent_run_id)
+        # The reservation keeps the next sweep from resuming it again while the message waits
+        if checkpoint is None or not await run_checkpoint.reserve_for_resume(agent_run_id):
+            continue
+        logger.info(f"Resuming orphaned agent run {agent_run_id} after {checkpoint.iteration_count} iterations")
+        actor_kwargs = dict(checkpoint.actor_kwargs)
+        await run_scheduler.submit_resume(actor_kwargs.pop("agent_run_id"), **actor_kwargs)
+
 async def stop_agent_run_with_helpers(agent_run_id: str, error_message: Optional[str] = None):
     """Update database and publish stop signal to Redis."""
     logger.debug(f"Stopping agent run: {agent_run_id}")
     client = await db.client
     final_status = "failed" if error_message else "stopped"
 
-    # Attempt to fetch final responses from Redis
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    all_responses = []
-    try:
-        all_responses_json = await redis.lrange(response_list_key, 0, -1)
-        all_responses = [json.loads(r) for r in all_responses_json]
-        logger.debug(f"Fetched {len(all_responses)} responses from Redis for DB update on stop/fail: {agent_run_id}")
-    except Exception as e:
-        logger.error(f"Failed to fetch responses from Redis for {agent_run_id} during stop/fail: {e}")
-        # Try fetching from DB as a fallback? Or proceed without responses? Proceeding without for now.
+    response_stream = RunResponseStream(agent_run_id)
 
     # Update the agent run status in the database
     update_success = await update_agent_run_status(
@@ -76,9 +131,10 @@ async def stop_agent_run_with_helpers(agent_run_id: str, error_message: Optional
         logger.error(f"Failed to update database status for stopped/failed run {agent_run_id}")
         raise HTTPException(status_code=500, detail="Failed to update agent run status in database")
 
-    # Send STOP signal to the global control channel
+    # Send STOP signal to stream viewers and the global control channel
     global_control_channel = f"agent_run:{agent_run_id}:control"
     try:
+        await response_stream.append_control("STOP")
         await redis.publish(global_control_channel, "STOP")
         logger.debug(f"Published STOP signal to global channel {global_control_channel}")
     except Exception as e:
@@ -209,13 +265,15 @@ def initialize(
 
     logger.debug(f"Initialized agent API with instance ID: {instance_id}")
 
+# Grace period before a stopped run's stream disappears, so connected viewers still read the STOP entry
+STOPPED_STREAM_TTL = 60
+
 async def _cleanup_redis_response_list(agent_run_id: str):
     try:
-        response_list_key = f"agent_run:{agent_run_id}:responses"
-        await redis.delete(response_list_key)
-        logger.debug(f"Cleaned up Redis response list for agent run {agent_run_id}")
+        await RunResponseStream(agent_run_id).expire(STOPPED_STREAM_TTL)
+        logger.debug(f"Scheduled cleanup of Redis response stream for agent run {agent_run_id}")
     except Exception as e:
-        logger.warning(f"Failed to clean up Redis response list for {agent_run_id}: {str(e)}")
+        logger.warning(f"Failed to clean up Redis response stream for {agent_run_id}: {str(e)}")
 
 
 async def check_for_active_project_agent_run(client, project_id: str):
@@ -244,17 +302,10 @@ async def stop_agent_run(db, agent_run_id: str, error_message: Optional[str] = N
     client = await db.client
     final_status = "failed" if error_message else "stopped"
 
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    all_responses = []
-    try:
-        all_responses_json = await redis.lrange(response_list_key, 0, -1)
-        all_responses = [json.loads(r) for r in all_responses_json]
-        logger.debug(f"Fetched {len(all_responses)} responses from Redis for DB update on stop/fail: {agent_run_id}")
-    except Exception as e:
-        logger.error(f"Failed to fetch responses from Redis for {agent_run_id} during stop/fail: {e}")
+    response_stream = RunResponseStream(agent_run_id)
 
     update_success = await update_agent_run_status(
-        client, agent_run_id, final_status, error=error_message, responses=all_responses
+        client, agent_run_id, final_status, error=error_message
     )
 
     if not update_success:
@@ -262,6 +313,7 @@ async def stop_agent_run(db, agent_run_id: str, error_message: Optional[str] = N
 
     global_control_channel = f"agent_run:{agent_run_id}:control"
     try:
+        await response_stream.append_control("STOP")
         await redis.publish(global_control_channel, "STOP")
         logger.debug(f"Published STOP signal to global channel {global_control_channel}")
     except Exception as e:
@@ -292,65 +344,76 @@ async def stop_agent_run(db, agent_run_id: str, error_message: Optional[str] = N
     logger.debug(f"Successfully initiated stop process for agent run: {agent_run_id}")
 
 
+async def _scan_running_agent_runs(client, account_id: str) -> List[Tuple[str, str]]:
+    """Query the DB for the account's running agent runs started within the past 24 hours."""
+    twenty_four_hours_ago_iso = (datetime.now(timezone.utc) - timedelta(hours=24)).isoformat()
+    result = await client.table('agent_runs') \
+        .select('id, thread_id, threads!inner(account_id)') \
+        .eq('threads.account_id', account_id) \
+        .eq('status', 'running') \
+        .gte('started_at', twenty_four_hours_ago_iso) \
+        .execute()
+    return [(run['id'], run['thread_id']) for run in result.data or []]
+
+
+async def reconcile_active_runs(client, account_id: str) -> List[Tuple[str, str]]:
+    """Rebuild the account's live run set from the agent_runs table."""
+    scan_started_at = time.time()
+    runs = await _scan_running_agent_runs(client, account_id)
+    await active_runs.reconcile(account_id, runs, scan_started_at)
+    logger.debug(f"Reconciled active runs for account {account_id}: {len(runs)} running")
+    return runs
+
+
+async def _reconcile_active_runs_in_background(account_id: str):
+    if not await active_runs.acquire_reconcile_lock(account_id):
+        return
+    try:
+        client = await DBConnection().client
+        await reconcile_active_runs(client, account_id)
+    except Exception as e:
+        logger.warning(f"Failed to reconcile active runs for account {account_id}: {str(e)}")
+
+
 async def check_agent_run_limit(client, account_id: str) -> Dict[str, Any]:
     """
-    Check if the account has reached the limit of 3 parallel agent runs within the past 24 hours.
+    Check if the account has reached the limit of parallel agent runs within the past 24 hours.
+
+    Reads the account's live run set (services.active_runs) and only queries the
+    DB when the set has never been built; stale sets are reconciled in the background.
+    Runs still waiting in the run scheduler's queue are 'running' in the DB but
+    are not counted, so a trigger backlog does not block the account's own chats.
     
     Returns:
         Dict with 'can_start' (bool), 'running_count' (int), 'running_thread_ids' (list)
     """
     try:
-        result = await Cache.get(f"agent_run_limit:{account_id}")
-        if result:
-            return result
+        try:
+            reconciled_at, runs = await active_runs.get_running_runs(account_id)
+            if reconciled_at is None:
+                runs = await reconcile_active_runs(client, account_id)
+            elif active_runs.needs_reconcile(reconciled_at):
+                asyncio.create_task(_reconcile_active_runs_in_background(account_id))
+        except Exception as redis_error:
+            logger.warning(f"Active run set unavailable for account {account_id}, querying DB: {str(redis_error)}")
+            runs = await _scan_running_agent_runs(client, account_id)
 
-        # Calculate 24 hours ago
-        twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
-        twenty_four_hours_ago_iso = twenty_four_hours_ago.isoformat()
-        
-        logger.debug(f"Checking agent run limit for account {account_id} since {twenty_four_hours_ago_iso}")
-        
-        # Get all threads for this account
-        threads_result = await client.table('threads').select('thread_id').eq('account_id', account_id).execute()
-        
-        if not threads_result.data:
-            logger.debug(f"No threads found for account {account_id}")
-            return {
-                'can_start': True,
-                'running_count': 0,
-                'running_thread_ids': []
-            }
-        
-        thread_ids = [thread['thread_id'] for thread in threads_result.data]
-        logger.debug(f"Found {len(thread_ids)} threads for account {account_id}")
-        
-        # Query for running agent runs within the past 24 hours for these threads
-        from utils.query_utils import batch_query_in
-        
-        running_runs = await batch_query_in(
-            client=client,
-            table_name='agent_runs',
-            select_fields='id, thread_id, started_at',
-            in_field='thread_id',
-            in_values=thread_ids,
-            additional_filters={
-                'status': 'running',
-                'started_at_gte': twenty_four_hours_ago_iso
-            }
-        )
-        
-        running_count = len(running_runs)
-        running_thread_ids = [run['thread_id'] for run in running_runs]
+        try:
+            queued = await run_scheduler.queued_runs(agent_run_id for agent_run_id, _ in runs)
+            runs = [run for run in runs if run[0] not in queued]
+        except Exception as redis_error:
+            logger.warning(f"Could not exclude queued runs for account {account_id}: {str(redis_error)}")
+
+        running_count = len(runs)
+        running_thread_ids = [thread_id for _, thread_id in runs]
         
         logger.debug(f"Account {account_id} has {running_count} running agent runs in the past 24 hours")
         
-        result = {
+        return {
             'can_start': running_count < config.MAX_PARALLEL_AGENT_RUNS,
             'running_count': running_count,
             'running_thread_ids': running_thread_ids
         }
-        await Cache.set(f"agent_run_limit:{account_id}", result)
-        return result
 
     except Exception as e:
         logger.error(f"Error checking agent run limit for account {account_id}: {str(e)}")
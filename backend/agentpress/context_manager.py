@@ -6,7 +6,8 @@ reaching the context window limitations of LLM models.
 """
 
 import json
-from typing import List, Dict, Any, Optional, Union
+import hashlib
+from typing import List, Dict, Any, Optional, Union, Callable, Tuple
 
 from litellm.utils import token_counter
 from services.supabase import DBConnection
@@ -14,18 +15,53 @@ from utils.logger import logger
 from models import model_manager
 
 DEFAULT_TOKEN_THRESHOLD = 120000
+TOKEN_CACHE_MAX_ENTRIES = 20000
 
 class ContextManager:
     """Manages thread context including token counting and summarization."""
     
-    def __init__(self, token_threshold: int = DEFAULT_TOKEN_THRESHOLD):
+    def __init__(self, token_threshold: int = DEFAULT_TOKEN_THRESHOLD, enable_token_cache: bool = True):
         """Initialize the ContextManager.
         
         Args:
             token_threshold: Token count threshold to trigger summarization
+            enable_token_cache: Cache per-message token counts by message_id and content hash
         """
         self.db = DBConnection()
         self.token_threshold = token_threshold
+        self.enable_token_cache = enable_token_cache
+        self._token_cache: Dict[Tuple[str, str, str], int] = {}
+
+    def _message_cache_key(self, msg: Dict[str, Any], llm_model: str) -> Tuple[str, str, str]:
+        """Build the token cache key for a message: (model, message_id, content hash)."""
+        serialized = json.dumps(msg, sort_keys=True, default=str)
+        content_hash = hashlib.blake2b(serialized.encode('utf-8'), digest_size=16).hexdigest()
+        return (llm_model, str(msg.get('message_id') or ''), content_hash)
+
+    def count_message_tokens(self, msg: Dict[str, Any], llm_model: str) -> int:
+        """Count the tokens of a single message, using the token cache when enabled."""
+        if not self.enable_token_cache or not isinstance(msg, dict):
+            return token_counter(model=llm_model, messages=[msg])
+
+        key = self._message_cache_key(msg, llm_model)
+        count = self._token_cache.get(key)
+        if count is None:
+            count = token_counter(model=llm_model, messages=[msg])
+            if len(self._token_cache) >= TOKEN_CACHE_MAX_ENTRIES:
+                self._token_cache.clear()
+            self._token_cache[key] = count
+        return count
+
+    def count_tokens(self, messages: List[Dict[str, Any]], llm_model: str) -> int:
+        """Count the tokens of a message list.
+
+        With the token cache enabled this is the sum of cached per-message counts,
+        which slightly overestimates litellm's whole-list count (per-message framing
+        tokens are counted once per message), keeping compression decisions conservative.
+        """
+        if not self.enable_token_cache:
+            return token_counter(model=llm_model, messages=messages)
+        return sum(self.count_message_tokens(msg, llm_model) for msg in messages)
 
     def is_tool_result_message(self, msg: Dict[str, Any]) -> bool:
         """Check if a message is a tool result message."""
@@ -108,78 +144,65 @@ class ContextManager:
             else:
                 return msg_content
   
-    def compress_tool_result_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: int = 1000) -> List[Dict[str, Any]]:
-        """Compress the tool result messages except the most recent one."""
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=messages)
+    def _compress_matching_messages(
+            self,
+            messages: List[Dict[str, Any]],
+            llm_model: str,
+            max_tokens: Optional[int],
+            token_threshold: int,
+            predicate: Callable[[Dict[str, Any]], bool],
+            total_token_count: Optional[int] = None
+        ) -> Tuple[List[Dict[str, Any]], int]:
+        """Compress messages matching predicate except the most recent one.
+
+        The running total is updated as messages are compressed, so a pass costs one
+        tokenization per message instead of recounting the whole list.
+
+        Returns:
+            The messages and their updated total token count.
+        """
+        if total_token_count is None:
+            total_token_count = self.count_tokens(messages, llm_model)
         max_tokens_value = max_tokens or (100 * 1000)
 
-        if uncompressed_total_token_count > max_tokens_value:
-            _i = 0  # Count the number of ToolResult messages
-            for msg in reversed(messages):  # Start from the end and work backwards
+        if total_token_count > max_tokens_value:
+            _i = 0  # Count the number of matching messages
+            for index in range(len(messages) - 1, -1, -1):  # Start from the end and work backwards
+                msg = messages[index]
                 if not isinstance(msg, dict):
                     continue  # Skip non-dict messages
-                if self.is_tool_result_message(msg):  # Only compress ToolResult messages
-                    _i += 1  # Count the number of ToolResult messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
+                if predicate(msg):  # Only compress matching messages
+                    _i += 1  # Count the number of matching messages
+                    msg_token_count = self.count_message_tokens(msg, llm_model)  # Count the number of tokens in the message
                     if msg_token_count > token_threshold:  # If the message is too long
-                        if _i > 1:  # If this is not the most recent ToolResult message
+                        if _i > 1:  # If this is not the most recent matching message
                             message_id = msg.get('message_id')  # Get the message_id
                             if message_id:
-                                msg["content"] = self.compress_message(msg["content"], message_id, token_threshold * 3)
+                                content = self.compress_message(msg["content"], message_id, token_threshold * 3)
                             else:
                                 logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
+                                continue
                         else:
-                            msg["content"] = self.safe_truncate(msg["content"], int(max_tokens_value * 2))
-        return messages
+                            content = self.safe_truncate(msg["content"], int(max_tokens_value * 2))
+                        # Replace rather than edit the message, which may be shared with the MessageCache
+                        msg = messages[index] = {**msg, "content": content}
+                        total_token_count += self.count_message_tokens(msg, llm_model) - msg_token_count
+        return messages, total_token_count
+
+    def compress_tool_result_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: int = 1000) -> List[Dict[str, Any]]:
+        """Compress the tool result messages except the most recent one."""
+        result, _ = self._compress_matching_messages(messages, llm_model, max_tokens, token_threshold, self.is_tool_result_message)
+        return result
 
     def compress_user_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: int = 1000) -> List[Dict[str, Any]]:
         """Compress the user messages except the most recent one."""
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=messages)
-        max_tokens_value = max_tokens or (100 * 1000)
-
-        if uncompressed_total_token_count > max_tokens_value:
-            _i = 0  # Count the number of User messages
-            for msg in reversed(messages):  # Start from the end and work backwards
-                if not isinstance(msg, dict):
-                    continue  # Skip non-dict messages
-                if msg.get('role') == 'user':  # Only compress User messages
-                    _i += 1  # Count the number of User messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
-                    if msg_token_count > token_threshold:  # If the message is too long
-                        if _i > 1:  # If this is not the most recent User message
-                            message_id = msg.get('message_id')  # Get the message_id
-                            if message_id:
-                                msg["content"] = self.compress_message(msg["content"], message_id, token_threshold * 3)
-                            else:
-                                logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
-                        else:
-                            msg["content"] = self.safe_truncate(msg["content"], int(max_tokens_value * 2))
-        return messages
+        result, _ = self._compress_matching_messages(messages, llm_model, max_tokens, token_threshold, lambda msg: msg.get('role') == 'user')
+        return result
 
     def compress_assistant_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: int = 1000) -> List[Dict[str, Any]]:
         """Compress the assistant messages except the most recent one."""
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=messages)
-        max_tokens_value = max_tokens or (100 * 1000)
-        
-        if uncompressed_total_token_count > max_tokens_value:
-            _i = 0  # Count the number of Assistant messages
-            for msg in reversed(messages):  # Start from the end and work backwards
-                if not isinstance(msg, dict):
-                    continue  # Skip non-dict messages
-                if msg.get('role') == 'assistant':  # Only compress Assistant messages
-                    _i += 1  # Count the number of Assistant messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
-                    if msg_token_count > token_threshold:  # If the message is too long
-                        if _i > 1:  # If this is not the most recent Assistant message
-                            message_id = msg.get('message_id')  # Get the message_id
-                            if message_id:
-                                msg["content"] = self.compress_message(msg["content"], message_id, token_threshold * 3)
-                            else:
-                                logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
-                        else:
-                            msg["content"] = self.safe_truncate(msg["content"], int(max_tokens_value * 2))
-                            
-        return messages
+        result, _ = self._compress_matching_messages(messages, llm_model, max_tokens, token_threshold, lambda msg: msg.get('role') == 'assistant')
+        return result
 
     def remove_meta_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Remove meta messages from the messages."""
@@ -238,13 +261,11 @@ class ContextManager:
         result = messages
         result = self.remove_meta_messages(result)
 
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=result)
+        uncompressed_total_token_count = self.count_tokens(result, llm_model)
 
-        result = self.compress_tool_result_messages(result, llm_model, max_tokens, token_threshold)
-        result = self.compress_user_messages(result, llm_model, max_tokens, token_threshold)
-        result = self.compress_assistant_messages(result, llm_model, max_tokens, token_threshold)
-
-        compressed_token_count = token_counter(model=llm_model, messages=result)
+        result, compressed_token_count = self._compress_matching_messages(result, llm_model, max_tokens, token_threshold, self.is_tool_result_message, uncompressed_total_token_count)
+        result, compressed_token_count = self._compress_matching_messages(result, llm_model, max_tokens, token_threshold, lambda msg: msg.get('role') == 'user', compressed_token_count)
+        result, compressed_token_count = self._compress_matching_messages(result, llm_model, max_tokens, token_threshold, lambda msg: msg.get('role') == 'assistant', compressed_token_count)
 
         logger.debug(f"compress_messages: {uncompressed_total_token_count} -> {compressed_token_count}")  # Log the token compression for debugging later
 
@@ -283,7 +304,7 @@ class ContextManager:
         result = self.remove_meta_messages(result)
 
         # Early exit if no compression needed
-        initial_token_count = token_counter(model=llm_model, messages=result)
+        initial_token_count = self.count_tokens(result, llm_model)
         max_allowed_tokens = max_tokens or (100 * 1000)
         
         if initial_token_count <= max_allowed_tokens:
@@ -308,23 +329,28 @@ class ContextManager:
                 # Remove from middle, keeping recent and early context
                 middle_start = len(conversation_messages) // 2 - (removal_batch_size // 2)
                 middle_end = middle_start + removal_batch_size
+                removed_messages = conversation_messages[middle_start:middle_end]
                 conversation_messages = conversation_messages[:middle_start] + conversation_messages[middle_end:]
             else:
                 # Remove from earlier messages, preserving recent context
                 messages_to_remove = min(removal_batch_size, len(conversation_messages) // 2)
                 if messages_to_remove > 0:
+                    removed_messages = conversation_messages[:messages_to_remove]
                     conversation_messages = conversation_messages[messages_to_remove:]
                 else:
                     # Can't remove any more messages
                     break
 
-            # Recalculate token count
-            messages_to_count = ([system_message] + conversation_messages) if system_message else conversation_messages
-            current_token_count = token_counter(model=llm_model, messages=messages_to_count)
+            # Update the running token count, or recount the whole list without the cache
+            if self.enable_token_cache:
+                current_token_count -= self.count_tokens(removed_messages, llm_model)
+            else:
+                messages_to_count = ([system_message] + conversation_messages) if system_message else conversation_messages
+                current_token_count = token_counter(model=llm_model, messages=messages_to_count)
 
         # Prepare final result
         final_messages = ([system_message] + conversation_messages) if system_message else conversation_messages
-        final_token_count = token_counter(model=llm_model, messages=final_messages)
+        final_token_count = current_token_count
         
         logger.debug(f"compress_messages_by_omitting_messages: {initial_token_count} -> {final_token_count} tokens ({len(messages)} -> {len(final_messages)} messages)")
             
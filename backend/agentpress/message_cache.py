@@ -0,0 +1,202 @@
+"""
+Per-run message cache for AgentPress threads.
+
+This module keeps the parsed LLM messages of a thread in memory for the
+lifetime of a ThreadManager (one agent run), so that repeated calls to
+get_llm_messages only fetch rows newer than the last one seen instead of
+re-paging and re-parsing the whole thread on every iteration.
+
+The cached message dicts are shared with every caller and must not be
+modified; code that changes a message (prompt caching, compression) replaces
+it in its own list with a copy.
+
+Deletes issued from other processes (e.g. the delete_message endpoint) bump a
+per-thread epoch in Redis; a cache that sees a new epoch drops its state and
+reloads the thread in full.
+"""
+
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from services import redis
+from utils.logger import logger
+
+# Rows committed slightly out of created_at order (concurrent inserts, clock
+# skew between API and worker) are picked up by re-reading this window.
+LOOKBACK_WINDOW = timedelta(seconds=5)
+BATCH_SIZE = 1000
+EPOCH_KEY_TTL = 3600 * 24
+
+
+def _epoch_key(thread_id: str) -> str:
+    return f"thread:{thread_id}:messages_epoch"
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+async def invalidate_thread_messages(thread_id: str) -> None:
+    """Signal every live message cache for a thread to reload from scratch.
+
+    Must be called after messages of a thread are deleted or rewritten, since
+    incremental loads only ever see rows that are newer than the watermark.
+    """
+    try:
+        redis_client = await redis.get_client()
+        key = _epoch_key(thread_id)
+        await redis_client.incr(key)
+        await redis_client.expire(key, EPOCH_KEY_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to bump message cache epoch for thread {thread_id}: {str(e)}")
+
+
+@dataclass
+class _ThreadState:
+    epoch: Optional[str] = None
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: List[Optional[datetime]] = field(default_factory=list)
+    seen_ids: Set[str] = field(default_factory=set)
+    watermark: Optional[datetime] = None
+
+
+class MessageCache:
+    """Incrementally loaded, parsed LLM messages keyed by thread.
+
+    Attributes:
+        hits: Messages served from memory without being fetched again
+        misses: Messages fetched from the database and parsed
+        full_loads: Number of complete thread loads
+        incremental_loads: Number of loads that only fetched newer rows
+        invalidations: Number of times cached state was dropped
+    """
+
+    def __init__(self, db):
+        """Initialize the cache.
+
+        Args:
+            db: DBConnection used to query the messages table
+        """
+        self.db = db
+        self._threads: Dict[str, _ThreadState] = {}
+        self.hits = 0
+        self.misses = 0
+        self.full_loads = 0
+        self.incremental_loads = 0
+        self.invalidations = 0
+
+    def invalidate(self, thread_id: Optional[str] = None) -> None:
+        """Drop cached messages for one thread, or for all threads if None."""
+        if thread_id is None:
+            dropped = len(self._threads)
+            self._threads.clear()
+        else:
+            dropped = 1 if self._threads.pop(thread_id, None) is not None else 0
+        self.invalidations += dropped
+
+    def stats(self) -> Dict[str, int]:
+        """Return the cache counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "full_loads": self.full_loads,
+            "incremental_loads": self.incremental_loads,
+            "invalidations": self.invalidations,
+        }
+
+    async def _current_epoch(self, thread_id: str) -> Optional[str]:
+        try:
+            return await redis.get(_epoch_key(thread_id))
+        except Exception as e:
+            logger.warning(f"Failed to read message cache epoch for thread {thread_id}: {str(e)}")
+            return None
+
+    async def _fetch_rows(self, thread_id: str, since: Optional[datetime]) -> List[Dict[str, Any]]:
+        client = await self.db.client
+        rows = []
+        offset = 0
+        while True:
+            query = client.table('messages').select('message_id, content, created_at') \
+                .eq('thread_id', thread_id).eq('is_llm_message', True)
+            if since is not None:
+                query = query.gte('created_at', since.isoformat())
+            result = await query.order('created_at').range(offset, offset + BATCH_SIZE - 1).execute()
+
+            if not result.data:
+                break
+            rows.extend(result.data)
+            if len(result.data) < BATCH_SIZE:
+                break
+            offset += BATCH_SIZE
+        return rows
+
+    def _append_rows(self, state: _ThreadState, rows: List[Dict[str, Any]]) -> int:
+        added = 0
+        out_of_order = False
+        for item in rows:
+            message_id = item['message_id']
+            if message_id in state.seen_ids:
+                continue
+
+            content = item['content']
+            if isinstance(content, str):
+                try:
+                    content = json.loads(content)
+                except json.JSONDecodeError:
+                    logger.error(f"Failed to parse message: {content}")
+                    state.seen_ids.add(message_id)
+                    continue
+            content['message_id'] = message_id
+
+            created_at = _parse_timestamp(item.get('created_at'))
+            if created_at is not None and state.watermark is not None and created_at < state.watermark:
+                out_of_order = True
+            state.messages.append(content)
+            state.created_at.append(created_at)
+            state.seen_ids.add(message_id)
+            if created_at is not None and (state.watermark is None or created_at > state.watermark):
+                state.watermark = created_at
+            added += 1
+
+        if out_of_order:
+            # Python's sort is stable, so rows sharing a timestamp keep fetch order
+            order = sorted(range(len(state.messages)), key=lambda i: state.created_at[i] or datetime.min.replace(tzinfo=state.watermark.tzinfo))
+            state.messages = [state.messages[i] for i in order]
+            state.created_at = [state.created_at[i] for i in order]
+        return added
+
+    async def get_messages(self, thread_id: str) -> List[Dict[str, Any]]:
+        """Get the parsed LLM messages of a thread, fetching only new rows when possible.
+
+        Returns a new list of the cached message dicts, which callers must not modify.
+        """
+        epoch = await self._current_epoch(thread_id)
+        state = self._threads.get(thread_id)
+        if state is not None and state.epoch != epoch:
+            logger.debug(f"Message cache epoch changed for thread {thread_id}, reloading")
+            self.invalidate(thread_id)
+            state = None
+
+        if state is None:
+            state = _ThreadState(epoch=epoch)
+            rows = await self._fetch_rows(thread_id, None)
+            self._threads[thread_id] = state
+            self.full_loads += 1
+        else:
+            since = state.watermark - LOOKBACK_WINDOW if state.watermark else None
+            cached_count = len(state.messages)
+            rows = await self._fetch_rows(thread_id, since)
+            self.incremental_loads += 1
+            self.hits += cached_count
+
+        added = self._append_rows(state, rows)
+        self.misses += added
+        logger.debug(f"Message cache for thread {thread_id}: {added} new, {len(state.messages)} total ({self.stats()})")
+        return list(state.messages)
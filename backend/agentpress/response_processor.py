@@ -18,7 +18,7 @@ from dataclasses import dataclass
 from utils.logger import logger
 from agentpress.tool import ToolResult
 from agentpress.tool_registry import ToolRegistry
-from agentpress.xml_tool_parser import XMLToolParser
+from agentpress.xml_tool_parser import XMLToolParser, StreamingXMLToolParser
 from langfuse.client import StatefulTraceClient
 from services.langfuse import langfuse
 from utils.json_helpers import (
@@ -216,7 +216,8 @@ class ResponseProcessor:
         continuous_state = continuous_state or {}
         accumulated_content = continuous_state.get('accumulated_content', "")
         tool_calls_buffer = {}
-        current_xml_content = accumulated_content   # equal to accumulated_content if auto-continuing, else blank
+        xml_stream_parser = StreamingXMLToolParser()
+        deferred_xml_chunks = xml_stream_parser.feed(accumulated_content)  # non-empty only if auto-continuing
         xml_chunks_buffer = []
         pending_tool_executions = []
         yielded_tool_indices = set() # Stores indices of tools whose *status* has been yielded
@@ -291,10 +292,16 @@ class ResponseProcessor:
                         streaming_metadata["usage"]["completion_tokens"] = chunk.usage.completion_tokens
                     if hasattr(chunk.usage, 'total_tokens') and chunk.usage.total_tokens is not None:
                         streaming_metadata["usage"]["total_tokens"] = chunk.usage.total_tokens
+                    # Prompt caching; recorded so cache hit rates show up in usage data, and
+                    # priced per provider by billing.calculate_token_cost
+                    for cache_field in ("cache_read_input_tokens", "cache_creation_input_tokens"):
+                        cache_tokens = getattr(chunk.usage, cache_field, None)
+                        if isinstance(cache_tokens, int) and cache_tokens > 0:
+                            streaming_metadata["usage"][cache_field] = cache_tokens
 
                 if hasattr(chunk, 'choices') and chunk.choices and hasattr(chunk.choices[0], 'finish_reason') and chunk.choices[0].finish_reason:
                     finish_reason = chunk.choices[0].finish_reason
-                    logger.debug(f"Detected finish_reason: {finish_reason}")
+                    logger.debug("Detected finish_reason: %s", finish_reason)
 
                 if hasattr(chunk, 'choices') and chunk.choices:
                     delta = chunk.choices[0].delta if hasattr(chunk.choices[0], 'delta') else None
@@ -313,7 +320,7 @@ class ResponseProcessor:
                         chunk_content = delta.content
                         # print(chunk_content, end='', flush=True)
                         accumulated_content += chunk_content
-                        current_xml_content += chunk_content
+                        new_xml_chunks = xml_stream_parser.feed(chunk_content)
 
                         if not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
                             # Yield ONLY content chunk (don't save)
@@ -333,9 +340,9 @@ class ResponseProcessor:
 
                         # --- Process XML Tool Calls (if enabled and limit not reached) ---
                         if config.xml_tool_calling and not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
-                            xml_chunks = self._extract_xml_chunks(current_xml_content)
-                            for xml_chunk in xml_chunks:
-                                current_xml_content = current_xml_content.replace(xml_chunk, "", 1)
+                            xml_chunks = deferred_xml_chunks + new_xml_chunks
+                            deferred_xml_chunks = []
+                            for chunk_position, xml_chunk in enumerate(xml_chunks):
                                 xml_chunks_buffer.append(xml_chunk)
                                 result = self._parse_xml_tool_call(xml_chunk)
                                 if result:
@@ -362,7 +369,11 @@ class ResponseProcessor:
                                     if config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls:
                                         logger.debug(f"Reached XML tool call limit ({config.max_xml_tool_calls})")
                                         finish_reason = "xml_tool_limit_reached"
+                                        deferred_xml_chunks = xml_chunks[chunk_position + 1:]
                                         break # Stop processing more XML chunks in this delta
+                        else:
+                            # Keep completed blocks for the end-of-stream pass
+                            deferred_xml_chunks.extend(new_xml_chunks)
 
                     # --- Process Native Tool Call Chunks ---
                     if config.native_tool_calling and delta and hasattr(delta, 'tool_calls') and delta.tool_calls:
@@ -486,7 +497,7 @@ class ResponseProcessor:
                     
                     # Check if status was already yielded during stream run
                     if tool_idx in yielded_tool_indices:
-                         logger.debug(f"Status for tool index {tool_idx} already yielded.")
+                         logger.debug("Status for tool index %s already yielded.", tool_idx)
                          # Still need to process the result for the buffer
                          try:
                              if execution["task"].done():
@@ -621,9 +632,8 @@ class ResponseProcessor:
                  # Gather XML tool calls from buffer (up to limit)
                 parsed_xml_data = []
                 if config.xml_tool_calling:
-                    # Reparse remaining content just in case (should be empty if processed correctly)
-                    xml_chunks = self._extract_xml_chunks(current_xml_content)
-                    xml_chunks_buffer.extend(xml_chunks)
+                    # Add blocks that completed after the limit was reached (should be empty if processed correctly)
+                    xml_chunks_buffer.extend(deferred_xml_chunks)
                     # Process only chunks not already handled in the stream loop
                     remaining_limit = config.max_xml_tool_calls - xml_tool_call_count if config.max_xml_tool_calls > 0 else len(xml_chunks_buffer)
                     xml_chunks_to_process = xml_chunks_buffer[:remaining_limit] # Ensure limit is respected
@@ -1226,7 +1236,7 @@ class ResponseProcessor:
                 parsing_details = xml_tool_call.parsing_details
                 parsing_details["raw_xml"] = xml_tool_call.raw_xml
                 
-                logger.debug(f"Parsed new format tool call: {tool_call}")
+                logger.debug("Parsed new format tool call: %s", tool_call)
                 return tool_call, parsing_details
             
             # If not the expected <function_calls><invoke> format, return None
@@ -1273,7 +1283,7 @@ class ResponseProcessor:
             function_name = tool_call["function_name"]
             arguments = tool_call["arguments"]
 
-            logger.debug(f"Executing tool: {function_name} with arguments: {arguments}")
+            logger.debug("Executing tool: %s with arguments: %s", function_name, arguments)
             self.trace.event(name="executing_tool", level="DEFAULT", status_message=(f"Executing tool: {function_name} with arguments: {arguments}"))
             
             if isinstance(arguments, str):
@@ -1282,19 +1292,16 @@ class ResponseProcessor:
                 except json.JSONDecodeError:
                     arguments = {"text": arguments}
             
-            # Get available functions from tool registry
-            available_functions = self.tool_registry.get_available_functions()
-            
-            # Look up the function by name
-            tool_fn = available_functions.get(function_name)
+            # Look up the function in the tool registry's dispatch table
+            tool_fn = self.tool_registry.get_function(function_name)
             if not tool_fn:
                 logger.error(f"Tool function '{function_name}' not found in registry")
                 span.end(status_message="tool_not_found", level="ERROR")
                 return ToolResult(success=False, output=f"Tool function '{function_name}' not found")
             
-            logger.debug(f"Found tool function for '{function_name}', executing...")
+            logger.debug("Found tool function for '%s', executing...", function_name)
             result = await tool_fn(**arguments)
-            logger.debug(f"Tool execution complete: {function_name} -> {result}")
+            logger.debug("Tool execution complete: %s -> %s", function_name, result)
             span.end(status_message="tool_executed", output=result)
             return result
         except Exception as e:
@@ -1355,12 +1362,12 @@ class ResponseProcessor:
             results = []
             for index, tool_call in enumerate(tool_calls):
                 tool_name = tool_call.get('function_name', 'unknown')
-                logger.debug(f"Executing tool {index+1}/{len(tool_calls)}: {tool_name}")
+                logger.debug("Executing tool %s/%s: %s", index + 1, len(tool_calls), tool_name)
                 
                 try:
                     result = await self._execute_tool(tool_call)
                     results.append((tool_call, result))
-                    logger.debug(f"Completed tool {tool_name} with success={result.success}")
+                    logger.debug("Completed tool %s with success=%s", tool_name, result.success)
                     
                     # Check if this is a terminating tool (ask or complete)
                     if tool_name in ['ask', 'complete']:
@@ -1472,7 +1479,7 @@ class ResponseProcessor:
             metadata = {}
             if assistant_message_id:
                 metadata["assistant_message_id"] = assistant_message_id
-                logger.debug(f"Linking tool result to assistant message: {assistant_message_id}")
+                logger.debug("Linking tool result to assistant message: %s", assistant_message_id)
                 self.trace.event(name="linking_tool_result_to_assistant_message", level="DEFAULT", status_message=(f"Linking tool result to assistant message: {assistant_message_id}"))
             
             # --- Add parsing details to metadata if available ---
@@ -1502,7 +1509,7 @@ class ResponseProcessor:
                     # Fallback to string representation of the whole result
                     content = str(result)
                 
-                logger.debug(f"Formatted tool result content: {content[:100]}...")
+                logger.debug("Formatted tool result content: %.100s...", content)
                 self.trace.event(name="formatted_tool_result_content", level="DEFAULT", status_message=(f"Formatted tool result content: {content[:100]}..."))
                 
                 # Create the tool response message with proper format
@@ -1513,7 +1520,7 @@ class ResponseProcessor:
                     "content": content
                 }
                 
-                logger.debug(f"Adding native tool result for tool_call_id={tool_call['id']} with role=tool")
+                logger.debug("Adding native tool result for tool_call_id=%s with role=tool", tool_call['id'])
                 self.trace.event(name="adding_native_tool_result_for_tool_call_id", level="DEFAULT", status_message=(f"Adding native tool result for tool_call_id={tool_call['id']} with role=tool"))
                 
                 # Add as a tool message to the conversation history
@@ -10,12 +10,15 @@ This module provides comprehensive conversation management, including:
 - Context summarization to manage token limits
 """
 
+import copy
+import hashlib
 import json
 from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator, Literal, cast
-from services.llm import make_llm_api_call
+from services.llm import make_llm_api_call, PromptCachePlanner
 from agentpress.tool import Tool
 from agentpress.tool_registry import ToolRegistry
 from agentpress.context_manager import ContextManager
+from agentpress.message_cache import MessageCache
 from agentpress.response_processor import (
     ResponseProcessor,
     ProcessorConfig
@@ -24,8 +27,8 @@ from services.supabase import DBConnection
 from utils.logger import logger
 from langfuse.client import StatefulGenerationClient, StatefulTraceClient
 from services.langfuse import langfuse
-from litellm.utils import token_counter
 from services.billing import calculate_token_cost, handle_usage_with_credits
+from services import monthly_usage
 import re
 from datetime import datetime, timezone, timedelta
 import aiofiles
@@ -34,6 +37,9 @@ import yaml
 # Type alias for tool choice
 ToolChoice = Literal["auto", "required", "none"]
 
+# Distinct rendered system prompts kept per ThreadManager (one per agent run)
+MAX_RENDERED_SYSTEM_PROMPTS = 8
+
 class ThreadManager:
     """Manages conversation threads with LLM models and tool execution.
 
@@ -65,6 +71,9 @@ class ThreadManager:
             agent_config=self.agent_config
         )
         self.context_manager = ContextManager()
+        self.message_cache = MessageCache(self.db)
+        self._rendered_system_prompts: Dict[str, Dict[str, Any]] = {}
+        self.prompt_cache_planner = PromptCachePlanner()
 
     def add_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
         """Add a tool to the ThreadManager."""
@@ -179,11 +188,23 @@ class ThreadManager:
                         completion_tokens = int(usage.get("completion_tokens", 0) or 0)
                         model = content.get("model") if isinstance(content, dict) else None
                         # Compute token cost
-                        token_cost = calculate_token_cost(prompt_tokens, completion_tokens, model or "unknown")
+                        token_cost = calculate_token_cost(
+                            prompt_tokens,
+                            completion_tokens,
+                            model or "unknown",
+                            cache_read_tokens=usage.get("cache_read_input_tokens", 0),
+                            cache_creation_tokens=usage.get("cache_creation_input_tokens", 0),
+                        )
                         # Fetch account_id for this thread, which equals user_id for personal accounts
                         thread_row = await client.table('threads').select('account_id').eq('thread_id', thread_id).limit(1).execute()
                         user_id = thread_row.data[0]['account_id'] if thread_row.data and len(thread_row.data) > 0 else None
                         if user_id and token_cost > 0:
+                            # Add to the materialized monthly aggregate first, so it matches
+                            # a usage scan that already includes the message inserted above
+                            try:
+                                await monthly_usage.increment_usage(user_id, token_cost)
+                            except Exception as usage_e:
+                                logger.warning(f"Failed to update monthly usage aggregate for {user_id}: {str(usage_e)}")
                             # Deduct credits if applicable and record usage against this message
                             await handle_usage_with_credits(
                                 client,
@@ -206,8 +227,8 @@ class ThreadManager:
     async def get_llm_messages(self, thread_id: str) -> List[Dict[str, Any]]:
         """Get all messages for a thread.
 
-        This method uses the SQL function which handles context truncation
-        by considering summary messages.
+        Messages are served from the per-run MessageCache, which only fetches
+        rows newer than the last one it has seen after the first call.
 
         Args:
             thread_id: The ID of the thread to get messages for.
@@ -216,58 +237,120 @@ class ThreadManager:
             List of message objects.
         """
         logger.debug(f"Getting messages for thread {thread_id}")
-        client = await self.db.client
 
         try:
-            # result = await client.rpc('get_llm_formatted_messages', {'p_thread_id': thread_id}).execute()
-            
-            # Fetch messages in batches of 1000 to avoid overloading the database
-            all_messages = []
-            batch_size = 1000
-            offset = 0
-            
-            while True:
-                result = await client.table('messages').select('message_id, content').eq('thread_id', thread_id).eq('is_llm_message', True).order('created_at').range(offset, offset + batch_size - 1).execute()
-                
-                if not result.data or len(result.data) == 0:
-                    break
-                    
-                all_messages.extend(result.data)
-                
-                # If we got fewer than batch_size records, we've reached the end
-                if len(result.data) < batch_size:
-                    break
-                    
-                offset += batch_size
-            
-            # Use all_messages instead of result.data in the rest of the method
-            result_data = all_messages
+            return await self.message_cache.get_messages(thread_id)
+        except Exception as e:
+            logger.error(f"Failed to get messages for thread {thread_id}: {str(e)}", exc_info=True)
+            self.message_cache.invalidate(thread_id)
+            return []
 
-            # Parse the returned data which might be stringified JSON
-            if not result_data:
-                return []
 
-            # Return properly parsed JSON objects
-            messages = []
-            for item in result_data:
-                if isinstance(item['content'], str):
-                    try:
-                        parsed_item = json.loads(item['content'])
-                        parsed_item['message_id'] = item['message_id']
-                        messages.append(parsed_item)
-                    except json.JSONDecodeError:
-                        logger.error(f"Failed to parse message: {item['content']}")
-                else:
-                    content = item['content']
-                    content['message_id'] = item['message_id']
-                    messages.append(content)
+    def _build_xml_examples_content(self) -> Optional[str]:
+        """Build the XML tool calling instructions for the registered tools."""
+        openapi_schemas = self.tool_registry.get_openapi_schemas()
+        usage_examples = self.tool_registry.get_usage_examples()
+        
+        if not openapi_schemas:
+            return None
 
-            return messages
+        # Convert schemas to JSON string
+        schemas_json = json.dumps(openapi_schemas, indent=2)
+        
+        # Build usage examples section if any exist
+        usage_examples_section = ""
+        if usage_examples:
+            usage_examples_section = "\n\nUsage Examples:\n"
+            for func_name, example in usage_examples.items():
+                usage_examples_section += f"\n{func_name}:\n{example}\n"
+        
+        examples_content = f"""
+In this environment you have access to a set of tools you can use to answer the user's question.
 
-        except Exception as e:
-            logger.error(f"Failed to get messages for thread {thread_id}: {str(e)}", exc_info=True)
-            return []
+You can invoke functions by writing a <function_calls> block like the following as part of your reply to the user:
+
+<function_calls>
+<invoke name="function_name">
+<parameter name="param_name">param_value</parameter>
+...
+</invoke>
+</function_calls>
+
+String and scalar parameters should be specified as-is, while lists and objects should use JSON format.
+
+Here are the functions available in JSON Schema format:
+
+```json
+{schemas_json}
+```
+
+When using the tools:
+- Use the exact function names from the JSON schema above
+- Include all required parameters as specified in the schema
+- Format complex data (objects, arrays) as JSON strings within the parameter tags
+- Boolean values should be "true" or "false" (lowercase)
+{usage_examples_section}"""
 
+        return examples_content
+
+    def _render_system_prompt(self, system_prompt: Dict[str, Any], include_xml_examples: bool) -> Dict[str, Any]:
+        """Get the final system prompt, rendering it only when its inputs change.
+
+        The cache key covers the base prompt (which carries the agent config and
+        MCP instructions) and the registry fingerprint (tools and MCP schemas).
+
+        Args:
+            system_prompt: Base system message
+            include_xml_examples: Whether to append the XML tool calling instructions
+
+        Returns:
+            Dict with the rendered "message" and a per-model "tokens" count cache.
+            Callers must copy the message before mutating it.
+        """
+        prompt_json = json.dumps(system_prompt, sort_keys=True, default=str)
+        fingerprint = hashlib.blake2b(
+            f"{include_xml_examples}:{self.tool_registry.fingerprint() if include_xml_examples else ''}:{prompt_json}".encode(),
+            digest_size=16
+        ).hexdigest()
+        rendered = self._rendered_system_prompts.get(fingerprint)
+        if rendered is not None:
+            return rendered
+
+        working_system_prompt = copy.deepcopy(system_prompt)
+        examples_content = self._build_xml_examples_content() if include_xml_examples else None
+        if examples_content:
+            system_content = working_system_prompt.get('content')
+
+            if isinstance(system_content, str):
+                working_system_prompt['content'] += examples_content
+                logger.debug("Appended XML examples to string system prompt content.")
+            elif isinstance(system_content, list):
+                appended = False
+                for item in working_system_prompt['content']: # Modify the copy
+                    if isinstance(item, dict) and item.get('type') == 'text' and 'text' in item:
+                        item['text'] += examples_content
+                        logger.debug("Appended XML examples to the first text block in list system prompt content.")
+                        appended = True
+                        break
+                if not appended:
+                    logger.warning("System prompt content is a list but no text block found to append XML examples.")
+            else:
+                logger.warning(f"System prompt content is of unexpected type ({type(system_content)}), cannot add XML examples.")
+
+        if len(self._rendered_system_prompts) >= MAX_RENDERED_SYSTEM_PROMPTS:
+            self._rendered_system_prompts.clear()
+        rendered = {"message": working_system_prompt, "tokens": {}}
+        self._rendered_system_prompts[fingerprint] = rendered
+        logger.debug(f"Rendered system prompt {fingerprint} (XML examples: {bool(examples_content)})")
+        return rendered
+
+    def _system_prompt_tokens(self, rendered_prompt: Dict[str, Any], llm_model: str) -> int:
+        """Token count of a rendered system prompt, computed once per model."""
+        tokens = rendered_prompt["tokens"].get(llm_model)
+        if tokens is None:
+            tokens = self.context_manager.count_tokens([rendered_prompt["message"]], llm_model)
+            rendered_prompt["tokens"][llm_model] = tokens
+        return tokens
 
     async def run_thread(
         self,
@@ -287,6 +370,7 @@ class ThreadManager:
         reasoning_effort: Optional[str] = 'low',
         enable_context_manager: bool = True,
         generation: Optional[StatefulGenerationClient] = None,
+        continuous_state: Optional[Dict[str, Any]] = None,
     ) -> Union[Dict[str, Any], AsyncGenerator]:
         """Run a conversation thread with LLM integration and tool execution.
 
@@ -307,6 +391,9 @@ class ThreadManager:
             enable_thinking: Whether to enable thinking before making a decision
             reasoning_effort: The effort level for reasoning
             enable_context_manager: Whether to enable automatic context summarization.
+            continuous_state: Optional auto-continue state to resume from. It is
+                updated in place whenever a segment finishes, so callers can
+                checkpoint it and pass it back after an interruption.
 
         Returns:
             An async generator yielding response chunks or error dict
@@ -327,87 +414,20 @@ class ThreadManager:
         if max_xml_tool_calls > 0 and not config.max_xml_tool_calls:
             config.max_xml_tool_calls = max_xml_tool_calls
 
-        # Create a working copy of the system prompt to potentially modify
-        working_system_prompt = system_prompt.copy()
-
-        # Add XML tool calling instructions to system prompt if requested
-        if include_xml_examples and config.xml_tool_calling:
-            openapi_schemas = self.tool_registry.get_openapi_schemas()
-            usage_examples = self.tool_registry.get_usage_examples()
-            
-            if openapi_schemas:
-                # Convert schemas to JSON string
-                schemas_json = json.dumps(openapi_schemas, indent=2)
-                
-                # Build usage examples section if any exist
-                usage_examples_section = ""
-                if usage_examples:
-                    usage_examples_section = "\n\nUsage Examples:\n"
-                    for func_name, example in usage_examples.items():
-                        usage_examples_section += f"\n{func_name}:\n{example}\n"
-                
-                examples_content = f"""
-In this environment you have access to a set of tools you can use to answer the user's question.
-
-You can invoke functions by writing a <function_calls> block like the following as part of your reply to the user:
-
-<function_calls>
-<invoke name="function_name">
-<parameter name="param_name">param_value</parameter>
-...
-</invoke>
-</function_calls>
-
-String and scalar parameters should be specified as-is, while lists and objects should use JSON format.
-
-Here are the functions available in JSON Schema format:
-
-```json
-{schemas_json}
-```
-
-When using the tools:
-- Use the exact function names from the JSON schema above
-- Include all required parameters as specified in the schema
-- Format complex data (objects, arrays) as JSON strings within the parameter tags
-- Boolean values should be "true" or "false" (lowercase)
-{usage_examples_section}"""
-
-                # # Save examples content to a file
-                # try:
-                #     with open('xml_examples.txt', 'w') as f:
-                #         f.write(examples_content)
-                #     logger.debug("Saved XML examples to xml_examples.txt")
-                # except Exception as e:
-                #     logger.error(f"Failed to save XML examples to file: {e}")
-
-                system_content = working_system_prompt.get('content')
-
-                if isinstance(system_content, str):
-                    working_system_prompt['content'] += examples_content
-                    logger.debug("Appended XML examples to string system prompt content.")
-                elif isinstance(system_content, list):
-                    appended = False
-                    for item in working_system_prompt['content']: # Modify the copy
-                        if isinstance(item, dict) and item.get('type') == 'text' and 'text' in item:
-                            item['text'] += examples_content
-                            logger.debug("Appended XML examples to the first text block in list system prompt content.")
-                            appended = True
-                            break
-                    if not appended:
-                        logger.warning("System prompt content is a list but no text block found to append XML examples.")
-                else:
-                    logger.warning(f"System prompt content is of unexpected type ({type(system_content)}), cannot add XML examples.")
+        # Rendered once per distinct prompt and tool set, so the system prompt stays
+        # byte-identical across iterations and auto-continues
+        rendered_prompt = self._render_system_prompt(system_prompt, include_xml_examples and config.xml_tool_calling)
+        working_system_prompt = rendered_prompt["message"]
         
+        # Shared state for continuous streaming across auto-continues
+        if continuous_state is None:
+            continuous_state = {}
+        continuous_state.setdefault('accumulated_content', '')
+        continuous_state.setdefault('thread_run_id', None)
+
         # Control whether we need to auto-continue due to tool_calls finish reason
         auto_continue = True
-        auto_continue_count = 0
-        
-        # Shared state for continuous streaming across auto-continues
-        continuous_state = {
-            'accumulated_content': '',
-            'thread_run_id': None
-        }
+        auto_continue_count = continuous_state.get('auto_continue_count', 0)
 
         # Define inner function to handle a single run
         async def _run_once(temp_msg=None):
@@ -422,17 +442,17 @@ When using the tools:
                 # 2. Check token count before proceeding
                 token_count = 0
                 try:
-                    # Use the potentially modified working_system_prompt for token counting
-                    token_count = token_counter(model=llm_model, messages=[working_system_prompt] + messages)
+                    # The rendered system prompt's count is cached alongside it
+                    token_count = self._system_prompt_tokens(rendered_prompt, llm_model) + self.context_manager.count_tokens(messages, llm_model)
                     token_threshold = self.context_manager.token_threshold
-                    logger.debug(f"Thread {thread_id} token count: {token_count}/{token_threshold} ({(token_count/token_threshold)*100:.1f}%)")
+                    logger.debug("Thread %s token count: %s/%s (%.1f%%)", thread_id, token_count, token_threshold, (token_count / token_threshold) * 100)
 
                 except Exception as e:
                     logger.error(f"Error counting tokens or summarizing: {str(e)}")
 
                 # 3. Prepare messages for LLM call + add temporary message if it exists
-                # Use the working_system_prompt which may contain the XML examples
-                prepared_messages = [working_system_prompt]
+                # Use a copy of the rendered system prompt, since prompt caching marks messages in place
+                prepared_messages = [copy.deepcopy(working_system_prompt)]
 
                 # Find the last user message index
                 last_user_index = -1
@@ -502,7 +522,8 @@ When using the tools:
                         tool_choice=tool_choice if config.native_tool_calling else "none",
                         stream=stream,
                         enable_thinking=enable_thinking,
-                        reasoning_effort=reasoning_effort
+                        reasoning_effort=reasoning_effort,
+                        cache_planner=self.prompt_cache_planner
                     )
                     logger.debug("Successfully received raw LLM API response stream/object")
 
@@ -564,6 +585,8 @@ When using the tools:
             while auto_continue and (native_max_auto_continues == 0 or auto_continue_count < native_max_auto_continues):
                 # Reset auto_continue for this iteration
                 auto_continue = False
+                # Recorded only once the previous segment has updated the rest of the state
+                continuous_state['auto_continue_count'] = auto_continue_count
 
                 # Run the thread once, passing the potentially modified system prompt
                 # Pass temp_msg only on the first iteration
@@ -48,6 +48,9 @@ class Tool(ABC):
     Provides the foundation for implementing tools with schema registration
     and result handling capabilities.
     
+    Schemas are discovered once per subclass, on first instantiation, and cached
+    on the class; each instance only gets a shallow copy of that mapping.
+    
     Attributes:
         _schemas (Dict[str, List[ToolSchema]]): Registered schemas for tool methods
         
@@ -63,12 +66,29 @@ class Tool(ABC):
         logger.debug(f"Initializing tool class: {self.__class__.__name__}")
         self._register_schemas()
 
+    @classmethod
+    def get_class_schemas(cls) -> Dict[str, List[ToolSchema]]:
+        """Get the schemas of all decorated methods of this class.
+        
+        Discovered with a single scan per class and cached on it. Subclasses
+        get their own cache, since it is looked up in the class's own __dict__.
+        
+        Returns:
+            Dict mapping method names to their schema definitions
+        """
+        schemas = cls.__dict__.get('_class_schemas')
+        if schemas is None:
+            schemas = {}
+            for name, member in inspect.getmembers(cls, predicate=lambda m: inspect.isfunction(m) or inspect.ismethod(m)):
+                if hasattr(member, 'tool_schemas'):
+                    schemas[name] = member.tool_schemas
+            cls._class_schemas = schemas
+            logger.debug(f"Discovered schemas for {len(schemas)} methods in {cls.__name__}")
+        return schemas
+
     def _register_schemas(self):
         """Register schemas from all decorated methods."""
-        for name, method in inspect.getmembers(self, predicate=inspect.ismethod):
-            if hasattr(method, 'tool_schemas'):
-                self._schemas[name] = method.tool_schemas
-                logger.debug(f"Registered schemas for method '{name}' in {self.__class__.__name__}")
+        self._schemas.update(self.get_class_schemas())
 
     def get_schemas(self) -> Dict[str, List[ToolSchema]]:
         """Get all registered tool schemas.
@@ -1,7 +1,8 @@
-from typing import Dict, Type, Any, List, Optional, Callable
+from typing import Dict, Type, Any, List, Optional, Callable, Tuple
 from agentpress.tool import Tool, SchemaType
 from utils.logger import logger
 import json
+import hashlib
 
 
 class ToolRegistry:
@@ -22,6 +23,9 @@ class ToolRegistry:
     def __init__(self):
         """Initialize a new ToolRegistry instance."""
         self.tools = {}
+        # Function name -> (tool instance, bound method); entries are rebound if
+        # self.tools[name] is replaced with another instance
+        self._dispatch: Dict[str, Tuple[Tool, Callable]] = {}
         logger.debug("Initialized new ToolRegistry instance")
     
     def register_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
@@ -53,7 +57,7 @@ class ToolRegistry:
                             "schema": schema
                         }
                         registered_openapi += 1
-                        logger.debug(f"Registered OpenAPI function {func_name} from {tool_class.__name__}")
+                        logger.debug("Registered OpenAPI function %s from %s", func_name, tool_class.__name__)
         
         logger.debug(f"Tool registration complete for {tool_class.__name__}: {registered_openapi} OpenAPI functions")
 
@@ -63,18 +67,28 @@ class ToolRegistry:
         Returns:
             Dict mapping function names to their implementations
         """
-        available_functions = {}
-        
-        # Get OpenAPI tool functions
-        for tool_name, tool_info in self.tools.items():
-            tool_instance = tool_info['instance']
-            function_name = tool_name
-            function = getattr(tool_instance, function_name)
-            available_functions[function_name] = function
-            
+        available_functions = {tool_name: self.get_function(tool_name) for tool_name in self.tools}
         logger.debug(f"Retrieved {len(available_functions)} available functions")
         return available_functions
 
+    def get_function(self, tool_name: str) -> Optional[Callable]:
+        """Get the callable for a tool function from the dispatch table.
+        
+        Args:
+            tool_name: Name of the tool function
+            
+        Returns:
+            The bound method, or None if the function is not registered
+        """
+        tool_info = self.tools.get(tool_name)
+        if not tool_info:
+            return None
+        entry = self._dispatch.get(tool_name)
+        if entry is None or entry[0] is not tool_info['instance']:
+            entry = (tool_info['instance'], getattr(tool_info['instance'], tool_name))
+            self._dispatch[tool_name] = entry
+        return entry[1]
+
     def get_tool(self, tool_name: str) -> Dict[str, Any]:
         """Get a specific tool by name.
         
@@ -103,6 +117,21 @@ class ToolRegistry:
         logger.debug(f"Retrieved {len(schemas)} OpenAPI schemas")
         return schemas
 
+    def fingerprint(self) -> str:
+        """Get a fingerprint of the registered functions.
+
+        Based on function names and the identity of their tool instances and
+        schemas, so it changes when tools are registered or replaced (including
+        direct writes to self.tools) without serializing any schema.
+
+        Returns:
+            Hex digest identifying the current set of tools
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for tool_name, tool_info in self.tools.items():
+            digest.update(f"{tool_name}:{id(tool_info['instance'])}:{id(tool_info['schema'])};".encode())
+        return digest.hexdigest()
+
     def get_usage_examples(self) -> Dict[str, str]:
         """Get usage examples for tools.
         
@@ -110,11 +139,14 @@ class ToolRegistry:
             Dict mapping function names to their usage examples
         """
         examples = {}
+        schemas_by_instance = {}
         
-        # Get all registered tools and their schemas
+        # Get all registered tools and their schemas, once per tool instance
         for tool_name, tool_info in self.tools.items():
             tool_instance = tool_info['instance']
-            all_schemas = tool_instance.get_schemas()
+            all_schemas = schemas_by_instance.get(id(tool_instance))
+            if all_schemas is None:
+                all_schemas = schemas_by_instance[id(tool_instance)] = tool_instance.get_schemas()
             
             # Look for usage examples for this function
             if tool_name in all_schemas:
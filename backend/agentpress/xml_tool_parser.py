@@ -220,6 +220,72 @@ class XMLToolParser:
         return True, None
 
 
+class StreamingXMLToolParser:
+    """
+    Incremental extractor for <function_calls> blocks in streamed content.
+    
+    Feed it each new content delta; it scans only the new text (plus a few
+    characters of overlap for tags split across deltas) and returns every
+    complete block exactly once. Text outside blocks is discarded and the
+    body of an open block is kept as a list of parts, so a long response is
+    processed in linear time regardless of how it is chunked.
+    """
+    
+    START_TAG = '<function_calls>'
+    END_TAG = '</function_calls>'
+    
+    def __init__(self):
+        self._search_tail = ''  # Possible partial start tag at the end of the consumed text
+        self._block_parts: Optional[List[str]] = None  # Parts of the currently open block
+        self._block_tail = ''  # Possible partial end tag at the end of the open block
+    
+    @property
+    def in_block(self) -> bool:
+        """Whether a <function_calls> block has been opened but not yet closed."""
+        return self._block_parts is not None
+    
+    def feed(self, text: str) -> List[str]:
+        """
+        Consume a new piece of streamed content.
+        
+        Args:
+            text: The newly received content
+            
+        Returns:
+            Complete <function_calls> blocks closed by this piece, in order
+        """
+        blocks = []
+        data = text
+        
+        while data:
+            if self._block_parts is None:
+                window = self._search_tail + data
+                start_pos = window.find(self.START_TAG)
+                if start_pos == -1:
+                    self._search_tail = window[-(len(self.START_TAG) - 1):]
+                    break
+                self._block_parts = [self.START_TAG]
+                self._block_tail = ''
+                self._search_tail = ''
+                data = window[start_pos + len(self.START_TAG):]
+            else:
+                overlap = len(self._block_tail)
+                window = self._block_tail + data
+                end_pos = window.find(self.END_TAG)
+                if end_pos == -1:
+                    self._block_parts.append(data)
+                    self._block_tail = window[-(len(self.END_TAG) - 1):]
+                    break
+                consumed = end_pos + len(self.END_TAG) - overlap
+                self._block_parts.append(data[:consumed])
+                blocks.append(''.join(self._block_parts))
+                self._block_parts = None
+                self._block_tail = ''
+                data = data[consumed:]
+        
+        return blocks
+
+
 # Convenience function for quick parsing
 def parse_xml_tool_calls(content: str) -> List[XMLToolCall]:
     """
@@ -20,6 +20,10 @@ from pydantic import BaseModel
 import uuid
 
 from agent import api as agent_api
+from agent.config_helper import sync_agent_tool_defaults
+from agent.tools.utils.mcp_session_pool import mcp_session_pool
+from services.http_client import http_pool
+from services.pubsub_hub import pubsub_hub
 
 from sandbox import api as sandbox_api
 from services import billing as billing_api
@@ -46,6 +50,7 @@ async def lifespan(app: FastAPI):
     logger.debug(f"Starting up FastAPI application with instance ID: {instance_id} in {config.ENV_MODE.value} mode")
     try:
         await db.initialize()
+        await sync_agent_tool_defaults(await db.client)
         
         agent_api.initialize(
             db,
@@ -65,7 +70,7 @@ async def lifespan(app: FastAPI):
             # Continue without Redis - the application will handle Redis failures gracefully
         
         # Start background tasks
-        # asyncio.create_task(agent_api.restore_running_agent_runs())
+        restore_task = asyncio.create_task(agent_api.restore_running_agent_runs())
         
         triggers_api.initialize(db)
         pipedream_api.initialize(db)
@@ -75,9 +80,18 @@ async def lifespan(app: FastAPI):
         
         yield
         
+        restore_task.cancel()
+        try:
+            await restore_task
+        except asyncio.CancelledError:
+            pass
+
         # Clean up agent resources
         logger.debug("Cleaning up agent resources")
         await agent_api.cleanup()
+        await mcp_session_pool.close_all()
+        await http_pool.close_all()
+        await pubsub_hub.close()
         
         # Clean up Redis connection
         try:
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark ContextManager compression with and without the token-count cache.
+
+Builds a synthetic 2,000-message thread and times compress_messages using the
+uncached path (litellm token_counter over the whole list on every check) and
+the cached path (per-message counts keyed by message_id and content hash with
+running totals). A second cached pass shows the warm-cache cost of repeating
+compression on the next agent iteration.
+"""
+
+import sys
+import os
+import copy
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agentpress.context_manager import ContextManager
+
+MODEL = "openai/gpt-5-mini"
+MESSAGE_COUNT = 2000
+
+
+def build_synthetic_thread(message_count: int = MESSAGE_COUNT):
+    """Build a thread cycling through user, assistant and tool result messages."""
+    messages = [{"role": "system", "content": "You are a helpful AI assistant.", "message_id": "msg_system"}]
+    for i in range(message_count):
+        kind = i % 3
+        if kind == 0:
+            content = f"Request {i}: please analyse the attached dataset and summarise the findings. " * (5 + i % 20)
+            messages.append({"role": "user", "content": content, "message_id": f"msg_{i:05d}"})
+        elif kind == 1:
+            content = f"Step {i}: I will inspect the files and run the analysis script. " * (10 + i % 40)
+            messages.append({"role": "assistant", "content": content, "message_id": f"msg_{i:05d}"})
+        else:
+            output = "\n".join(f"line {j}: value={j * i}" for j in range(50 + i % 200))
+            content = f"<tool_result> ToolResult(success=True, output='{output}') </tool_result>"
+            messages.append({"role": "user", "content": content, "message_id": f"msg_{i:05d}"})
+    return messages
+
+
+def time_compression(cm: ContextManager, messages):
+    working_copy = copy.deepcopy(messages)
+    start = time.perf_counter()
+    compressed = cm.compress_messages(working_copy, MODEL)
+    return time.perf_counter() - start, len(compressed)
+
+
+def run_benchmark():
+    messages = build_synthetic_thread()
+    print(f"Synthetic thread: {len(messages)} messages, model {MODEL}")
+
+    uncached_seconds, uncached_len = time_compression(ContextManager(enable_token_cache=False), messages)
+    print(f"Uncached compression:    {uncached_seconds:8.2f}s -> {uncached_len} messages")
+
+    cached_cm = ContextManager()
+    cached_seconds, cached_len = time_compression(cached_cm, messages)
+    print(f"Cached compression:      {cached_seconds:8.2f}s -> {cached_len} messages")
+
+    warm_seconds, warm_len = time_compression(cached_cm, messages)
+    print(f"Cached compression warm: {warm_seconds:8.2f}s -> {warm_len} messages")
+
+    if cached_seconds > 0:
+        print(f"Speedup (cold): {uncached_seconds / cached_seconds:.1f}x")
+    if warm_seconds > 0:
+        print(f"Speedup (warm): {uncached_seconds / warm_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cost of logging during a streamed agent run.
+
+Simulates the response processor's hot path on an asyncio event loop: a
+debug event per streamed chunk, a few per tool execution every 50 chunks, and
+a short wait for the provider every 100 chunks. Measures the CPU time of the
+event loop thread with debug logging off, with the previous configuration
+(callsite lookup and synchronous JSON rendering on every event), and with the
+background writer with and without per-call-site sampling. Log output goes
+to /dev/null; the writer thread renders while the loop waits, so its work
+shows up in wall time only when the loop never idles.
+"""
+
+import sys
+import os
+import asyncio
+import contextlib
+import logging
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import structlog
+
+from utils import logger as logging_setup
+
+CHUNK_COUNT = 20000
+TOOL_EVERY_CHUNKS = 50
+WAIT_EVERY_CHUNKS = 100
+PROVIDER_WAIT_SECONDS = 0.002
+
+
+async def simulate_streamed_run(log, chunk_count: int = CHUNK_COUNT):
+    arguments = {"file_path": "src/app.py", "content": "print('hello world')\n" * 20}
+    for i in range(chunk_count):
+        log.debug("Processing chunk %s (%s chars accumulated)", i, i * 12)
+        if i % TOOL_EVERY_CHUNKS == 0:
+            log.debug("Executing tool: %s with arguments: %s", "create_file", arguments)
+            log.debug("Tool execution complete: %s -> %s", "create_file", {"success": True, "output": "ok"})
+        await asyncio.sleep(PROVIDER_WAIT_SECONDS if i % WAIT_EVERY_CHUNKS == 0 else 0)
+
+
+def configure_legacy():
+    """The configuration before the background writer: callsite and JSON rendering on every event."""
+    structlog.configure(
+        processors=[
+            structlog.stdlib.add_log_level,
+            structlog.stdlib.PositionalArgumentsFormatter(),
+            structlog.processors.dict_tracebacks,
+            structlog.processors.CallsiteParameterAdder(
+                {
+                    structlog.processors.CallsiteParameter.FILENAME,
+                    structlog.processors.CallsiteParameter.FUNC_NAME,
+                    structlog.processors.CallsiteParameter.LINENO,
+                }
+            ),
+            structlog.processors.TimeStamper(fmt="iso"),
+            structlog.contextvars.merge_contextvars,
+            structlog.processors.JSONRenderer(),
+        ],
+        cache_logger_on_first_use=True,
+        wrapper_class=structlog.make_filtering_bound_logger(logging.DEBUG),
+        logger_factory=structlog.PrintLoggerFactory(),
+    )
+
+
+def time_run(configure):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        writer = configure()
+        log = structlog.get_logger()
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        asyncio.run(simulate_streamed_run(log))
+        loop_cpu_seconds = time.thread_time() - cpu_start
+        if writer is not None:
+            writer.flush(timeout=60.0)
+        wall_seconds = time.perf_counter() - start
+    return loop_cpu_seconds, wall_seconds, writer
+
+
+def run_benchmark():
+    print(f"Simulated streamed run: {CHUNK_COUNT} chunks, a tool call every {TOOL_EVERY_CHUNKS} chunks")
+
+    modes = [
+        ("Logging off (INFO)", lambda: logging_setup.configure_logging(logging.INFO, {}, 0, background=False)),
+        ("Previous setup (DEBUG)", lambda: configure_legacy()),
+        ("Background (DEBUG)", lambda: logging_setup.configure_logging(logging.DEBUG, {}, 0, background=True)),
+        ("Background, sampled", lambda: logging_setup.configure_logging(logging.DEBUG, {}, 20, background=True)),
+    ]
+    results = {}
+    for name, configure in modes:
+        loop_cpu_seconds, wall_seconds, writer = time_run(configure)
+        results[name] = loop_cpu_seconds
+        line = (f"{name:<24} {loop_cpu_seconds:7.3f}s event loop CPU ({loop_cpu_seconds / CHUNK_COUNT * 1e6:5.1f}us/chunk), "
+                f"{wall_seconds:6.3f}s wall")
+        if writer is not None:
+            line += f", {writer.stats()['written']} events written"
+        print(line)
+
+    baseline = results["Previous setup (DEBUG)"]
+    for name, seconds in results.items():
+        if seconds > 0 and name != "Previous setup (DEBUG)":
+            print(f"{name}: {baseline / seconds:.1f}x faster than the previous setup")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -6,6 +6,7 @@ from uuid import uuid4
 from utils.auth_utils import verify_and_get_user_id_from_jwt, get_optional_current_user_id_from_jwt
 from utils.logger import logger
 from services.supabase import DBConnection
+from services.http_client import http_pool
 from datetime import datetime
 import os
 import hmac
@@ -655,38 +656,37 @@ async def create_composio_trigger(req: CreateComposioTriggerRequest, current_use
         coerced_config = dict(req.trigger_config or {})
         try:
             type_url = f"{COMPOSIO_API_BASE}/api/v3/triggers_types/{req.slug}"
-            async with httpx.AsyncClient(timeout=10) as http_client:
-                tr = await http_client.get(type_url, headers=headers)
-                if tr.status_code == 200:
-                    tdata = tr.json()
-                    schema = tdata.get("config") or {}
-                    props = schema.get("properties") or {}
-                    for key, prop in props.items():
-                        if key not in coerced_config:
-                            continue
-                        val = coerced_config[key]
-                        ptype = prop.get("type") if isinstance(prop, dict) else None
-                        try:
-                            if ptype == "array":
-                                if isinstance(val, str):
-                                    coerced_config[key] = [val]
-                            elif ptype == "integer":
-                                if isinstance(val, str) and val.isdigit():
-                                    coerced_config[key] = int(val)
-                            elif ptype == "number":
-                                if isinstance(val, str):
-                                    coerced_config[key] = float(val)
-                            elif ptype == "boolean":
-                                if isinstance(val, str):
-                                    coerced_config[key] = val.lower() in ("true", "1", "yes")
-                            elif ptype == "string":
-                                if isinstance(val, (list, tuple)):
-                                    # join list into comma-separated string
-                                    coerced_config[key] = ",".join(str(x) for x in val)
-                                elif not isinstance(val, str):
-                                    coerced_config[key] = str(val)
-                        except Exception:
-                            pass
+            tr = await http_pool.get(type_url, timeout=10, headers=headers)
+            if tr.status_code == 200:
+                tdata = tr.json()
+                schema = tdata.get("config") or {}
+                props = schema.get("properties") or {}
+                for key, prop in props.items():
+                    if key not in coerced_config:
+                        continue
+                    val = coerced_config[key]
+                    ptype = prop.get("type") if isinstance(prop, dict) else None
+                    try:
+                        if ptype == "array":
+                            if isinstance(val, str):
+                                coerced_config[key] = [val]
+                        elif ptype == "integer":
+                            if isinstance(val, str) and val.isdigit():
+                                coerced_config[key] = int(val)
+                        elif ptype == "number":
+                            if isinstance(val, str):
+                                coerced_config[key] = float(val)
+                        elif ptype == "boolean":
+                            if isinstance(val, str):
+                                coerced_config[key] = val.lower() in ("true", "1", "yes")
+                        elif ptype == "string":
+                            if isinstance(val, (list, tuple)):
+                                # join list into comma-separated string
+                                coerced_config[key] = ",".join(str(x) for x in val)
+                            elif not isinstance(val, str):
+                                coerced_config[key] = str(val)
+                    except Exception:
+                        pass
         except Exception:
             pass
 
@@ -697,29 +697,28 @@ async def create_composio_trigger(req: CreateComposioTriggerRequest, current_use
         if req.connected_account_id:
             body["connected_account_id"] = req.connected_account_id
 
-        async with httpx.AsyncClient(timeout=20) as http_client:
-            resp = await http_client.post(url, headers=headers, json=body)
-            try:
-                resp.raise_for_status()
-            except httpx.HTTPStatusError:
-                ct = resp.headers.get("content-type", "")
-                if "application/json" in ct:
-                    detail = resp.json()
-                else:
-                    detail = resp.text
-                logger.error(f"Composio upsert error: {detail}")
-                raise HTTPException(status_code=400, detail=detail)
-            created = resp.json()
-            try:
-                top_keys = list(created.keys()) if isinstance(created, dict) else None
-                logger.debug(
-                    "Composio upsert ok",
-                    slug=req.slug,
-                    status_code=resp.status_code,
-                    top_keys=top_keys,
-                )
-            except Exception:
-                pass
+        resp = await http_pool.post(url, timeout=20, headers=headers, json=body)
+        try:
+            resp.raise_for_status()
+        except httpx.HTTPStatusError:
+            ct = resp.headers.get("content-type", "")
+            if "application/json" in ct:
+                detail = resp.json()
+            else:
+                detail = resp.text
+            logger.error(f"Composio upsert error: {detail}")
+            raise HTTPException(status_code=400, detail=detail)
+        created = resp.json()
+        try:
+            top_keys = list(created.keys()) if isinstance(created, dict) else None
+            logger.debug(
+                "Composio upsert ok",
+                slug=req.slug,
+                status_code=resp.status_code,
+                top_keys=top_keys,
+            )
+        except Exception:
+            pass
 
         composio_trigger_id = None
         def _extract_id(obj: Dict[str, Any]) -> Optional[str]:
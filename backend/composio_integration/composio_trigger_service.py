@@ -1,9 +1,9 @@
 import os
 import json
-import httpx
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from utils.logger import logger
+from services.http_client import http_pool
 from .toolkit_service import ToolkitService
 
 
@@ -48,21 +48,20 @@ class ComposioTriggerService:
         url = f"{self.api_base}/api/v3/triggers_types"
         params = {"limit": 1000}
         items = []
-        async with httpx.AsyncClient(timeout=20) as client_http:
-            while True:
-                resp = await client_http.get(url, headers=headers, params=params)
-                resp.raise_for_status()
-                data = resp.json()
-                page_items = data.get("items") if isinstance(data, dict) else data
-                if page_items is None:
-                    page_items = data if isinstance(data, list) else []
-                items.extend(page_items)
-                next_cursor = None
-                if isinstance(data, dict):
-                    next_cursor = data.get("next_cursor") or data.get("nextCursor")
-                if not next_cursor:
-                    break
-                params["cursor"] = next_cursor
+        while True:
+            resp = await http_pool.get(url, timeout=20, headers=headers, params=params)
+            resp.raise_for_status()
+            data = resp.json()
+            page_items = data.get("items") if isinstance(data, dict) else data
+            if page_items is None:
+                page_items = data if isinstance(data, list) else []
+            items.extend(page_items)
+            next_cursor = None
+            if isinstance(data, dict):
+                next_cursor = data.get("next_cursor") or data.get("nextCursor")
+            if not next_cursor:
+                break
+            params["cursor"] = next_cursor
 
         # Build toolkit map directly from triggers payload (preserves logos like Slack)
         toolkits_map: Dict[str, Dict[str, Any]] = {}
@@ -142,34 +141,33 @@ class ComposioTriggerService:
         headers = {"x-api-key": self.api_key}
         url = f"{self.api_base}/api/v3/triggers_types"
         items = []
-        async with httpx.AsyncClient(timeout=20) as client_http:
-            # Try param filter
-            params = {"limit": 1000, "toolkits": toolkit_slug}
-            resp = await client_http.get(url, headers=headers, params=params)
-            resp.raise_for_status()
-            data = resp.json()
-            items = data.get("items") if isinstance(data, dict) else data
-            if items is None:
-                items = data if isinstance(data, list) else []
-            # Fallback to fetch all pages then filter client-side
-            if not items:
-                logger.debug("[Composio HTTP] toolkit filter returned 0, fetching all and filtering", toolkit=toolkit_slug)
-                params_all = {"limit": 1000}
-                items = []
-                while True:
-                    resp_all = await client_http.get(url, headers=headers, params=params_all)
-                    resp_all.raise_for_status()
-                    data_all = resp_all.json()
-                    page_items = data_all.get("items") if isinstance(data_all, dict) else data_all
-                    if page_items is None:
-                        page_items = data_all if isinstance(data_all, list) else []
-                    items.extend(page_items)
-                    next_cursor = None
-                    if isinstance(data_all, dict):
-                        next_cursor = data_all.get("next_cursor") or data_all.get("nextCursor")
-                    if not next_cursor:
-                        break
-                    params_all["cursor"] = next_cursor
+        # Try param filter
+        params = {"limit": 1000, "toolkits": toolkit_slug}
+        resp = await http_pool.get(url, timeout=20, headers=headers, params=params)
+        resp.raise_for_status()
+        data = resp.json()
+        items = data.get("items") if isinstance(data, dict) else data
+        if items is None:
+            items = data if isinstance(data, list) else []
+        # Fallback to fetch all pages then filter client-side
+        if not items:
+            logger.debug("[Composio HTTP] toolkit filter returned 0, fetching all and filtering", toolkit=toolkit_slug)
+            params_all = {"limit": 1000}
+            items = []
+            while True:
+                resp_all = await http_pool.get(url, timeout=20, headers=headers, params=params_all)
+                resp_all.raise_for_status()
+                data_all = resp_all.json()
+                page_items = data_all.get("items") if isinstance(data_all, dict) else data_all
+                if page_items is None:
+                    page_items = data_all if isinstance(data_all, list) else []
+                items.extend(page_items)
+                next_cursor = None
+                if isinstance(data_all, dict):
+                    next_cursor = data_all.get("next_cursor") or data_all.get("nextCursor")
+                if not next_cursor:
+                    break
+                params_all["cursor"] = next_cursor
 
         # Prepare toolkit info
         toolkit_service = ToolkitService()
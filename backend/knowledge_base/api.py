@@ -188,7 +188,7 @@ async def upload_file_to_agent_kb(
         job_id = await client.rpc('create_agent_kb_processing_job', {
             'p_agent_id': agent_id,
             'p_account_id': account_id,
-            'p_job_type': 'file_upload',
+            'p_job_type': 'zip_extraction' if (file.filename or '').lower().endswith('.zip') else 'file_upload',
             'p_source_info': {
                 'filename': file.filename,
                 'mime_type': file.content_type,
@@ -435,7 +435,7 @@ async def process_file_background(
         }).execute()
         
         result = await processor.process_file_upload(
-            agent_id, account_id, file_content, filename, mime_type
+            agent_id, account_id, file_content, filename, mime_type, job_id=job_id
         )
         
         if result['success']:
@@ -443,8 +443,8 @@ async def process_file_background(
                 'p_job_id': job_id,
                 'p_status': 'completed',
                 'p_result_info': result,
-                'p_entries_created': 1,
-                'p_total_files': 1
+                'p_entries_created': result.get('total_extracted', 1),
+                'p_total_files': result.get('total_files', 1)
             }).execute()
         else:
             await client.rpc('update_agent_kb_job_status', {
@@ -0,0 +1,92 @@
+"""
+Text extraction for knowledge base files.
+
+Kept free of app imports (config, DB, logging setup) because FileProcessor
+runs these functions in a process pool, whose workers import only this module.
+"""
+
+import io
+import re
+from pathlib import Path
+
+import chardet
+import PyPDF2
+import docx
+
+SUPPORTED_TEXT_EXTENSIONS = {
+    '.txt'
+}
+
+SUPPORTED_DOCUMENT_EXTENSIONS = {
+    '.pdf', '.docx'
+}
+
+
+def extract_content(file_content: bytes, filename: str, mime_type: str) -> str:
+    """Extract and sanitize the text of a file.
+
+    Raises:
+        ValueError: If the file format is not supported
+    """
+    file_extension = Path(filename).suffix.lower()
+
+    if file_extension in SUPPORTED_TEXT_EXTENSIONS or mime_type.startswith('text/'):
+        return extract_text_content(file_content)
+    elif file_extension == '.pdf':
+        return extract_pdf_content(file_content)
+    elif file_extension == '.docx':
+        return extract_docx_content(file_content)
+    else:
+        raise ValueError(f"Unsupported file format: {file_extension}. Only .txt, .pdf, and .docx files are supported.")
+
+
+def extract_text_content(file_content: bytes) -> str:
+    detected = chardet.detect(file_content)
+    encoding = detected.get('encoding') or 'utf-8'
+
+    try:
+        raw_text = file_content.decode(encoding)
+    except (UnicodeDecodeError, LookupError):
+        raw_text = file_content.decode('utf-8', errors='replace')
+
+    return sanitize_content(raw_text)
+
+
+def extract_pdf_content(file_content: bytes) -> str:
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    text_content = []
+
+    for page in pdf_reader.pages:
+        text_content.append(page.extract_text())
+
+    raw_text = '\n\n'.join(text_content)
+    return sanitize_content(raw_text)
+
+
+def extract_docx_content(file_content: bytes) -> str:
+    doc = docx.Document(io.BytesIO(file_content))
+    text_content = []
+
+    for paragraph in doc.paragraphs:
+        text_content.append(paragraph.text)
+
+    raw_text = '\n'.join(text_content)
+    return sanitize_content(raw_text)
+
+
+def sanitize_content(content: str) -> str:
+    if not content:
+        return content
+
+    sanitized = ''.join(char for char in content if ord(char) >= 32 or char in '\n\r\t')
+
+    sanitized = sanitized.replace('\x00', '')
+    sanitized = sanitized.replace('\u0000', '')
+
+    sanitized = sanitized.replace('\ufeff', '')
+
+    sanitized = sanitized.replace('\r\n', '\n').replace('\r', '\n')
+
+    sanitized = re.sub(r'\n{4,}', '\n\n\n', sanitized)
+
+    return sanitized.strip()
@@ -4,27 +4,64 @@ import zipfile
 import tempfile
 import shutil
 import asyncio
-import subprocess
-import re
-from typing import List, Dict, Any, Optional, Tuple
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
 from pathlib import Path
 import mimetypes
-import chardet
-
-import PyPDF2
-import docx
 
 from utils.logger import logger
 from services.supabase import DBConnection
+from knowledge_base.extraction import extract_content, SUPPORTED_TEXT_EXTENSIONS, SUPPORTED_DOCUMENT_EXTENSIONS
+from knowledge_base.retrieval import knowledge_base_index
+
+EXTRACTION_WORKERS = min(4, os.cpu_count() or 1)
+# Files read and waiting for or in extraction at once; bounds the memory of an import
+MAX_INFLIGHT_EXTRACTIONS = EXTRACTION_WORKERS * 2
+INSERT_BATCH_SIZE = 50
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_extraction_pool() -> ProcessPoolExecutor:
+    global _extraction_pool
+    if _extraction_pool is None:
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        _extraction_pool = ProcessPoolExecutor(
+            max_workers=EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _extraction_pool
+
+
+def _reset_extraction_pool():
+    global _extraction_pool
+    pool, _extraction_pool = _extraction_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _content_hash(content: str) -> str:
+    # Same as the content_hash column set by trigger_agent_kb_entries_content_hash
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class _ImportFile:
+    path: str
+    filename: str
+    size: int
+    mime_type: str
+    read: Callable[[], Awaitable[bytes]]
+
 
 class FileProcessor:
-    SUPPORTED_TEXT_EXTENSIONS = {
-        '.txt'
-    }
+    SUPPORTED_TEXT_EXTENSIONS = SUPPORTED_TEXT_EXTENSIONS
     
-    SUPPORTED_DOCUMENT_EXTENSIONS = {
-        '.pdf', '.docx'
-    }
+    SUPPORTED_DOCUMENT_EXTENSIONS = SUPPORTED_DOCUMENT_EXTENSIONS
     
     MAX_FILE_SIZE = 50 * 1024 * 1024
     MAX_ZIP_ENTRIES = 1000
@@ -34,12 +71,13 @@ class FileProcessor:
         self.db = DBConnection()
     
     async def process_file_upload(
-        self, 
-        agent_id: str, 
-        account_id: str, 
-        file_content: bytes, 
-        filename: str, 
-        mime_type: str
+        self,
+        agent_id: str,
+        account_id: str,
+        file_content: bytes,
+        filename: str,
+        mime_type: str,
+        job_id: Optional[str] = None
     ) -> Dict[str, Any]:
         try:
             file_size = len(file_content)
@@ -47,9 +85,9 @@ class FileProcessor:
                 raise ValueError(f"File too large: {file_size} bytes (max: {self.MAX_FILE_SIZE})")
             
             file_extension = Path(filename).suffix.lower()
-
+            
             if file_extension == '.zip':
-                return await self._process_zip_file(agent_id, account_id, file_content, filename)
+                return await self._process_zip_file(agent_id, account_id, file_content, filename, job_id)
             
             content = await self._extract_file_content(file_content, filename, mime_type)
             
@@ -82,14 +120,18 @@ class FileProcessor:
             if not result.data:
                 raise Exception("Failed to create knowledge base entry")
             
+            await self._index_entries(agent_id)
+            
             return {
                 'success': True,
                 'entry_id': result.data[0]['entry_id'],
                 'filename': filename,
                 'content_length': len(content),
-                'extraction_method': entry_data['source_metadata']['extraction_method']
+                'extraction_method': entry_data['source_metadata']['extraction_method'],
+                'total_extracted': 1,
+                'total_files': 1
             }
-            
+        
         except Exception as e:
             logger.error(f"Error processing file {filename}: {str(e)}")
             return {
@@ -99,11 +141,12 @@ class FileProcessor:
             }
     
     async def _process_zip_file(
-        self, 
-        agent_id: str, 
-        account_id: str, 
-        zip_content: bytes, 
-        zip_filename: str
+        self,
+        agent_id: str,
+        account_id: str,
+        zip_content: bytes,
+        zip_filename: str,
+        job_id: Optional[str] = None
     ) -> Dict[str, Any]:
         try:
             client = await self.db.client
@@ -130,71 +173,63 @@ class FileProcessor:
             zip_result = await client.table('agent_knowledge_base_entries').insert(zip_entry_data).execute()
             zip_entry_id = zip_result.data[0]['entry_id']
             
-            extracted_files = []
-            failed_files = []
-            
             with zipfile.ZipFile(io.BytesIO(zip_content), 'r') as zip_ref:
-                file_list = zip_ref.namelist()
+                members = [info for info in zip_ref.infolist() if not info.is_dir()]
                 
-                if len(file_list) > self.MAX_ZIP_ENTRIES:
-                    raise ValueError(f"ZIP contains too many files: {len(file_list)} (max: {self.MAX_ZIP_ENTRIES})")
+                if len(members) > self.MAX_ZIP_ENTRIES:
+                    raise ValueError(f"ZIP contains too many files: {len(members)} (max: {self.MAX_ZIP_ENTRIES})")
                 
-                for file_path in file_list:
-                    if file_path.endswith('/'):
+                import_files = []
+                oversized_files = []
+                for info in members:
+                    filename = os.path.basename(info.filename)
+                    if not filename:
                         continue
-                    
-                    try:
-                        file_content = zip_ref.read(file_path)
-                        filename = os.path.basename(file_path)
-                        
-                        if not filename:
-                            continue
-                        
-                        mime_type, _ = mimetypes.guess_type(filename)
-                        if not mime_type:
-                            mime_type = 'application/octet-stream'
-                        
-                        content = await self._extract_file_content(file_content, filename, mime_type)
-                        
-                        if content and content.strip():
-                            extracted_entry_data = {
-                                'agent_id': agent_id,
-                                'account_id': account_id,
-                                'name': f"📄 {filename}",
-                                'description': f"Extracted from {zip_filename}: {file_path}",
-                                'content': content[:self.MAX_CONTENT_LENGTH],
-                                'source_type': 'zip_extracted',
-                                'source_metadata': {
-                                    'filename': filename,
-                                    'original_path': file_path,
-                                    'zip_filename': zip_filename,
-                                    'mime_type': mime_type,
-                                    'file_size': len(file_content),
-                                    'extraction_method': self._get_extraction_method(Path(filename).suffix.lower(), mime_type)
-                                },
-                                'file_size': len(file_content),
-                                'file_mime_type': mime_type,
-                                'extracted_from_zip_id': zip_entry_id,
-                                'usage_context': 'always',
-                                'is_active': True
-                            }
-                            
-                            extracted_result = await client.table('agent_knowledge_base_entries').insert(extracted_entry_data).execute()
-                            
-                            extracted_files.append({
-                                'filename': filename,
-                                'path': file_path,
-                                'entry_id': extracted_result.data[0]['entry_id'],
-                                'content_length': len(content)
-                            })
-                        
-                    except Exception as e:
-                        logger.error(f"Error extracting {file_path} from ZIP: {str(e)}")
-                        failed_files.append({
-                            'filename': os.path.basename(file_path),
-                            'path': file_path,
-                            'error': str(e)
+                    # Checked before decompressing, so an archive bomb is never read
+                    if info.file_size > self.MAX_FILE_SIZE:
+                        oversized_files.append({
+                            'filename': filename,
+                            'path': info.filename,
+                            'error': f"File too large: {info.file_size} bytes (max: {self.MAX_FILE_SIZE})"
                         })
+                        continue
+                    import_files.append(_ImportFile(
+                        path=info.filename,
+                        filename=filename,
+                        size=info.file_size,
+                        mime_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                        read=lambda info=info: asyncio.to_thread(zip_ref.read, info)
+                    ))
+                
+                def build_entry(import_file: _ImportFile, content: str) -> Dict[str, Any]:
+                    return {
+                        'agent_id': agent_id,
+                        'account_id': account_id,
+                        'name': f"📄 {import_file.filename}",
+                        'description': f"Extracted from {zip_filename}: {import_file.path}",
+                        'content': content,
+                        'source_type': 'zip_extracted',
+                        'source_metadata': {
+                            'filename': import_file.filename,
+                            'original_path': import_file.path,
+                            'zip_filename': zip_filename,
+                            'mime_type': import_file.mime_type,
+                            'file_size': import_file.size,
+                            'extraction_method': self._get_extraction_method(Path(import_file.filename).suffix.lower(), import_file.mime_type)
+                        },
+                        'file_size': import_file.size,
+                        'file_mime_type': import_file.mime_type,
+                        'extracted_from_zip_id': zip_entry_id,
+                        'usage_context': 'always',
+                        'is_active': True
+                    }
+                
+                extracted_files, failed_files, duplicate_files = await self._import_files(
+                    client, agent_id, import_files, build_entry, job_id, total_files=len(members)
+                )
+            
+            failed_files = oversized_files + failed_files
+            await self._index_entries(agent_id)
             
             return {
                 'success': True,
@@ -202,10 +237,13 @@ class FileProcessor:
                 'zip_filename': zip_filename,
                 'extracted_files': extracted_files,
                 'failed_files': failed_files,
+                'duplicate_files': duplicate_files,
                 'total_extracted': len(extracted_files),
-                'total_failed': len(failed_files)
+                'total_failed': len(failed_files),
+                'total_duplicates': len(duplicate_files),
+                'total_files': len(members)
             }
-            
+        
         except Exception as e:
             logger.error(f"Error processing ZIP file {zip_filename}: {str(e)}")
             return {
@@ -215,13 +253,14 @@ class FileProcessor:
             }
     
     async def process_git_repository(
-        self, 
-        agent_id: str, 
-        account_id: str, 
+        self,
+        agent_id: str,
+        account_id: str,
         git_url: str,
         branch: str = 'main',
         include_patterns: List[str] = None,
-        exclude_patterns: List[str] = None
+        exclude_patterns: List[str] = None,
+        job_id: Optional[str] = None
     ) -> Dict[str, Any]:
         if include_patterns is None:
             include_patterns = ['*.txt', '*.pdf', '*.docx']
@@ -267,74 +306,39 @@ class FileProcessor:
             repo_result = await client.table('agent_knowledge_base_entries').insert(repo_entry_data).execute()
             repo_entry_id = repo_result.data[0]['entry_id']
             
-            processed_files = []
-            failed_files = []
+            import_files = await asyncio.to_thread(
+                self._collect_repository_files, temp_dir, include_patterns, exclude_patterns
+            )
             
-            for root, dirs, files in os.walk(temp_dir):
-                if '.git' in dirs:
-                    dirs.remove('.git')
-                
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(file_path, temp_dir)
-                    
-                    if not self._should_include_file(relative_path, include_patterns, exclude_patterns):
-                        continue
-                    
-                    try:
-                        with open(file_path, 'rb') as f:
-                            file_content = f.read()
-                        
-                        if len(file_content) > self.MAX_FILE_SIZE:
-                            continue
-                        
-                        mime_type, _ = mimetypes.guess_type(file)
-                        if not mime_type:
-                            mime_type = 'application/octet-stream'
-                        
-                        content = await self._extract_file_content(file_content, file, mime_type)
-                        
-                        if content and content.strip():
-                            file_entry_data = {
-                                'agent_id': agent_id,
-                                'account_id': account_id,
-                                'name': f"📄 {file}",
-                                'description': f"From {repo_name}: {relative_path}",
-                                'content': content[:self.MAX_CONTENT_LENGTH],
-                                'source_type': 'git_repo',
-                                'source_metadata': {
-                                    'filename': file,
-                                    'relative_path': relative_path,
-                                    'git_url': git_url,
-                                    'branch': branch,
-                                    'repo_name': repo_name,
-                                    'mime_type': mime_type,
-                                    'file_size': len(file_content),
-                                    'extraction_method': self._get_extraction_method(Path(file).suffix.lower(), mime_type)
-                                },
-                                'file_size': len(file_content),
-                                'file_mime_type': mime_type,
-                                'extracted_from_zip_id': repo_entry_id,
-                                'usage_context': 'always',
-                                'is_active': True
-                            }
-                            
-                            file_result = await client.table('agent_knowledge_base_entries').insert(file_entry_data).execute()
-                            
-                            processed_files.append({
-                                'filename': file,
-                                'relative_path': relative_path,
-                                'entry_id': file_result.data[0]['entry_id'],
-                                'content_length': len(content)
-                            })
-                    
-                    except Exception as e:
-                        logger.error(f"Error processing {relative_path} from git repo: {str(e)}")
-                        failed_files.append({
-                            'filename': file,
-                            'relative_path': relative_path,
-                            'error': str(e)
-                        })
+            def build_entry(import_file: _ImportFile, content: str) -> Dict[str, Any]:
+                return {
+                    'agent_id': agent_id,
+                    'account_id': account_id,
+                    'name': f"📄 {import_file.filename}",
+                    'description': f"From {repo_name}: {import_file.path}",
+                    'content': content,
+                    'source_type': 'git_repo',
+                    'source_metadata': {
+                        'filename': import_file.filename,
+                        'relative_path': import_file.path,
+                        'git_url': git_url,
+                        'branch': branch,
+                        'repo_name': repo_name,
+                        'mime_type': import_file.mime_type,
+                        'file_size': import_file.size,
+                        'extraction_method': self._get_extraction_method(Path(import_file.filename).suffix.lower(), import_file.mime_type)
+                    },
+                    'file_size': import_file.size,
+                    'file_mime_type': import_file.mime_type,
+                    'extracted_from_zip_id': repo_entry_id,
+                    'usage_context': 'always',
+                    'is_active': True
+                }
+            
+            processed_files, failed_files, duplicate_files = await self._import_files(
+                client, agent_id, import_files, build_entry, job_id, total_files=len(import_files)
+            )
+            await self._index_entries(agent_id)
             
             return {
                 'success': True,
@@ -342,12 +346,22 @@ class FileProcessor:
                 'repo_name': repo_name,
                 'git_url': git_url,
                 'branch': branch,
-                'processed_files': processed_files,
-                'failed_files': failed_files,
+                'processed_files': [
+                    {'filename': f['filename'], 'relative_path': f['path'], 'entry_id': f['entry_id'], 'content_length': f['content_length']}
+                    for f in processed_files
+                ],
+                'failed_files': [
+                    {'filename': f['filename'], 'relative_path': f['path'], 'error': f['error']}
+                    for f in failed_files
+                ],
+                'duplicate_files': duplicate_files,
                 'total_processed': len(processed_files),
-                'total_failed': len(failed_files)
+                'total_extracted': len(processed_files),
+                'total_failed': len(failed_files),
+                'total_duplicates': len(duplicate_files),
+                'total_files': len(import_files)
             }
-            
+        
         except Exception as e:
             logger.error(f"Error processing git repository {git_url}: {str(e)}")
             return {
@@ -360,75 +374,190 @@ class FileProcessor:
             if temp_dir and os.path.exists(temp_dir):
                 shutil.rmtree(temp_dir, ignore_errors=True)
     
-    async def _extract_file_content(self, file_content: bytes, filename: str, mime_type: str) -> str:
-        file_extension = Path(filename).suffix.lower()
+    def _collect_repository_files(self, repo_dir: str, include_patterns: List[str], exclude_patterns: List[str]) -> List[_ImportFile]:
+        import_files = []
+        for root, dirs, files in os.walk(repo_dir):
+            if '.git' in dirs:
+                dirs.remove('.git')
+            
+            for file in files:
+                file_path = os.path.join(root, file)
+                relative_path = os.path.relpath(file_path, repo_dir)
+                
+                if not self._should_include_file(relative_path, include_patterns, exclude_patterns):
+                    continue
+                
+                file_size = os.path.getsize(file_path)
+                if file_size > self.MAX_FILE_SIZE:
+                    continue
+                
+                import_files.append(_ImportFile(
+                    path=relative_path,
+                    filename=file,
+                    size=file_size,
+                    mime_type=mimetypes.guess_type(file)[0] or 'application/octet-stream',
+                    read=lambda file_path=file_path: asyncio.to_thread(Path(file_path).read_bytes)
+                ))
+        return import_files
+    
+    async def _import_files(
+        self,
+        client,
+        agent_id: str,
+        import_files: List[_ImportFile],
+        build_entry: Callable[[_ImportFile, str], Dict[str, Any]],
+        job_id: Optional[str],
+        total_files: int
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Extract files in the process pool and insert their entries in batches.
         
-        try:
-            if file_extension in self.SUPPORTED_TEXT_EXTENSIONS or mime_type.startswith('text/'):
-                return self._extract_text_content(file_content)
+        Files are read only when an extraction slot is free, so at most
+        MAX_INFLIGHT_EXTRACTIONS raw files are in memory. Files whose content
+        is already in the agent's knowledge base, or earlier in this import,
+        are skipped as duplicates. Progress is written to the processing job
+        after each batch.
+        
+        Returns:
+            (extracted_files, failed_files, duplicate_files)
+        """
+        semaphore = asyncio.Semaphore(MAX_INFLIGHT_EXTRACTIONS)
+        seen_hashes = set()
+        extracted_files = []
+        failed_files = []
+        duplicate_files = []
+        
+        async def extract(import_file: _ImportFile) -> str:
+            async with semaphore:
+                file_content = await import_file.read()
+                return await self._extract_in_pool(file_content, import_file.filename, import_file.mime_type)
+        
+        for start in range(0, len(import_files), INSERT_BATCH_SIZE):
+            batch = import_files[start:start + INSERT_BATCH_SIZE]
+            results = await asyncio.gather(*(extract(import_file) for import_file in batch), return_exceptions=True)
+            
+            pending = []
+            for import_file, result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"Error extracting {import_file.path}: {str(result)}")
+                    failed_files.append({'filename': import_file.filename, 'path': import_file.path, 'error': str(result)})
+                    continue
+                if not result or not result.strip():
+                    continue
+                
+                content = result[:self.MAX_CONTENT_LENGTH]
+                content_hash = _content_hash(content)
+                if content_hash in seen_hashes:
+                    duplicate_files.append({'filename': import_file.filename, 'path': import_file.path})
+                    continue
+                seen_hashes.add(content_hash)
+                pending.append((import_file, content, content_hash))
             
-            elif file_extension == '.pdf':
-                return self._extract_pdf_content(file_content)
+            existing_hashes = await self._existing_content_hashes(client, agent_id, [item[2] for item in pending])
+            rows = []
+            row_files = []
+            for import_file, content, content_hash in pending:
+                if content_hash in existing_hashes:
+                    duplicate_files.append({'filename': import_file.filename, 'path': import_file.path})
+                    continue
+                rows.append(build_entry(import_file, content))
+                row_files.append(import_file)
             
-            elif file_extension == '.docx':
-                return self._extract_docx_content(file_content)
+            if rows:
+                try:
+                    insert_result = await client.table('agent_knowledge_base_entries').insert(rows).execute()
+                    for import_file, row, inserted in zip(row_files, rows, insert_result.data or []):
+                        extracted_files.append({
+                            'filename': import_file.filename,
+                            'path': import_file.path,
+                            'entry_id': inserted['entry_id'],
+                            'content_length': len(row['content'])
+                        })
+                except Exception as e:
+                    logger.error(f"Error inserting knowledge base entries for agent {agent_id}: {str(e)}")
+                    for import_file in row_files:
+                        failed_files.append({'filename': import_file.filename, 'path': import_file.path, 'error': str(e)})
             
-            else:
-                raise ValueError(f"Unsupported file format: {file_extension}. Only .txt, .pdf, and .docx files are supported.")
+            if job_id:
+                await self._report_progress(
+                    client, job_id,
+                    processed=start + len(batch),
+                    total_files=total_files,
+                    entries_created=len(extracted_files),
+                    failed=len(failed_files),
+                    duplicates=len(duplicate_files)
+                )
         
+        return extracted_files, failed_files, duplicate_files
+    
+    async def _existing_content_hashes(self, client, agent_id: str, content_hashes: List[str]) -> set:
+        if not content_hashes:
+            return set()
+        try:
+            result = await client.table('agent_knowledge_base_entries').select('content_hash').eq(
+                'agent_id', agent_id
+            ).in_('content_hash', content_hashes).execute()
+            return {row['content_hash'] for row in result.data or []}
         except Exception as e:
-            logger.error(f"Error extracting content from {filename}: {str(e)}")
-            return f"Error extracting content: {str(e)}"
+            logger.warning(f"Failed to check for duplicate knowledge base entries: {str(e)}")
+            return set()
     
-    def _extract_text_content(self, file_content: bytes) -> str:
-        detected = chardet.detect(file_content)
-        encoding = detected.get('encoding', 'utf-8')
-        
+    async def _report_progress(
+        self,
+        client,
+        job_id: str,
+        processed: int,
+        total_files: int,
+        entries_created: int,
+        failed: int,
+        duplicates: int
+    ):
         try:
-            raw_text = file_content.decode(encoding)
-        except UnicodeDecodeError:
-            raw_text = file_content.decode('utf-8', errors='replace')
-        
-        return self._sanitize_content(raw_text)
+            await client.rpc('update_agent_kb_job_status', {
+                'p_job_id': job_id,
+                'p_status': 'processing',
+                'p_result_info': {
+                    'progress': {
+                        'processed_files': processed,
+                        'total_files': total_files,
+                        'failed_files': failed,
+                        'duplicate_files': duplicates
+                    }
+                },
+                'p_entries_created': entries_created,
+                'p_total_files': total_files
+            }).execute()
+        except Exception as e:
+            logger.warning(f"Failed to report progress of processing job {job_id}: {str(e)}")
     
-    def _extract_pdf_content(self, file_content: bytes) -> str:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-        text_content = []
-        
-        for page in pdf_reader.pages:
-            text_content.append(page.extract_text())
+    async def _index_entries(self, agent_id: str):
+        """Chunk the new entries into the agent's retrieval index.
         
-        raw_text = '\n\n'.join(text_content)
-        return self._sanitize_content(raw_text)
+        Not fatal: entries that fail here are indexed when the agent's
+        knowledge base is next used.
+        """
+        try:
+            client = await self.db.client
+            await knowledge_base_index.sync(client, agent_id)
+        except Exception as e:
+            logger.warning(f"Failed to index knowledge base entries for agent {agent_id}: {str(e)}")
     
-    def _extract_docx_content(self, file_content: bytes) -> str:
-        doc = docx.Document(io.BytesIO(file_content))
-        text_content = []
-        
-        for paragraph in doc.paragraphs:
-            text_content.append(paragraph.text)
-        
-        raw_text = '\n'.join(text_content)
-        return self._sanitize_content(raw_text)
+    async def _extract_in_pool(self, file_content: bytes, filename: str, mime_type: str) -> str:
+        """Run extraction in the process pool, keeping PDF/DOCX parsing off the event loop."""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(_get_extraction_pool(), extract_content, file_content, filename, mime_type)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory on a huge PDF); start a fresh pool for the next file
+            _reset_extraction_pool()
+            raise
     
+    async def _extract_file_content(self, file_content: bytes, filename: str, mime_type: str) -> str:
+        try:
+            return await self._extract_in_pool(file_content, filename, mime_type)
+        except Exception as e:
+            logger.error(f"Error extracting content from {filename}: {str(e)}")
+            return f"Error extracting content: {str(e)}"
     
-    def _sanitize_content(self, content: str) -> str:
-        if not content:
-            return content
-
-        sanitized = ''.join(char for char in content if ord(char) >= 32 or char in '\n\r\t')
-
-        sanitized = sanitized.replace('\x00', '')
-        sanitized = sanitized.replace('\u0000', '')
-        
-        sanitized = sanitized.replace('\ufeff', '')
-        
-        sanitized = sanitized.replace('\r\n', '\n').replace('\r', '\n')
-
-        sanitized = re.sub(r'\n{4,}', '\n\n\n', sanitized)
-
-        return sanitized.strip()
-
     def _get_extraction_method(self, file_extension: str, mime_type: str) -> str:
         if file_extension == '.pdf':
             return 'PyPDF2'
@@ -450,4 +579,4 @@ class FileProcessor:
             if fnmatch.fnmatch(file_path, pattern):
                 return True
         
-        return False 
\ No newline at end of file
+        return False
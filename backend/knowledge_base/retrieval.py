@@ -0,0 +1,435 @@
+"""
+Chunked retrieval index for agent knowledge bases.
+
+Entries are split into overlapping chunks when they are indexed, and each chunk
+is stored in agent_knowledge_base_chunks with its term frequencies (and an
+embedding when an embedding backend is configured). Per agent, the chunks are
+loaded into an in-process BM25 index, so the system prompt can carry only the
+chunks relevant to the latest user message instead of every entry.
+
+Indexing is incremental: agent_knowledge_base_index_state records the
+updated_at and content hash each entry was indexed at, so sync() only re-chunks
+entries whose name, description or content changed. Chunks of deleted entries
+are removed by cascade, and inactive entries are skipped when an index is built.
+"""
+
+import hashlib
+import heapq
+from abc import ABC, abstractmethod
+import math
+import re
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import litellm
+
+from utils.config import config
+from utils.logger import logger
+from utils.query_utils import batch_query_in
+
+CHUNK_MAX_CHARS = 1500
+CHUNK_OVERLAP_CHARS = 200
+DEFAULT_TOP_K = 8
+# Knowledge bases up to this size are still included whole
+FULL_CONTEXT_MAX_CHARS = 12000
+RETRIEVAL_MAX_CHARS = 12000
+MAX_CACHED_INDEXES = 256
+# Entries are capped at 100k chars, so 10 entries stay under PostgREST's row limit
+CHUNK_LOAD_BATCH_SIZE = 10
+# Entries used as prompt context. Must match the usage_context filter of the
+# get_agent_knowledge_base_context RPC, so a knowledge base is made of the same
+# entries whether it is included whole or retrieved from, and its size decides
+# between the two.
+INDEXED_USAGE_CONTEXTS = ["always", "contextual"]
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Reciprocal rank fusion constant for hybrid (BM25 + embedding) ranking
+RRF_K = 60
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i in is it its me my of on or "
+    "our so that the their there this to was we were what when where which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def chunk_text(text: str, max_chars: int = CHUNK_MAX_CHARS, overlap: int = CHUNK_OVERLAP_CHARS) -> List[str]:
+    """Split text into chunks of at most max_chars characters.
+
+    Chunks end at the last paragraph, line, sentence or word break in the second
+    half of the window, and consecutive chunks share up to overlap characters
+    so a passage spanning a boundary is still found.
+    """
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            window = text[start:end]
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = window.rfind(separator, max_chars // 2)
+                if cut != -1:
+                    end = start + cut + len(separator)
+                    break
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+
+        next_start = max(end - overlap, start + 1)
+        # Start the overlap on a word boundary
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks
+
+
+def _content_hash(entry: Dict[str, Any]) -> str:
+    source = f"{entry.get('name') or ''}\n{entry.get('description') or ''}\n{entry['content']}"
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+@dataclass
+class KnowledgeChunk:
+    entry_id: str
+    chunk_index: int
+    content: str
+    term_freqs: Dict[str, int]
+    length: int
+    embedding: Optional[List[float]] = None
+
+
+class EmbeddingBackend(ABC):
+    """Dense embeddings used alongside BM25 when configured.
+
+    Subclasses set model_name, which is recorded with the indexed entries so
+    they are re-embedded when the model changes.
+    """
+
+    model_name: str = ""
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, returning one vector per text in the same order."""
+        pass
+
+
+class LiteLLMEmbeddingBackend(EmbeddingBackend):
+    """Embeddings from any embedding model LiteLLM supports."""
+
+    def __init__(self, model_name: str, batch_size: int = 64):
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        embeddings = []
+        for i in range(0, len(texts), self.batch_size):
+            response = await litellm.aembedding(model=self.model_name, input=texts[i:i + self.batch_size])
+            for item in response.data:
+                embeddings.append(item["embedding"] if isinstance(item, dict) else item.embedding)
+        return embeddings
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class BM25Index:
+    """Okapi BM25 over the chunks of one agent's knowledge base."""
+
+    def __init__(self, chunks: List[KnowledgeChunk]):
+        self.chunks = chunks
+        self.total_chars = sum(len(chunk.content) for chunk in chunks)
+        self.avg_length = sum(chunk.length for chunk in chunks) / len(chunks) if chunks else 0.0
+        # term -> [(chunk position, term frequency)]
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for position, chunk in enumerate(chunks):
+            for term, freq in chunk.term_freqs.items():
+                self.postings[term].append((position, freq))
+
+    def search(self, query: str, top_k: int) -> List[Tuple[KnowledgeChunk, float]]:
+        """Return up to top_k (chunk, score) pairs matching query, best first."""
+        scores: Dict[int, float] = defaultdict(float)
+        total = len(self.chunks)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, freq in postings:
+                length_norm = 1 - BM25_B + BM25_B * self.chunks[position].length / (self.avg_length or 1)
+                scores[position] += idf * freq * (BM25_K1 + 1) / (freq + BM25_K1 * length_norm)
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(self.chunks[position], score) for position, score in best]
+
+    def search_embedding(self, query_embedding: List[float], top_k: int) -> List[Tuple[KnowledgeChunk, float]]:
+        scored = [
+            (chunk, _cosine(query_embedding, chunk.embedding))
+            for chunk in self.chunks if chunk.embedding
+        ]
+        return heapq.nlargest(top_k, scored, key=lambda item: item[1])
+
+
+class KnowledgeBaseIndex:
+    """Keeps the chunk tables in sync with the entries and caches built indexes."""
+
+    def __init__(self, embedding_backend: Optional[EmbeddingBackend] = None, max_cached_indexes: int = MAX_CACHED_INDEXES):
+        self.embedding_backend = embedding_backend
+        self.max_cached_indexes = max_cached_indexes
+        # agent_id -> (fingerprint of the indexed entries, index)
+        self._indexes: "OrderedDict[str, Tuple[str, BM25Index]]" = OrderedDict()
+        self.entries_indexed = 0
+        self.index_builds = 0
+        self.index_hits = 0
+
+    @property
+    def _embedding_model(self) -> Optional[str]:
+        return self.embedding_backend.model_name if self.embedding_backend else None
+
+    async def sync(self, client, agent_id: str) -> Dict[str, Dict[str, Any]]:
+        """Chunk and index the agent's entries that changed since they were last indexed.
+
+        Returns:
+            {entry_id: {"name", "content_hash"}} of the active entries that are
+            used as prompt context
+        """
+        entries_result = await client.table('agent_knowledge_base_entries').select(
+            'entry_id, name, updated_at'
+        ).eq('agent_id', agent_id).eq('is_active', True).in_('usage_context', INDEXED_USAGE_CONTEXTS).execute()
+        entries = entries_result.data or []
+        if not entries:
+            return {}
+
+        states_result = await client.table('agent_knowledge_base_index_state').select(
+            'entry_id, entry_updated_at, content_hash, embedding_model'
+        ).eq('agent_id', agent_id).execute()
+        states = {row['entry_id']: row for row in states_result.data or []}
+
+        stale_ids = [
+            entry['entry_id'] for entry in entries
+            if entry['entry_id'] not in states
+            or states[entry['entry_id']]['entry_updated_at'] != entry['updated_at']
+            or states[entry['entry_id']].get('embedding_model') != self._embedding_model
+        ]
+        if stale_ids:
+            rows = await batch_query_in(
+                client=client,
+                table_name='agent_knowledge_base_entries',
+                select_fields='entry_id, agent_id, name, description, content, updated_at',
+                in_field='entry_id',
+                in_values=stale_ids,
+                batch_size=CHUNK_LOAD_BATCH_SIZE
+            )
+            for row in rows:
+                try:
+                    states[row['entry_id']] = await self._index_entry(client, row, states.get(row['entry_id']))
+                except Exception as e:
+                    logger.error(f"Failed to index knowledge base entry {row['entry_id']}: {str(e)}")
+
+        return {
+            entry['entry_id']: {'name': entry['name'], 'content_hash': states[entry['entry_id']]['content_hash']}
+            for entry in entries if entry['entry_id'] in states
+        }
+
+    async def _index_entry(self, client, entry: Dict[str, Any], state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        content_hash = _content_hash(entry)
+        embedding_model = self._embedding_model
+
+        if state is None or state['content_hash'] != content_hash or state.get('embedding_model') != embedding_model:
+            name_terms = tokenize(entry.get('name') or '')
+            chunk_rows = []
+            for chunk_index, content in enumerate(chunk_text(entry['content'])):
+                term_freqs = Counter(tokenize(content))
+                # Entry names are short and descriptive, so they count towards every chunk
+                term_freqs.update(name_terms)
+                chunk_rows.append({
+                    'entry_id': entry['entry_id'],
+                    'agent_id': entry['agent_id'],
+                    'chunk_index': chunk_index,
+                    'content': content,
+                    'term_freqs': dict(term_freqs),
+                    'token_count': sum(term_freqs.values())
+                })
+
+            if self.embedding_backend and chunk_rows:
+                try:
+                    embeddings = await self.embedding_backend.embed([row['content'] for row in chunk_rows])
+                    for row, embedding in zip(chunk_rows, embeddings):
+                        row['embedding'] = embedding
+                except Exception as e:
+                    # Index lexically for now; the entry is re-embedded on the next sync
+                    logger.warning(f"Failed to embed knowledge base entry {entry['entry_id']}: {str(e)}")
+                    embedding_model = None
+
+            await client.table('agent_knowledge_base_chunks').delete().eq('entry_id', entry['entry_id']).execute()
+            if chunk_rows:
+                await client.table('agent_knowledge_base_chunks').insert(chunk_rows).execute()
+            self.entries_indexed += 1
+            logger.debug(f"Indexed knowledge base entry {entry['entry_id']} into {len(chunk_rows)} chunks")
+
+        state_row = {
+            'entry_id': entry['entry_id'],
+            'agent_id': entry['agent_id'],
+            'entry_updated_at': entry['updated_at'],
+            'content_hash': content_hash,
+            'embedding_model': embedding_model,
+            'indexed_at': datetime.now(timezone.utc).isoformat()
+        }
+        await client.table('agent_knowledge_base_index_state').upsert(state_row, on_conflict='entry_id').execute()
+        return state_row
+
+    async def get_index(self, client, agent_id: str) -> Tuple[BM25Index, Dict[str, Dict[str, Any]]]:
+        """Sync the agent's entries and return its index, rebuilt only if they changed.
+
+        Returns:
+            (index, entries) where entries is the result of sync()
+        """
+        entries = await self.sync(client, agent_id)
+        fingerprint = hashlib.sha256(
+            "".join(f"{entry_id}:{entry['content_hash']};" for entry_id, entry in sorted(entries.items())).encode()
+        ).hexdigest()
+
+        cached = self._indexes.get(agent_id)
+        if cached and cached[0] == fingerprint:
+            self._indexes.move_to_end(agent_id)
+            self.index_hits += 1
+            return cached[1], entries
+
+        select_fields = 'entry_id, chunk_index, content, term_freqs, token_count'
+        if self.embedding_backend:
+            select_fields += ', embedding'
+        rows = await batch_query_in(
+            client=client,
+            table_name='agent_knowledge_base_chunks',
+            select_fields=select_fields,
+            in_field='entry_id',
+            in_values=list(entries),
+            batch_size=CHUNK_LOAD_BATCH_SIZE
+        )
+        index = BM25Index([
+            KnowledgeChunk(
+                entry_id=row['entry_id'],
+                chunk_index=row['chunk_index'],
+                content=row['content'],
+                term_freqs=row.get('term_freqs') or {},
+                length=row.get('token_count') or 0,
+                embedding=row.get('embedding')
+            )
+            for row in rows
+        ])
+
+        self._indexes[agent_id] = (fingerprint, index)
+        self._indexes.move_to_end(agent_id)
+        while len(self._indexes) > self.max_cached_indexes:
+            self._indexes.popitem(last=False)
+        self.index_builds += 1
+        return index, entries
+
+    async def search(self, index: BM25Index, query: str, top_k: int = DEFAULT_TOP_K) -> List[KnowledgeChunk]:
+        """Top chunks for query; fused with embedding similarity when a backend is set."""
+        lexical = [chunk for chunk, _ in index.search(query, top_k * 4)]
+        if not self.embedding_backend:
+            return lexical[:top_k]
+
+        try:
+            query_embedding = (await self.embedding_backend.embed([query]))[0]
+        except Exception as e:
+            logger.warning(f"Failed to embed knowledge base query, using BM25 only: {str(e)}")
+            return lexical[:top_k]
+        dense = [chunk for chunk, _ in index.search_embedding(query_embedding, top_k * 4)]
+
+        fused: Dict[Tuple[str, int], float] = defaultdict(float)
+        chunks: Dict[Tuple[str, int], KnowledgeChunk] = {}
+        for ranking in (lexical, dense):
+            for rank, chunk in enumerate(ranking):
+                key = (chunk.entry_id, chunk.chunk_index)
+                fused[key] += 1.0 / (RRF_K + rank + 1)
+                chunks[key] = chunk
+        best = heapq.nlargest(top_k, fused.items(), key=lambda item: item[1])
+        return [chunks[key] for key, _ in best]
+
+    async def retrieve_context(
+        self,
+        client,
+        agent_id: str,
+        query: str,
+        top_k: int = DEFAULT_TOP_K,
+        max_chars: int = RETRIEVAL_MAX_CHARS
+    ) -> Optional[str]:
+        """Build the knowledge base prompt section from the chunks relevant to query.
+
+        Both paths use the entries in INDEXED_USAGE_CONTEXTS, so "contextual"
+        entries count towards the size and are included whole in small
+        knowledge bases like "always" entries.
+
+        Returns:
+            None if the knowledge base is small enough to be included whole
+            (get_agent_knowledge_base_context), otherwise the context text,
+            which is empty when nothing matches
+        """
+        index, entries = await self.get_index(client, agent_id)
+        if index.total_chars <= FULL_CONTEXT_MAX_CHARS:
+            return None
+
+        selected: List[KnowledgeChunk] = []
+        used_chars = 0
+        for chunk in await self.search(index, query, top_k):
+            if used_chars + len(chunk.content) > max_chars and selected:
+                break
+            selected.append(chunk)
+            used_chars += len(chunk.content)
+        if not selected:
+            return ""
+
+        # Group by entry in order of each entry's best chunk, chunks in document order
+        by_entry: "OrderedDict[str, List[KnowledgeChunk]]" = OrderedDict()
+        for chunk in selected:
+            by_entry.setdefault(chunk.entry_id, []).append(chunk)
+
+        context_text = ""
+        for entry_id, chunks in by_entry.items():
+            context_text += f"\n\n## {entries[entry_id]['name']}\n"
+            context_text += "\n\n[...]\n\n".join(chunk.content for chunk in sorted(chunks, key=lambda c: c.chunk_index))
+
+        try:
+            await client.table('agent_knowledge_base_usage_log').insert([
+                {'entry_id': entry_id, 'agent_id': agent_id, 'usage_type': 'context_injection'}
+                for entry_id in by_entry
+            ]).execute()
+        except Exception as e:
+            logger.warning(f"Failed to log knowledge base usage for agent {agent_id}: {str(e)}")
+
+        logger.debug(f"Retrieved {len(selected)} knowledge base chunks from {len(by_entry)} entries for agent {agent_id}")
+        return (
+            "# AGENT KNOWLEDGE BASE\n\nThe following excerpts of your specialized knowledge base are the "
+            "parts relevant to the current request. Use this information as context when responding:" + context_text
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cached_indexes": len(self._indexes),
+            "index_builds": self.index_builds,
+            "index_hits": self.index_hits,
+            "entries_indexed": self.entries_indexed,
+        }
+
+
+knowledge_base_index = KnowledgeBaseIndex(
+    embedding_backend=LiteLLMEmbeddingBackend(config.KB_EMBEDDING_MODEL) if config.KB_EMBEDDING_MODEL else None
+)
@@ -14,6 +14,7 @@ from .connection_token_service import ConnectionTokenService
 
 import httpx
 import json
+from services.http_client import http_pool
 
 router = APIRouter(prefix="/pipedream", tags=["pipedream"])
 
@@ -503,26 +504,25 @@ async def get_app_tools(app_slug: str):
     payload = {"jsonrpc": "2.0", "method": "tools/list", "params": {}, "id": 1}
     headers = {"Content-Type": "application/json", "Accept": "application/json, text/event-stream"}
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            async with client.stream("POST", url, json=payload, headers=headers) as resp:
-                resp.raise_for_status()
-                tools = []
-                async for line in resp.aiter_lines():
-                    if not line or not line.startswith("data:"):
-                        continue
-                    data_str = line[len("data:"):].strip()
-                    try:
-                        data_obj = json.loads(data_str)
-                        tools = data_obj.get("result", {}).get("tools", [])
-                        for tool in tools:
-                            desc = tool.get("description", "") or ""
-                            idx = desc.find("[")
-                            if idx != -1:
-                                tool["description"] = desc[:idx].strip()
-                        break
-                    except json.JSONDecodeError:
-                        logger.warning(f"Failed to parse JSON data: {data_str}")
-                        continue
+        async with http_pool.stream("POST", url, json=payload, headers=headers, timeout=30.0) as resp:
+            resp.raise_for_status()
+            tools = []
+            async for line in resp.aiter_lines():
+                if not line or not line.startswith("data:"):
+                    continue
+                data_str = line[len("data:"):].strip()
+                try:
+                    data_obj = json.loads(data_str)
+                    tools = data_obj.get("result", {}).get("tools", [])
+                    for tool in tools:
+                        desc = tool.get("description", "") or ""
+                        idx = desc.find("[")
+                        if idx != -1:
+                            tool["description"] = desc[:idx].strip()
+                    break
+                except json.JSONDecodeError:
+                    logger.warning(f"Failed to parse JSON data: {data_str}")
+                    continue
         return {"success": True, "tools": tools}
     except httpx.HTTPError as e:
         logger.error(f"HTTP error when fetching tools for app {app_slug}: {e}")
@@ -6,6 +6,7 @@ from typing import List, Optional, Dict, Any
 from enum import Enum
 
 import httpx
+from services.http_client import http_pool
 from utils.logger import logger
 
 
@@ -82,18 +83,9 @@ class ConnectionService:
     def __init__(self, logger=None):
         self._logger = logger or logger
         self.base_url = "https://api.pipedream.com/v1"
-        self.session = None
         self.access_token = None
         self.token_expires_at = None
 
-    async def _get_session(self) -> httpx.AsyncClient:
-        if self.session is None or self.session.is_closed:
-            self.session = httpx.AsyncClient(
-                timeout=httpx.Timeout(30.0),
-                headers={"User-Agent": "Suna-Pipedream-Client/1.0"}
-            )
-        return self.session
-
     async def _ensure_access_token(self) -> str:
         if self.access_token and self.token_expires_at:
             if datetime.utcnow() < (self.token_expires_at - timedelta(minutes=5)):
@@ -112,11 +104,10 @@ class ConnectionService:
         if not all([project_id, client_id, client_secret]):
             raise AuthenticationError("Missing required environment variables")
 
-        session = await self._get_session()
-
         try:
-            response = await session.post(
+            response = await http_pool.post(
                 f"{self.base_url}/oauth/token",
+                headers={"User-Agent": "Suna-Pipedream-Client/1.0"},
                 data={
                     "grant_type": "client_credentials",
                     "client_id": client_id,
@@ -140,12 +131,12 @@ class ConnectionService:
     async def _make_request(self, method: str, url: str, headers: Dict[str, str] = None, 
                            params: Dict[str, Any] = None, json: Dict[str, Any] = None, 
                            retry_count: int = 0) -> Dict[str, Any]:
-        session = await self._get_session()
         access_token = await self._ensure_access_token()
 
         request_headers = {
             "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            "User-Agent": "Suna-Pipedream-Client/1.0"
         }
 
         if headers:
@@ -153,9 +144,9 @@ class ConnectionService:
 
         try:
             if method == "GET":
-                response = await session.get(url, headers=request_headers, params=params)
+                response = await http_pool.get(url, headers=request_headers, params=params)
             elif method == "POST":
-                response = await session.post(url, headers=request_headers, json=json)
+                response = await http_pool.post(url, headers=request_headers, json=json)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
 
@@ -242,8 +233,8 @@ class ConnectionService:
         return False
 
     async def close(self):
-        if self.session and not self.session.is_closed:
-            await self.session.aclose()
+        # Connections belong to the shared http_pool, which outlives this service
+        pass
 
 
 _connection_service = None
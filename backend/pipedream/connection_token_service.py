@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
 import httpx
+from services.http_client import http_pool
 from utils.logger import logger
 
 
@@ -39,18 +40,9 @@ class ConnectionTokenService:
     def __init__(self, logger=None):
         self._logger = logger or logger
         self.base_url = "https://api.pipedream.com/v1"
-        self.session = None
         self.access_token = None
         self.token_expires_at = None
 
-    async def _get_session(self) -> httpx.AsyncClient:
-        if self.session is None or self.session.is_closed:
-            self.session = httpx.AsyncClient(
-                timeout=httpx.Timeout(30.0),
-                headers={"User-Agent": "Suna-Pipedream-Client/1.0"}
-            )
-        return self.session
-
     async def _ensure_access_token(self) -> str:
         if self.access_token and self.token_expires_at:
             if datetime.utcnow() < (self.token_expires_at - timedelta(minutes=5)):
@@ -66,11 +58,10 @@ class ConnectionTokenService:
         if not all([project_id, client_id, client_secret]):
             raise AuthenticationError("Missing required environment variables")
 
-        session = await self._get_session()
-
         try:
-            response = await session.post(
+            response = await http_pool.post(
                 f"{self.base_url}/oauth/token",
+                headers={"User-Agent": "Suna-Pipedream-Client/1.0"},
                 data={
                     "grant_type": "client_credentials",
                     "client_id": client_id,
@@ -92,19 +83,19 @@ class ConnectionTokenService:
             raise AuthenticationError(f"Failed to obtain access token: {e}")
 
     async def _make_request(self, url: str, headers: Dict[str, str] = None, json: Dict[str, Any] = None) -> Dict[str, Any]:
-        session = await self._get_session()
         access_token = await self._ensure_access_token()
 
         request_headers = {
             "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            "User-Agent": "Suna-Pipedream-Client/1.0"
         }
 
         if headers:
             request_headers.update(headers)
 
         try:
-            response = await session.post(url, headers=request_headers, json=json)
+            response = await http_pool.post(url, headers=request_headers, json=json)
             response.raise_for_status()
             return response.json()
         except httpx.HTTPStatusError as e:
@@ -151,8 +142,8 @@ class ConnectionTokenService:
             raise
 
     async def close(self):
-        if self.session and not self.session.is_closed:
-            await self.session.aclose()
+        # Connections belong to the shared http_pool, which outlives this service
+        pass
 
 
 _connection_token_service = None
@@ -4,13 +4,18 @@ dotenv.load_dotenv(".env")
 import sentry
 import asyncio
 import json
+import threading
+import time
 import traceback
 from datetime import datetime, timezone
 from typing import Optional
-from services import redis
+from services import redis, active_runs, run_scheduler, run_checkpoint
+from services.run_checkpoint import RunCheckpoint
+from services.run_stream import RunResponseStream, RunResponseWriter
 from agent.run import run_agent
 from utils.logger import logger, structlog
 import dramatiq
+from dramatiq.asyncio import get_event_loop_thread
 import uuid
 from agentpress.thread_manager import ThreadManager
 from services.supabase import DBConnection
@@ -18,6 +23,8 @@ from services import redis
 from dramatiq.brokers.redis import RedisBroker
 import os
 from services.langfuse import langfuse
+from services.http_client import http_pool
+from agent.tools.utils.mcp_session_pool import mcp_session_pool
 from utils.retry import retry
 
 import sentry_sdk
@@ -25,7 +32,35 @@ from typing import Dict, Any
 
 redis_host = os.getenv('REDIS_HOST', 'redis')
 redis_port = int(os.getenv('REDIS_PORT', 6379))
-redis_broker = RedisBroker(host=redis_host, port=redis_port, middleware=[dramatiq.middleware.AsyncIO()])
+
+class RunDrainMiddleware(dramatiq.Middleware):
+    """Lets in-flight agent runs hand themselves off when the worker shuts down."""
+
+    def __init__(self):
+        self.draining = threading.Event()
+
+    def before_worker_shutdown(self, broker, worker):
+        self.draining.set()
+
+    def after_worker_shutdown(self, broker, worker):
+        # Runs have handed off by now, and after_ hooks run in reverse order, so
+        # the AsyncIO middleware has not yet stopped the loop the pools live on
+        event_loop_thread = get_event_loop_thread()
+        if event_loop_thread is not None:
+            event_loop_thread.run_coroutine(close_shared_pools())
+
+
+async def close_shared_pools():
+    """Close pooled MCP sessions and HTTP clients, e.g. stdio MCP server processes."""
+    for pool in (mcp_session_pool, http_pool):
+        try:
+            await pool.close_all()
+        except Exception as e:
+            logger.warning(f"Error closing {type(pool).__name__} on shutdown: {str(e)}")
+
+
+run_drain = RunDrainMiddleware()
+redis_broker = RedisBroker(host=redis_host, port=redis_port, middleware=[dramatiq.middleware.AsyncIO(), run_drain])
 
 dramatiq.set_broker(redis_broker)
 
@@ -64,9 +99,27 @@ async def run_agent_background(
     stream: bool = True,
     enable_context_manager: bool = True,
     agent_config: Optional[dict] = None,
-    request_id: Optional[str] = None
+    request_id: Optional[str] = None,
+    resume: bool = False
 ):
-    """Run the agent in the background using Redis for state."""
+    """Run the agent in the background using Redis for state.
+
+    With resume=True the run continues from its checkpoint, after the worker
+    that ran it shut down or stopped renewing its lease.
+    """
+    actor_kwargs = {
+        "agent_run_id": agent_run_id,
+        "thread_id": thread_id,
+        "instance_id": instance_id,
+        "project_id": project_id,
+        "model_name": model_name,
+        "enable_thinking": enable_thinking,
+        "reasoning_effort": reasoning_effort,
+        "stream": stream,
+        "enable_context_manager": enable_context_manager,
+        "agent_config": agent_config,
+        "request_id": request_id,
+    }
     structlog.contextvars.clear_contextvars()
     structlog.contextvars.bind_contextvars(
         agent_run_id=agent_run_id,
@@ -80,24 +133,22 @@ async def run_agent_background(
         logger.critical(f"Failed to initialize Redis connection: {e}")
         raise e
 
-    # Idempotency check: prevent duplicate runs
-    run_lock_key = f"agent_run_lock:{agent_run_id}"
-    
-    # Try to acquire a lock for this agent run
-    lock_acquired = await redis.set(run_lock_key, instance_id, nx=True, ex=redis.REDIS_KEY_TTL)
-    
-    if not lock_acquired:
-        # Check if the run is already being handled by another instance
-        existing_instance = await redis.get(run_lock_key)
-        if existing_instance:
-            logger.debug(f"Agent run {agent_run_id} is already being processed by instance {existing_instance.decode() if isinstance(existing_instance, bytes) else existing_instance}. Skipping duplicate execution.")
+    # Idempotency check: only the worker holding the run's lease executes it
+    lease_owner = f"{instance_id}:{uuid.uuid4().hex[:8]}"
+    if not await run_checkpoint.acquire_lease(agent_run_id, lease_owner, resume=resume):
+        existing_owner = await redis.get(run_checkpoint.lease_key(agent_run_id))
+        logger.debug(f"Agent run {agent_run_id} is already being processed by {existing_owner or 'another worker'}. Skipping duplicate execution.")
+        return
+
+    client = await db.client
+    if resume:
+        checkpoint = await _load_resumable_checkpoint(client, agent_run_id)
+        if checkpoint is None:
+            await run_checkpoint.release_lease(agent_run_id, lease_owner)
             return
-        else:
-            # Lock exists but no value, try to acquire again
-            lock_acquired = await redis.set(run_lock_key, instance_id, nx=True, ex=redis.REDIS_KEY_TTL)
-            if not lock_acquired:
-                logger.debug(f"Agent run {agent_run_id} is already being processed by another instance. Skipping duplicate execution.")
-                return
+    else:
+        checkpoint = RunCheckpoint(agent_run_id=agent_run_id, actor_kwargs=actor_kwargs)
+    await run_checkpoint.save_checkpoint(checkpoint)
 
     sentry.sentry.set_tag("thread_id", thread_id)
 
@@ -129,28 +180,44 @@ async def run_agent_background(
     if agent_config:
         logger.debug(f"Using custom agent: {agent_config.get('name', 'Unknown')}")
 
-    client = await db.client
     start_time = datetime.now(timezone.utc)
     total_responses = 0
     pubsub = None
     stop_checker = None
     stop_signal_received = False
+    # "handoff" when the worker shuts down, "lease_lost" when another worker may own the run
+    interruption = None
 
     # Define Redis keys and channels
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    response_channel = f"agent_run:{agent_run_id}:new_response"
+    response_stream = RunResponseStream(agent_run_id)
+    response_writer = RunResponseWriter(response_stream)
     instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id}"
     global_control_channel = f"agent_run:{agent_run_id}:control"
     instance_active_key = f"active_run:{instance_id}:{agent_run_id}"
 
     async def check_for_stop_signal():
-        nonlocal stop_signal_received, pubsub
+        nonlocal stop_signal_received, interruption, pubsub
         if not pubsub:
             return
         reconnect_attempts = 0
         max_reconnect_attempts = 5
+        last_heartbeat = time.monotonic()
+        last_lease_renewal = time.monotonic()
         try:
             while not stop_signal_received:
+                if run_drain.draining.is_set():
+                    logger.debug(f"Worker shutting down, handing off agent run {agent_run_id}")
+                    interruption = "handoff"
+                    break
+                if time.monotonic() - last_lease_renewal >= run_checkpoint.LEASE_RENEW_INTERVAL_SECONDS:
+                    last_lease_renewal = time.monotonic()
+                    try:
+                        if not await run_checkpoint.renew_lease(agent_run_id, lease_owner):
+                            logger.error(f"Lost the lease of agent run {agent_run_id}; it may have been resumed elsewhere")
+                            interruption = "lease_lost"
+                            break
+                    except Exception as lease_err:
+                        logger.warning(f"Failed to renew lease of agent run {agent_run_id}: {lease_err}")
                 try:
                     message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.5)
                 except Exception as e:
@@ -192,6 +259,14 @@ async def run_agent_background(
                         await redis.expire(instance_active_key, redis.REDIS_KEY_TTL)
                     except Exception as ttl_err:
                         logger.warning(f"Failed to refresh TTL for {instance_active_key}: {ttl_err}")
+                # Keep the run counted against the account's parallel run limit
+                if time.monotonic() - last_heartbeat >= active_runs.HEARTBEAT_INTERVAL_SECONDS:
+                    last_heartbeat = time.monotonic()
+                    try:
+                        await active_runs.heartbeat(agent_run_id)
+                        await run_scheduler.heartbeat(agent_run_id)
+                    except Exception as hb_err:
+                        logger.warning(f"Failed to heartbeat active run {agent_run_id}: {hb_err}")
                 await asyncio.sleep(0.1)  # Short sleep to prevent tight loop
         except asyncio.CancelledError:
             logger.debug(f"Stop signal checker cancelled for {agent_run_id} (Instance: {instance_id})")
@@ -224,24 +299,26 @@ async def run_agent_background(
             enable_context_manager=enable_context_manager,
             agent_config=agent_config,
             trace=trace,
+            checkpoint=checkpoint,
         )
 
         final_status = "running"
         error_message = None
 
-        pending_redis_operations = []
+        response_writer.start()
 
         async for response in agent_gen:
+            if interruption:
+                logger.debug(f"Agent run {agent_run_id} interrupted on this worker: {interruption}")
+                break
             if stop_signal_received:
                 logger.debug(f"Agent run {agent_run_id} stopped by signal.")
                 final_status = "stopped"
                 trace.span(name="agent_run_stopped").end(status_message="agent_run_stopped", level="WARNING")
                 break
 
-            # Store response in Redis list and publish notification
-            response_json = json.dumps(response)
-            pending_redis_operations.append(asyncio.create_task(redis.rpush(response_list_key, response_json)))
-            pending_redis_operations.append(asyncio.create_task(redis.publish(response_channel, "new")))
+            # Buffer response for the next batched write to the run's Redis stream
+            await response_writer.write(json.dumps(response))
             total_responses += 1
 
             # Check for agent-signaled completion or error
@@ -254,6 +331,13 @@ async def run_agent_background(
                          error_message = response.get('message', f"Run ended with status: {status_val}")
                      break
 
+        if interruption:
+            # The run goes on elsewhere, so leave its status and viewers alone
+            await response_writer.close()
+            if interruption == "handoff":
+                await _hand_off_run(checkpoint, lease_owner)
+            return
+
         # If loop finished without explicit completion/error/stop signal, mark as completed
         if final_status == "running":
              final_status = "completed"
@@ -261,12 +345,10 @@ async def run_agent_background(
              logger.debug(f"Agent run {agent_run_id} completed normally (duration: {duration:.2f}s, responses: {total_responses})")
              completion_message = {"type": "status", "status": "completed", "message": "Agent run completed successfully"}
              trace.span(name="agent_run_completed").end(status_message="agent_run_completed")
-             await redis.rpush(response_list_key, json.dumps(completion_message))
-             await redis.publish(response_channel, "new") # Notify about the completion message
+             await response_writer.write(json.dumps(completion_message))
 
-        # Fetch final responses from Redis for DB update
-        all_responses_json = await redis.lrange(response_list_key, 0, -1)
-        all_responses = [json.loads(r) for r in all_responses_json]
+        # Write out buffered responses before signalling viewers
+        await response_writer.close()
 
         # Update DB status
         await update_agent_run_status(client, agent_run_id, final_status, error=error_message)
@@ -274,6 +356,7 @@ async def run_agent_background(
         # Publish final control signal (END_STREAM or ERROR)
         control_signal = "END_STREAM" if final_status == "completed" else "ERROR" if final_status == "failed" else "STOP"
         try:
+            await response_stream.append_control(control_signal)
             await redis.publish(global_control_channel, control_signal)
             # No need to publish to instance channel as the run is ending on this instance
             logger.debug(f"Published final control signal '{control_signal}' to {global_control_channel}")
@@ -288,28 +371,20 @@ async def run_agent_background(
         final_status = "failed"
         trace.span(name="agent_run_failed").end(status_message=error_message, level="ERROR")
 
-        # Push error message to Redis list
+        # Push error message to the Redis stream
         error_response = {"type": "status", "status": "error", "message": error_message}
         try:
-            await redis.rpush(response_list_key, json.dumps(error_response))
-            await redis.publish(response_channel, "new")
+            await response_writer.close()
+            await response_stream.append(json.dumps(error_response))
         except Exception as redis_err:
              logger.error(f"Failed to push error response to Redis for {agent_run_id}: {redis_err}")
 
-        # Fetch final responses (including the error)
-        all_responses = []
-        try:
-             all_responses_json = await redis.lrange(response_list_key, 0, -1)
-             all_responses = [json.loads(r) for r in all_responses_json]
-        except Exception as fetch_err:
-             logger.error(f"Failed to fetch responses from Redis after error for {agent_run_id}: {fetch_err}")
-             all_responses = [error_response] # Use the error message we tried to push
-
         # Update DB status
         await update_agent_run_status(client, agent_run_id, "failed", error=f"{error_message}\n{traceback_str}")
 
         # Publish ERROR signal
         try:
+            await response_stream.append_control("ERROR")
             await redis.publish(global_control_channel, "ERROR")
             logger.debug(f"Published ERROR signal to {global_control_channel}")
         except Exception as e:
@@ -332,20 +407,33 @@ async def run_agent_background(
             except Exception as e:
                 logger.warning(f"Error closing pubsub for {agent_run_id}: {str(e)}")
 
-        # Set TTL on the response list in Redis
+        # Set TTL on the response stream in Redis
         await _cleanup_redis_response_list(agent_run_id)
 
         # Remove the instance-specific active run key
         await _cleanup_redis_instance_key(agent_run_id)
 
-        # Clean up the run lock
-        await _cleanup_redis_run_lock(agent_run_id)
+        # Release the lease; a no-op once it was handed off or lost
+        try:
+            await run_checkpoint.release_lease(agent_run_id, lease_owner)
+        except Exception as e:
+            logger.warning(f"Failed to release lease of agent run {agent_run_id}: {str(e)}")
 
-        # Wait for all pending redis operations to complete, with timeout
+        # A run that reached a final status is never resumed
+        if not interruption:
+            try:
+                await run_checkpoint.clear_checkpoint(agent_run_id)
+            except Exception as e:
+                logger.warning(f"Failed to clear checkpoint of agent run {agent_run_id}: {str(e)}")
+
+        # Flush any responses still buffered, with timeout
         try:
-            await asyncio.wait_for(asyncio.gather(*pending_redis_operations), timeout=30.0)
+            await asyncio.wait_for(response_writer.close(), timeout=30.0)
         except asyncio.TimeoutError:
             logger.warning(f"Timeout waiting for pending Redis operations for {agent_run_id}")
+        except Exception as e:
+            logger.warning(f"Failed to flush pending responses for {agent_run_id}: {str(e)}")
+        logger.debug(f"Response writer stats for {agent_run_id}: {response_writer.stats()}")
 
         logger.debug(f"Agent run background task fully completed for: {agent_run_id} (Instance: {instance_id}) with final status: {final_status}")
 
@@ -362,27 +450,64 @@ async def _cleanup_redis_instance_key(agent_run_id: str):
     except Exception as e:
         logger.warning(f"Failed to clean up Redis key {key}: {str(e)}")
 
-async def _cleanup_redis_run_lock(agent_run_id: str):
-    """Clean up the run lock Redis key for an agent run."""
-    run_lock_key = f"agent_run_lock:{agent_run_id}"
-    logger.debug(f"Cleaning up Redis run lock key: {run_lock_key}")
+async def _load_resumable_checkpoint(client, agent_run_id: str) -> Optional[RunCheckpoint]:
+    """Load the checkpoint of a run being resumed, or None if it should not go on."""
+    checkpoint = await run_checkpoint.load_checkpoint(agent_run_id)
+    if checkpoint is None:
+        logger.warning(f"No checkpoint to resume agent run {agent_run_id} from")
+        return None
+
+    # The run may have been stopped while no worker held it
+    run_result = await client.table('agent_runs').select('status').eq('id', agent_run_id).execute()
+    if not run_result.data or run_result.data[0].get('status') != 'running':
+        logger.debug(f"Not resuming agent run {agent_run_id}: it is no longer running")
+        await run_checkpoint.clear_checkpoint(agent_run_id)
+        return None
+
+    checkpoint.resumes += 1
+    if checkpoint.resumes > run_checkpoint.MAX_RESUMES:
+        logger.error(f"Agent run {agent_run_id} was interrupted {checkpoint.resumes} times; giving up")
+        error_message = f"Agent run was interrupted too many times ({run_checkpoint.MAX_RESUMES} resumes)"
+        await update_agent_run_status(client, agent_run_id, "failed", error=error_message)
+        try:
+            response_stream = RunResponseStream(agent_run_id)
+            await response_stream.append(json.dumps({"type": "status", "status": "error", "message": error_message}))
+            await response_stream.append_control("ERROR")
+            await redis.publish(f"agent_run:{agent_run_id}:control", "ERROR")
+        except Exception as e:
+            logger.warning(f"Failed to publish ERROR signal for {agent_run_id}: {str(e)}")
+        await run_checkpoint.clear_checkpoint(agent_run_id)
+        return None
+
+    logger.debug(f"Resuming agent run {agent_run_id} from iteration {checkpoint.iteration_count + 1} (resume {checkpoint.resumes})")
+    return checkpoint
+
+async def _hand_off_run(checkpoint: RunCheckpoint, lease_owner: str):
+    """Checkpoint a run interrupted by worker shutdown and queue its resumption."""
+    agent_run_id = checkpoint.agent_run_id
     try:
-        await redis.delete(run_lock_key)
-        logger.debug(f"Successfully cleaned up Redis run lock key: {run_lock_key}")
+        await run_checkpoint.save_checkpoint(checkpoint)
+        if not await run_checkpoint.hand_off_lease(agent_run_id, lease_owner):
+            logger.warning(f"Lease of agent run {agent_run_id} was lost before hand-off")
+            return
+        actor_kwargs = dict(checkpoint.actor_kwargs)
+        await run_scheduler.submit_resume(actor_kwargs.pop("agent_run_id"), **actor_kwargs)
+        logger.debug(f"Handed off agent run {agent_run_id} after {checkpoint.iteration_count} iterations")
     except Exception as e:
-        logger.warning(f"Failed to clean up Redis run lock key {run_lock_key}: {str(e)}")
+        # The handed-off lease expires and the orphan sweep resumes the run
+        logger.error(f"Failed to hand off agent run {agent_run_id}: {str(e)}")
 
-# TTL for Redis response lists (24 hours)
+# TTL for Redis response streams (24 hours)
 REDIS_RESPONSE_LIST_TTL = 3600 * 24
 
 async def _cleanup_redis_response_list(agent_run_id: str):
-    """Set TTL on the Redis response list."""
-    response_list_key = f"agent_run:{agent_run_id}:responses"
+    """Set TTL on the Redis response stream."""
+    response_stream = RunResponseStream(agent_run_id)
     try:
-        await redis.expire(response_list_key, REDIS_RESPONSE_LIST_TTL)
-        logger.debug(f"Set TTL ({REDIS_RESPONSE_LIST_TTL}s) on response list: {response_list_key}")
+        await response_stream.expire(REDIS_RESPONSE_LIST_TTL)
+        logger.debug(f"Set TTL ({REDIS_RESPONSE_LIST_TTL}s) on response stream: {response_stream.key}")
     except Exception as e:
-        logger.warning(f"Failed to set TTL on response list {response_list_key}: {str(e)}")
+        logger.warning(f"Failed to set TTL on response stream {response_stream.key}: {str(e)}")
 
 async def update_agent_run_status(
     client,
@@ -394,6 +519,18 @@ async def update_agent_run_status(
     Centralized function to update agent run status.
     Returns True if update was successful.
     """
+    if status != "running":
+        # Free the account's parallel run slot even if the DB update below fails
+        try:
+            await active_runs.unregister_run(agent_run_id)
+        except Exception as e:
+            logger.warning(f"Failed to remove agent run {agent_run_id} from active runs: {str(e)}")
+        # Hand the run's scheduler slot to the next queued run
+        try:
+            await run_scheduler.release(agent_run_id)
+        except Exception as e:
+            logger.warning(f"Failed to release scheduler slot of agent run {agent_run_id}: {str(e)}")
+
     try:
         update_data = {
             "status": status,
@@ -0,0 +1,179 @@
+"""
+Live set of running agent runs per account.
+
+The parallel run limit used to be checked by listing every thread of the
+account and counting running agent_runs over all of them on each agent start.
+Instead, running runs are kept in a Redis sorted set per account, so the check
+is a single round trip:
+
+    active_runs:{account_id}     members "{agent_run_id}:{thread_id}", scored by
+                                 the time the entry expires unless refreshed
+    active_runs:{account_id}:reconciled_at
+                                 unix time of the last reconciliation
+
+Runs are added when they are started, refreshed by the worker's heartbeat and
+removed when their final status is written. An entry whose worker died without
+removing it expires after ACTIVE_RUN_TTL seconds, and the set is periodically
+reconciled against the agent_runs table, which remains the source of truth.
+"""
+
+import time
+from typing import List, Optional, Tuple
+
+from services import redis
+from utils.logger import logger
+
+# An entry expires unless the worker heartbeats it within this many seconds
+ACTIVE_RUN_TTL = 15 * 60
+HEARTBEAT_INTERVAL_SECONDS = 60
+ACTIVE_RUNS_KEY_TTL = 3600 * 24
+# How stale the set may get before a reconciliation is scheduled
+RECONCILE_INTERVAL_SECONDS = 300
+RECONCILE_LOCK_TTL = 60
+
+# Removes the run using the account recorded when it was registered, so
+# callers that only know the run id (status updates, stops) can remove it.
+_UNREGISTER_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if not owner then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+local account_id, thread_id = string.match(owner, '^([^:]+):(.*)$')
+return redis.call('ZREM', 'active_runs:' .. account_id, ARGV[1] .. ':' .. thread_id)
+"""
+
+_HEARTBEAT_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if not owner then
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+local account_id, thread_id = string.match(owner, '^([^:]+):(.*)$')
+redis.call('ZADD', 'active_runs:' .. account_id, ARGV[2], ARGV[1] .. ':' .. thread_id)
+return 1
+"""
+
+_LIST_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+return {redis.call('GET', KEYS[2]), redis.call('ZRANGE', KEYS[1], 0, -1)}
+"""
+
+# Entries refreshed after the reconciliation scan started (runs registered or
+# heartbeated meanwhile) are kept; everything else is replaced by the DB result.
+_RECONCILE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1])
+for i = 5, #ARGV do
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[i])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('SET', KEYS[2], ARGV[3], 'EX', ARGV[4])
+return redis.call('ZCARD', KEYS[1])
+"""
+
+
+def active_runs_key(account_id: str) -> str:
+    """Redis key of the running-run set of an account."""
+    return f"active_runs:{account_id}"
+
+
+def _reconciled_at_key(account_id: str) -> str:
+    return f"{active_runs_key(account_id)}:reconciled_at"
+
+
+def _owner_key(agent_run_id: str) -> str:
+    return f"active_run_owner:{agent_run_id}"
+
+
+def _member(agent_run_id: str, thread_id: str) -> str:
+    return f"{agent_run_id}:{thread_id}"
+
+
+async def register_run(account_id: str, agent_run_id: str, thread_id: str):
+    """Add a run that has just been started to its account's set."""
+    redis_client = await redis.get_client()
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.set(_owner_key(agent_run_id), f"{account_id}:{thread_id}", ex=ACTIVE_RUNS_KEY_TTL)
+    pipe.zadd(active_runs_key(account_id), {_member(agent_run_id, thread_id): time.time() + ACTIVE_RUN_TTL})
+    pipe.expire(active_runs_key(account_id), ACTIVE_RUNS_KEY_TTL)
+    await pipe.execute()
+
+
+async def heartbeat(agent_run_id: str) -> bool:
+    """Extend the run's entry by ACTIVE_RUN_TTL; called periodically by the worker.
+
+    Re-adds the entry if a reconciliation dropped it while the run was alive.
+
+    Returns:
+        False if the run is not tracked (never registered or already finished)
+    """
+    redis_client = await redis.get_client()
+    updated = await redis_client.eval(
+        _HEARTBEAT_SCRIPT, 1, _owner_key(agent_run_id),
+        agent_run_id, time.time() + ACTIVE_RUN_TTL, ACTIVE_RUNS_KEY_TTL,
+    )
+    return bool(updated)
+
+
+async def unregister_run(agent_run_id: str) -> bool:
+    """Remove a run that reached a final status; a no-op for untracked runs."""
+    redis_client = await redis.get_client()
+    removed = await redis_client.eval(_UNREGISTER_SCRIPT, 1, _owner_key(agent_run_id), agent_run_id)
+    return bool(removed)
+
+
+async def get_running_runs(account_id: str) -> Tuple[Optional[float], List[Tuple[str, str]]]:
+    """Return the account's running runs, dropping expired entries first.
+
+    Returns:
+        (reconciled_at, [(agent_run_id, thread_id), ...]); reconciled_at is
+        None if the set has not been built from the DB yet, in which case the
+        list must not be trusted.
+    """
+    redis_client = await redis.get_client()
+    reconciled_at, members = await redis_client.eval(
+        _LIST_SCRIPT, 2, active_runs_key(account_id), _reconciled_at_key(account_id), time.time(),
+    )
+    runs = [tuple(member.split(":", 1)) for member in members]
+    return (float(reconciled_at) if reconciled_at else None), runs
+
+
+async def reconcile(account_id: str, runs: List[Tuple[str, str]], scan_started_at: float) -> int:
+    """Replace the set with the running runs found in the DB.
+
+    Args:
+        account_id: Account the runs belong to
+        runs: (agent_run_id, thread_id) of every run the DB reports as running
+        scan_started_at: Time the DB query was started; entries refreshed
+            after it are kept, since the scan may not have seen them
+
+    Returns:
+        Number of running runs tracked after reconciliation
+    """
+    redis_client = await redis.get_client()
+    now = time.time()
+    expires_at = now + ACTIVE_RUN_TTL
+    pipe = redis_client.pipeline(transaction=False)
+    for agent_run_id, thread_id in runs:
+        pipe.set(_owner_key(agent_run_id), f"{account_id}:{thread_id}", ex=ACTIVE_RUNS_KEY_TTL)
+    pipe.eval(
+        _RECONCILE_SCRIPT, 2, active_runs_key(account_id), _reconciled_at_key(account_id),
+        scan_started_at + ACTIVE_RUN_TTL, expires_at, now, ACTIVE_RUNS_KEY_TTL,
+        *(_member(agent_run_id, thread_id) for agent_run_id, thread_id in runs),
+    )
+    results = await pipe.execute()
+    return int(results[-1])
+
+
+def needs_reconcile(reconciled_at: Optional[float]) -> bool:
+    """Whether a set last reconciled at reconciled_at is due for reconciliation."""
+    return reconciled_at is None or time.time() - reconciled_at >= RECONCILE_INTERVAL_SECONDS
+
+
+async def acquire_reconcile_lock(account_id: str) -> bool:
+    """Make sure only one process reconciles an account at a time."""
+    try:
+        return bool(await redis.set(f"{active_runs_key(account_id)}:reconcile_lock", "1", ex=RECONCILE_LOCK_TTL, nx=True))
+    except Exception as e:
+        logger.warning(f"Failed to acquire active run reconcile lock for {account_id}: {str(e)}")
+        return False
@@ -5,22 +5,27 @@ stripe listen --forward-to localhost:8000/api/billing/webhook
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Request
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, Tuple, List, Iterable
+from dataclasses import dataclass
 import stripe
 from datetime import datetime, timezone, timedelta
 from dateutil import parser as dateutil_parser
 
 from supabase import Client as SupabaseClient
 from utils.cache import Cache
+from services import monthly_usage
 from utils.logger import logger
 from utils.config import config, EnvMode
 from services.supabase import DBConnection
 from utils.auth_utils import verify_and_get_user_id_from_jwt
 from pydantic import BaseModel
 from models import model_manager
+from models.models import ModelProvider
 from litellm.cost_calculator import cost_per_token
+from litellm.utils import get_model_info
 import time
 import json
+import asyncio
 
 # Initialize Stripe
 stripe.api_key = config.STRIPE_SECRET_KEY
@@ -28,6 +33,12 @@ stripe.api_key = config.STRIPE_SECRET_KEY
 # Token price multiplier (set to 1.0 = no markup)
 TOKEN_PRICE_MULTIPLIER = 1.0
 
+# Anthropic prompt caching: cache reads cost 10% of the input price and
+# 5-minute cache writes cost 125% of it. Other providers are priced from
+# litellm's per-model cache prices (see _litellm_cache_multipliers).
+CACHE_READ_PRICE_MULTIPLIER = 0.1
+CACHE_WRITE_PRICE_MULTIPLIER = 1.25
+
 # Minimum credits required to allow a new request when over subscription limit
 CREDIT_MIN_START_DOLLARS = 0.20
 
@@ -106,6 +117,82 @@ def is_plan_change_allowed(current_price_id: str, new_price_id: str) -> tuple[bo
 
 # Simplified yearly commitment logic - no subscription schedules needed
 
+@dataclass(frozen=True)
+class ResolvedPricing:
+    """Pricing resolved for a model string.
+
+    Registry models carry per-million rates. Models only known to litellm keep
+    the name that litellm recognised instead, since litellm applies tiered
+    (e.g. above-200k-token) rates that depend on the token counts.
+
+    Cache reads and writes are priced as a fraction of the input price, which
+    depends on the provider; 1.0 bills them as regular input tokens.
+    """
+    input_cost_per_million: float = 0.0
+    output_cost_per_million: float = 0.0
+    litellm_model: Optional[str] = None
+    cache_read_multiplier: float = 1.0
+    cache_write_multiplier: float = 1.0
+
+
+# Registry pricing by model ID and alias, compiled on first use
+_pricing_table: Optional[Dict[str, ResolvedPricing]] = None
+# Resolved pricing per model string; None marks a model with no known pricing
+_resolved_pricing: Dict[str, Optional[ResolvedPricing]] = {}
+
+
+def _litellm_cache_multipliers(model_name: str) -> Tuple[float, float]:
+    """Cache read and write prices of a model as fractions of its input price, per litellm.
+
+    Returns (1.0, 1.0) when litellm does not know the model or lists no cache
+    prices for it, so cache tokens are billed like other input tokens.
+    """
+    try:
+        info = get_model_info(model_name)
+    except Exception:
+        return 1.0, 1.0
+    input_cost_per_token = info.get("input_cost_per_token")
+    if not input_cost_per_token:
+        return 1.0, 1.0
+    read_cost = info.get("cache_read_input_token_cost")
+    write_cost = info.get("cache_creation_input_token_cost")
+    return (
+        read_cost / input_cost_per_token if read_cost is not None else 1.0,
+        write_cost / input_cost_per_token if write_cost is not None else 1.0,
+    )
+
+
+def _get_pricing_table() -> Dict[str, ResolvedPricing]:
+    global _pricing_table
+    if _pricing_table is None:
+        table = {}
+        for model_obj in model_manager.registry.get_all(enabled_only=False):
+            if not model_obj.pricing:
+                continue
+            if model_obj.provider == ModelProvider.ANTHROPIC:
+                cache_multipliers = (CACHE_READ_PRICE_MULTIPLIER, CACHE_WRITE_PRICE_MULTIPLIER)
+            else:
+                cache_multipliers = _litellm_cache_multipliers(model_obj.id)
+            pricing = ResolvedPricing(
+                input_cost_per_million=model_obj.pricing.input_cost_per_million_tokens,
+                output_cost_per_million=model_obj.pricing.output_cost_per_million_tokens,
+                cache_read_multiplier=cache_multipliers[0],
+                cache_write_multiplier=cache_multipliers[1],
+            )
+            for name in [model_obj.id, *model_obj.aliases]:
+                table[name] = pricing
+        _pricing_table = table
+        logger.debug(f"Compiled pricing table with {len(table)} model names")
+    return _pricing_table
+
+
+def clear_pricing_cache():
+    """Drop compiled and resolved pricing, e.g. after models are registered or changed."""
+    global _pricing_table
+    _pricing_table = None
+    _resolved_pricing.clear()
+
+
 def get_model_pricing(model: str) -> tuple[float, float] | None:
     """
     Get pricing for a model. Returns (input_cost_per_million, output_cost_per_million) or None.
@@ -116,22 +203,89 @@ def get_model_pricing(model: str) -> tuple[float, float] | None:
     Returns:
         Tuple of (input_cost_per_million_tokens, output_cost_per_million_tokens) or None if not found
     """
-    # First try to resolve the model ID to handle aliases
-    resolved_model = model_manager.resolve_model_id(model)
-    logger.debug(f"Resolving model '{model}' -> '{resolved_model}'")
+    # Aliases are compiled into the table, so no separate resolve step is needed
+    pricing = _get_pricing_table().get(model)
+    if pricing is None:
+        return None
+    return pricing.input_cost_per_million, pricing.output_cost_per_million
+
+
+def _litellm_model_candidates(model: str, resolved_model: str) -> list[str]:
+    models_to_try = [model]
     
-    # Try the resolved model first, then fallback to original
-    for model_to_try in [resolved_model, model]:
-        model_obj = model_manager.get_model(model_to_try)
-        if model_obj and model_obj.pricing:
-            logger.debug(f"Found pricing for model {model_to_try}: input=${model_obj.pricing.input_cost_per_million_tokens}/M, output=${model_obj.pricing.output_cost_per_million_tokens}/M")
-            return model_obj.pricing.input_cost_per_million_tokens, model_obj.pricing.output_cost_per_million_tokens
-        else:
-            logger.debug(f"No pricing for model_to_try='{model_to_try}' (model_obj: {model_obj is not None}, has_pricing: {model_obj.pricing is not None if model_obj else False})")
+    # Add resolved model if different
+    if resolved_model != model:
+        models_to_try.append(resolved_model)
     
-    # Silently return None for unknown models to avoid log spam
-    logger.debug(f"No pricing found for model '{model}' (resolved: '{resolved_model}')")
-    return None
+    # Try without provider prefix if it has one
+    if '/' in model:
+        models_to_try.append(model.split('/', 1)[1])
+    if '/' in resolved_model and resolved_model != model:
+        models_to_try.append(resolved_model.split('/', 1)[1])
+        
+    # Special handling for Google models accessed via OpenRouter
+    if model.startswith('openrouter/google/'):
+        models_to_try.append(model.replace('openrouter/', ''))
+    if resolved_model.startswith('openrouter/google/'):
+        models_to_try.append(resolved_model.replace('openrouter/', ''))
+    return models_to_try
+
+
+def resolve_pricing(model: str) -> Optional[ResolvedPricing]:
+    """Resolve how a model string is priced, memoizing hits and misses.
+
+    Args:
+        model: Model name as stored with the usage (display name, alias or ID)
+
+    Returns:
+        ResolvedPricing, or None if neither the registry nor litellm prices the model
+    """
+    if model in _resolved_pricing:
+        return _resolved_pricing[model]
+
+    pricing = _get_pricing_table().get(model)
+    if pricing is None:
+        resolved_model = model_manager.resolve_model_id(model)
+        for model_name in _litellm_model_candidates(model, resolved_model):
+            try:
+                prompt_token_cost, completion_token_cost = cost_per_token(model_name, 1, 1)
+                if prompt_token_cost is not None and completion_token_cost is not None:
+                    cache_read_multiplier, cache_write_multiplier = _litellm_cache_multipliers(model_name)
+                    pricing = ResolvedPricing(
+                        litellm_model=model_name,
+                        cache_read_multiplier=cache_read_multiplier,
+                        cache_write_multiplier=cache_write_multiplier,
+                    )
+                    break
+            except Exception:
+                continue
+        if pricing is None:
+            logger.debug(f"No pricing found for model '{model}' (resolved: '{resolved_model}'), costs will be 0")
+
+    _resolved_pricing[model] = pricing
+    return pricing
+
+
+def _priced_cost(
+    pricing: ResolvedPricing,
+    prompt_tokens: int,
+    completion_tokens: int,
+    cache_read_tokens: int = 0,
+    cache_creation_tokens: int = 0,
+) -> float:
+    # prompt_tokens includes cache reads; cache writes are reported separately
+    # (litellm 1.75 adds Anthropic's cache_read_input_tokens to prompt_tokens
+    # but not cache_creation_input_tokens)
+    uncached_tokens = max(prompt_tokens - cache_read_tokens, 0)
+    cache_weighted_tokens = cache_read_tokens * pricing.cache_read_multiplier + cache_creation_tokens * pricing.cache_write_multiplier
+    if pricing.litellm_model:
+        prompt_token_cost, completion_token_cost = cost_per_token(pricing.litellm_model, uncached_tokens, completion_tokens)
+        if cache_weighted_tokens:
+            input_cost_per_token, _ = cost_per_token(pricing.litellm_model, 1, 0)
+            prompt_token_cost += cache_weighted_tokens * input_cost_per_token
+        return prompt_token_cost + completion_token_cost
+    input_tokens = uncached_tokens + cache_weighted_tokens
+    return (input_tokens * pricing.input_cost_per_million + completion_tokens * pricing.output_cost_per_million) / 1_000_000
 
 
 SUBSCRIPTION_TIERS = {
@@ -376,11 +530,35 @@ async def get_user_subscription(user_id: str) -> Optional[Dict]:
         return None
 
 async def calculate_monthly_usage(client, user_id: str) -> float:
-    """Calculate total agent run minutes for the current month for a user."""
-    result = await Cache.get(f"monthly_usage:{user_id}")
-    if result:
-        return result
+    """Get the total usage cost for the current month for a user.
 
+    Reads the materialized aggregate maintained by ThreadManager.add_message and
+    only falls back to the full usage scan to seed it. Aggregates older than
+    monthly_usage.RECONCILE_INTERVAL_SECONDS are reconciled in the background.
+    """
+    try:
+        usage = await monthly_usage.get_usage(user_id)
+        if usage is not None:
+            if await monthly_usage.needs_reconcile(user_id):
+                asyncio.create_task(_reconcile_in_background(client, user_id))
+            return usage
+    except Exception as e:
+        logger.warning(f"Failed to read monthly usage aggregate for user {user_id}, scanning usage logs: {str(e)}")
+
+    total_cost = await scan_monthly_usage(client, user_id)
+    try:
+        await monthly_usage.seed_usage(user_id, total_cost)
+    except Exception as e:
+        logger.warning(f"Failed to seed monthly usage aggregate for user {user_id}: {str(e)}")
+    return total_cost
+
+
+async def scan_monthly_usage(client, user_id: str) -> float:
+    """Sum the usage cost for the current month from every usage log entry.
+
+    This pages through all assistant_response_end messages of the month, so it
+    should only be used to seed or audit the materialized aggregate.
+    """
     start_time = time.time()
     
     # Use get_usage_logs to fetch all usage data (it already handles the date filtering and batching)
@@ -408,11 +586,34 @@ async def calculate_monthly_usage(client, user_id: str) -> float:
     end_time = time.time()
     execution_time = end_time - start_time
     logger.debug(f"Calculate monthly usage took {execution_time:.3f} seconds, total cost: {total_cost}")
-    
-    await Cache.set(f"monthly_usage:{user_id}", total_cost, ttl=5)
     return total_cost
 
 
+async def reconcile_monthly_usage(client, user_id: str) -> float:
+    """Rebuild the monthly usage aggregate from a full scan.
+
+    Responses recorded while the scan is running may be dropped from the
+    aggregate until the next reconciliation.
+
+    Returns:
+        float: The scanned total for the current month
+    """
+    previous = await monthly_usage.get_usage(user_id)
+    total_cost = await scan_monthly_usage(client, user_id)
+    await monthly_usage.seed_usage(user_id, total_cost, overwrite=True)
+    if previous is not None and abs(previous - total_cost) > 0.01:
+        logger.warning(f"Monthly usage aggregate for user {user_id} drifted: {previous:.4f} -> {total_cost:.4f}")
+    return total_cost
+
+
+async def _reconcile_in_background(client, user_id: str):
+    try:
+        if await monthly_usage.acquire_reconcile_lock(user_id):
+            await reconcile_monthly_usage(client, user_id)
+    except Exception as e:
+        logger.error(f"Error reconciling monthly usage for user {user_id}: {str(e)}")
+
+
 async def get_usage_logs(client, user_id: str, page: int = 0, items_per_page: int = 1000) -> Dict:
     """Get detailed usage logs for a user with pagination, including credit usage info."""
     logger.debug(f"[USAGE_LOGS] Starting get_usage_logs for user_id={user_id}, page={page}, items_per_page={items_per_page}")
@@ -628,7 +829,9 @@ async def get_usage_logs(client, user_id: str, page: int = 0, items_per_page: in
                     estimated_cost = calculate_token_cost(
                         prompt_tokens,
                         completion_tokens,
-                        model
+                        model,
+                        cache_read_tokens=usage.get('cache_read_input_tokens', 0),
+                        cache_creation_tokens=usage.get('cache_creation_input_tokens', 0)
                     )
                 except Exception as cost_error:
                     logger.warning(f"[USAGE_LOGS] user_id={user_id} - Error calculating cost for message {message_id}: {str(cost_error)}")
@@ -665,7 +868,9 @@ async def get_usage_logs(client, user_id: str, page: int = 0, items_per_page: in
                     'content': {
                         'usage': {
                             'prompt_tokens': int(prompt_tokens),
-                            'completion_tokens': int(completion_tokens)
+                            'completion_tokens': int(completion_tokens),
+                            'cache_read_input_tokens': int(usage.get('cache_read_input_tokens') or 0),
+                            'cache_creation_input_tokens': int(usage.get('cache_creation_input_tokens') or 0)
                         },
                         'model': str(model)
                     },
@@ -728,80 +933,74 @@ async def get_usage_logs(client, user_id: str, page: int = 0, items_per_page: in
         raise
 
 
-def calculate_token_cost(prompt_tokens: int, completion_tokens: int, model: str) -> float:
-    """Calculate the cost for tokens using the same logic as the monthly usage calculation."""
+def calculate_token_cost(
+    prompt_tokens: int,
+    completion_tokens: int,
+    model: str,
+    cache_read_tokens: int = 0,
+    cache_creation_tokens: int = 0,
+) -> float:
+    """Calculate the cost for tokens using the same logic as the monthly usage calculation.
+
+    prompt_tokens is the total reported by LiteLLM, which already includes
+    cache_read_tokens. Cache reads and cache_creation_tokens are billed at the
+    model's cache prices: CACHE_READ_PRICE_MULTIPLIER and
+    CACHE_WRITE_PRICE_MULTIPLIER of the input price for Anthropic models,
+    litellm's cache prices for others, and the full input price otherwise.
+    """
     try:
         # Ensure tokens are valid integers
         prompt_tokens = int(prompt_tokens) if prompt_tokens is not None else 0
         completion_tokens = int(completion_tokens) if completion_tokens is not None else 0
+        cache_read_tokens = int(cache_read_tokens or 0)
+        cache_creation_tokens = int(cache_creation_tokens or 0)
         
-        logger.debug(f"Calculating token cost for model '{model}' with {prompt_tokens} input tokens and {completion_tokens} output tokens")
-        
-        # Try to resolve the model name using new model manager first
-        from models import model_manager
-        try:
-            resolved_model = model_manager.resolve_model_id(model)
-            logger.debug(f"Model '{model}' resolved to '{resolved_model}'")
-        except Exception as resolve_error:
-            logger.warning(f"Could not resolve model ID '{model}': {str(resolve_error)}, returning 0 cost")
+        pricing = resolve_pricing(model)
+        if pricing is None:
             return 0.0
-
-        # Check if we have hardcoded pricing for this model (try both original and resolved)
-        hardcoded_pricing = get_model_pricing(model) or get_model_pricing(resolved_model)
-        if hardcoded_pricing:
-            input_cost_per_million, output_cost_per_million = hardcoded_pricing
-            input_cost = (prompt_tokens / 1_000_000) * input_cost_per_million
-            output_cost = (completion_tokens / 1_000_000) * output_cost_per_million
-            message_cost = input_cost + output_cost
-        else:
-            # Use litellm pricing as fallback - try multiple variations
-            try:
-                models_to_try = [model]
-                
-                # Add resolved model if different
-                if resolved_model != model:
-                    models_to_try.append(resolved_model)
-                
-                # Try without provider prefix if it has one
-                if '/' in model:
-                    models_to_try.append(model.split('/', 1)[1])
-                if '/' in resolved_model and resolved_model != model:
-                    models_to_try.append(resolved_model.split('/', 1)[1])
-                    
-                # Special handling for Google models accessed via OpenRouter
-                if model.startswith('openrouter/google/'):
-                    google_model_name = model.replace('openrouter/', '')
-                    models_to_try.append(google_model_name)
-                if resolved_model.startswith('openrouter/google/'):
-                    google_model_name = resolved_model.replace('openrouter/', '')
-                    models_to_try.append(google_model_name)
-                
-                # Try each model name variation until we find one that works
-                message_cost = None
-                for model_name in models_to_try:
-                    try:
-                        prompt_token_cost, completion_token_cost = cost_per_token(model_name, prompt_tokens, completion_tokens)
-                        if prompt_token_cost is not None and completion_token_cost is not None:
-                            message_cost = prompt_token_cost + completion_token_cost
-                            break
-                    except Exception as e:
-                        logger.debug(f"Failed to get pricing for model variation {model_name}: {str(e)}")
-                        continue
-                
-                if message_cost is None:
-                    logger.debug(f"Could not get pricing for model {model} (resolved: {resolved_model}), returning 0 cost")
-                    return 0.0
-                    
-            except Exception as e:
-                logger.debug(f"Could not get pricing for model {model} (resolved: {resolved_model}): {str(e)}, returning 0 cost")
-                return 0.0
         
         # Apply the TOKEN_PRICE_MULTIPLIER
-        return message_cost * TOKEN_PRICE_MULTIPLIER
+        cost = _priced_cost(pricing, prompt_tokens, completion_tokens, cache_read_tokens, cache_creation_tokens)
+        return cost * TOKEN_PRICE_MULTIPLIER
     except Exception as e:
         logger.error(f"Error calculating token cost for model {model}: {str(e)}")
         return 0.0
 
+def calculate_token_costs(batch: Iterable[Tuple]) -> List[float]:
+    """Calculate token costs for many usage records at once.
+
+    Pricing is resolved once per distinct model and registry-priced rows are
+    costed with plain arithmetic, which keeps repricing months of usage cheap.
+
+    Args:
+        batch: (prompt_tokens, completion_tokens, model) tuples, optionally
+            followed by cache_read_tokens and cache_creation_tokens
+
+    Returns:
+        List[float]: Cost of each record, in the same order; 0.0 where it cannot be priced
+    """
+    costs = []
+    pricing_by_model: Dict[str, Optional[ResolvedPricing]] = {}
+    for prompt_tokens, completion_tokens, model, *cache_tokens in batch:
+        if model not in pricing_by_model:
+            pricing_by_model[model] = resolve_pricing(model)
+        pricing = pricing_by_model[model]
+        if pricing is None:
+            costs.append(0.0)
+            continue
+        try:
+            cost = _priced_cost(
+                pricing,
+                int(prompt_tokens or 0),
+                int(completion_tokens or 0),
+                *(int(tokens or 0) for tokens in cache_tokens[:2]),
+            )
+        except Exception as e:
+            logger.error(f"Error calculating token cost for model {model}: {str(e)}")
+            cost = 0.0
+        costs.append(cost * TOKEN_PRICE_MULTIPLIER)
+    return costs
+
 async def get_allowed_models_for_user(client, user_id: str):
     """
     Get the list of models allowed for a user based on their subscription tier.
@@ -810,34 +1009,32 @@ async def get_allowed_models_for_user(client, user_id: str):
         List of model names allowed for the user's subscription tier.
     """
 
-    result = await Cache.get(f"allowed_models_for_user:{user_id}")
-    if result:
-        return result
-
-    subscription = await get_user_subscription(user_id)
-    tier_name = 'free'
+    async def load_allowed_models():
+        subscription = await get_user_subscription(user_id)
+        tier_name = 'free'
     
-    if subscription:
-        price_id = None
-        if subscription.get('items') and subscription['items'].get('data') and len(subscription['items']['data']) > 0:
-            price_id = subscription['items']['data'][0]['price']['id']
-        else:
-            price_id = subscription.get('price_id', config.STRIPE_FREE_TIER_ID)
+        if subscription:
+            price_id = None
+            if subscription.get('items') and subscription['items'].get('data') and len(subscription['items']['data']) > 0:
+                price_id = subscription['items']['data'][0]['price']['id']
+            else:
+                price_id = subscription.get('price_id', config.STRIPE_FREE_TIER_ID)
         
-        # Get tier info for this price_id
-        tier_info = SUBSCRIPTION_TIERS.get(price_id)
-        if tier_info:
-            tier_name = tier_info['name']
+            # Get tier info for this price_id
+            tier_info = SUBSCRIPTION_TIERS.get(price_id)
+            if tier_info:
+                tier_name = tier_info['name']
     
-    # Return allowed models for this tier using model manager
-    if tier_name == 'free':
-        result = model_manager.get_models_for_tier('free')
-        result = [model.id for model in result]  # Convert to list of IDs
-    else:
-        result = model_manager.get_models_for_tier('paid')  
-        result = [model.id for model in result]  # Convert to list of IDs
-    await Cache.set(f"allowed_models_for_user:{user_id}", result, ttl=1 * 60)
-    return result
+        # Return allowed models for this tier using model manager
+        if tier_name == 'free':
+            result = model_manager.get_models_for_tier('free')
+            result = [model.id for model in result]  # Convert to list of IDs
+        else:
+            result = model_manager.get_models_for_tier('paid')  
+            result = [model.id for model in result]  # Convert to list of IDs
+        return result
+
+    return await Cache.get_or_set(f"allowed_models_for_user:{user_id}", load_allowed_models, ttl=1 * 60)
 
 
 async def can_use_model(client, user_id: str, model_name: str):
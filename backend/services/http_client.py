@@ -0,0 +1,263 @@
+"""
+Shared outbound HTTP clients for tools and integrations.
+
+One pooled httpx.AsyncClient is kept per host, so repeated calls to the same
+API reuse keep-alive connections (and HTTP/2, via the httpx[http2] extra)
+instead of paying a TCP/TLS handshake per request. HTTPClientPool also:
+
+- keeps at most max_hosts clients, closing the least recently used idle one
+  when a new host needs a client (tools call arbitrary URLs)
+- limits concurrent requests per host
+- applies default timeouts
+- retries idempotent requests on connection errors, 429 and 5xx responses
+  with exponential backoff, honouring Retry-After
+
+Use the process-wide http_pool rather than creating clients in tool methods.
+"""
+
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+from urllib.parse import urlsplit
+
+import httpx
+
+from utils.logger import logger
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 20
+DEFAULT_MAX_KEEPALIVE_PER_HOST = 10
+DEFAULT_MAX_CONCURRENCY_PER_HOST = 16
+DEFAULT_MAX_HOSTS = 64
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 0.5
+MAX_RETRY_DELAY_SECONDS = 10.0
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+_RETRY_EXCEPTIONS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    httpx.ReadTimeout,
+    httpx.ReadError,
+    httpx.RemoteProtocolError,
+)
+
+
+def host_key(url: str) -> str:
+    """Pool key of a URL: scheme and host, including the port."""
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        raise ValueError(f"Not an absolute URL: {url}")
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), MAX_RETRY_DELAY_SECONDS)
+    return min(RETRY_BACKOFF_SECONDS * (2 ** attempt), MAX_RETRY_DELAY_SECONDS)
+
+
+class HTTPClientPool:
+    """Process-wide httpx clients keyed by host."""
+
+    def __init__(
+        self,
+        timeout: httpx.Timeout = DEFAULT_TIMEOUT,
+        max_connections_per_host: int = DEFAULT_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_per_host: int = DEFAULT_MAX_KEEPALIVE_PER_HOST,
+        max_concurrency_per_host: int = DEFAULT_MAX_CONCURRENCY_PER_HOST,
+        max_hosts: int = DEFAULT_MAX_HOSTS,
+    ):
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections_per_host,
+            max_keepalive_connections=max_keepalive_per_host,
+        )
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.max_hosts = max_hosts
+        # Least recently used host first
+        self._clients: "OrderedDict[str, httpx.AsyncClient]" = OrderedDict()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        # Requests and streams in progress per host; such hosts are not evicted
+        self._in_flight: Dict[str, int] = {}
+        self._closing: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.clients_created = 0
+        self.clients_evicted = 0
+        # Clients left behind by a closed event loop, which can no longer close them
+        self.clients_abandoned = 0
+        self.requests = 0
+        self.retries = 0
+
+    def _check_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Connections and semaphores are bound to the loop that created them
+            old_loop, clients = self._loop, list(self._clients.values())
+            self._clients.clear()
+            self._semaphores.clear()
+            self._in_flight.clear()
+            self._loop = loop
+            for client in clients:
+                if old_loop is not None and old_loop.is_running() and not old_loop.is_closed():
+                    asyncio.run_coroutine_threadsafe(self._close_client(client), old_loop)
+                else:
+                    self.clients_abandoned += 1
+            if clients:
+                logger.debug(f"Event loop changed, dropped {len(clients)} pooled HTTP clients of the previous loop")
+
+    def _evict(self):
+        """Close least recently used clients without requests in progress until max_hosts remain."""
+        idle = [key for key in self._clients if not self._in_flight.get(key)]
+        for key in idle[:max(0, len(self._clients) - self.max_hosts)]:
+            client = self._clients.pop(key)
+            self._semaphores.pop(key, None)
+            self.clients_evicted += 1
+            task = asyncio.create_task(self._close_client(client))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+            logger.debug(f"Closed idle pooled HTTP client for {key}")
+
+    async def _close_client(self, client: httpx.AsyncClient):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.debug(f"Error closing pooled HTTP client: {str(e)}")
+
+    def client(self, url: str) -> httpx.AsyncClient:
+        """Return the pooled client for the host of url, creating it on first use.
+
+        The client is shared; pass per-call headers and timeouts on each
+        request instead of changing its defaults, and never close it. A client
+        may be closed once it is idle and max_hosts other hosts were used since,
+        so prefer request() and stream(), which keep it open while in use.
+        """
+        self._check_loop()
+        key = host_key(url)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, timeout=self.timeout, limits=self.limits)
+            self._clients[key] = client
+            self._semaphores.setdefault(key, asyncio.Semaphore(self.max_concurrency_per_host))
+            self.clients_created += 1
+            logger.debug(f"Opened pooled HTTP client for {key} (http2={HTTP2_AVAILABLE})")
+            if len(self._clients) > self.max_hosts:
+                self._in_flight[key] = self._in_flight.get(key, 0) + 1
+                try:
+                    self._evict()
+                finally:
+                    self._release(key)
+        else:
+            self._clients.move_to_end(key)
+        return client
+
+    def _acquire(self, url: str):
+        """Return the client and semaphore for url's host, marking a request in progress."""
+        client = self.client(url)
+        key = host_key(url)
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        return client, self._semaphores[key]
+
+    def _release(self, key: str):
+        remaining = self._in_flight.get(key, 0) - 1
+        if remaining > 0:
+            self._in_flight[key] = remaining
+        else:
+            self._in_flight.pop(key, None)
+
+    async def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> httpx.Response:
+        """Send a request on the pooled client for its host.
+
+        Args:
+            method: HTTP method
+            url: Absolute URL
+            retries: Extra attempts on connection errors, 429 and 5xx responses.
+                Defaults to DEFAULT_RETRIES for idempotent methods and 0 otherwise;
+                pass it explicitly for POST endpoints that are safe to repeat.
+            **kwargs: Passed to httpx.AsyncClient.request (headers, params, json,
+                data, timeout, follow_redirects, ...)
+
+        Returns:
+            httpx.Response: The last response; raise_for_status() is left to the caller
+        """
+        method = method.upper()
+        if retries is None:
+            retries = DEFAULT_RETRIES if method in IDEMPOTENT_METHODS else 0
+        client, semaphore = self._acquire(url)
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    async with semaphore:
+                        self.requests += 1
+                        response = await client.request(method, url, **kwargs)
+                except _RETRY_EXCEPTIONS as e:
+                    if attempt >= retries:
+                        raise
+                    delay = _retry_delay(attempt)
+                    logger.debug(f"{method} {host_key(url)} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                        return response
+                    delay = _retry_delay(attempt, response)
+                    logger.debug(f"{method} {host_key(url)} returned {response.status_code}, retrying in {delay:.1f}s")
+                    await response.aclose()
+                self.retries += 1
+                await asyncio.sleep(delay)
+        finally:
+            self._release(host_key(url))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Stream a response body on the pooled client; not retried.
+
+        The host's concurrency slot is held until the block exits.
+        """
+        client, semaphore = self._acquire(url)
+        try:
+            async with semaphore:
+                self.requests += 1
+                async with client.stream(method.upper(), url, **kwargs) as response:
+                    yield response
+        finally:
+            self._release(host_key(url))
+
+    async def close_all(self):
+        """Close every pooled client."""
+        clients, self._clients = self._clients, OrderedDict()
+        self._semaphores.clear()
+        self._in_flight.clear()
+        for client in clients.values():
+            await self._close_client(client)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hosts": len(self._clients),
+            "clients_created": self.clients_created,
+            "clients_evicted": self.clients_evicted,
+            "clients_abandoned": self.clients_abandoned,
+            "requests": self.requests,
+            "retries": self.retries,
+        }
+
+
+http_pool = HTTPClientPool()
@@ -12,6 +12,8 @@ This module provides a unified interface for making API calls to different LLM p
 
 from typing import Union, Dict, Any, Optional, AsyncGenerator, List
 import os
+import json
+import hashlib
 import litellm
 from litellm.router import Router
 from litellm.files.main import ModelResponse
@@ -140,33 +142,132 @@ def _configure_token_limits(params: Dict[str, Any], model_name: str, max_tokens:
     param_name = "max_completion_tokens" if (is_openai_o_series or is_openai_gpt5) else "max_tokens"
     params[param_name] = max_tokens
 
-def _apply_anthropic_caching(messages: List[Dict[str, Any]]) -> None:
+# Anthropic refuses to cache prefixes shorter than this many tokens
+ANTHROPIC_MIN_CACHEABLE_TOKENS = 1024
+ANTHROPIC_HAIKU_MIN_CACHEABLE_TOKENS = 2048
+# Anthropic allows at most 4 cache breakpoints per request
+MAX_CACHE_BREAKPOINTS = 4
+
+
+def _min_cacheable_tokens(model_name: str) -> int:
+    if "haiku" in model_name.lower():
+        return ANTHROPIC_HAIKU_MIN_CACHEABLE_TOKENS
+    return ANTHROPIC_MIN_CACHEABLE_TOKENS
+
+
+def _estimate_message_tokens(message: Dict[str, Any]) -> int:
+    """Cheap token estimate (~4 characters per token), good enough to place breakpoints."""
+    content = message.get("content")
+    if isinstance(content, str):
+        return len(content) // 4
+    if isinstance(content, list):
+        return sum(len(item.get("text", "")) // 4 for item in content if isinstance(item, dict))
+    return 0
+
+
+def _message_digest(message: Dict[str, Any]) -> bytes:
+    return hashlib.blake2b(json.dumps(message, sort_keys=True, default=str).encode(), digest_size=16).digest()
+
+
+def _with_cache_breakpoint(message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Copy of a message with cache_control on its last text block, or None if it has none.
+
+    The message itself is left alone, since it may be shared with the run's MessageCache.
+    """
+    content = message.get("content")
+    if isinstance(content, str):
+        if not content:
+            return None
+        return {**message, "content": [{"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}]}
+    if isinstance(content, list):
+        for i in range(len(content) - 1, -1, -1):
+            item = content[i]
+            if isinstance(item, dict) and item.get("type") == "text" and item.get("text"):
+                marked_content = list(content)
+                marked_content[i] = {**item, "cache_control": {"type": "ephemeral"}}
+                return {**message, "content": marked_content}
+    return None
+
+
+class PromptCachePlanner:
+    """Places Anthropic cache breakpoints and remembers them across calls of one run.
+
+    Breakpoints go on:
+    - the system prompt, which is identical for every call of a run
+    - the latest turn boundary, which writes the cache the next call will read
+    - the previous call's latest-turn breakpoint, if the messages up to it are
+      unchanged, so the prefix written last time is read back. If compression
+      rewrote earlier messages, the old breakpoint is dropped instead of
+      caching a prefix that can no longer match.
+
+    A breakpoint is only placed once the prefix it closes is at least the
+    model's minimum cacheable size.
+    """
+
+    def __init__(self):
+        self._previous_index: Optional[int] = None
+        self._previous_digest: Optional[bytes] = None
+        self.calls = 0
+        self.reused_breakpoints = 0
+
+    def apply(self, messages: List[Dict[str, Any]], model_name: str) -> List[int]:
+        """Mark cache breakpoints by replacing the marked entries of messages with marked copies.
+
+        Returns:
+            Indices of the messages that received a breakpoint
+        """
+        self.calls += 1
+        if not messages:
+            return []
+        min_tokens = _min_cacheable_tokens(model_name)
+
+        digests = [_message_digest(message) for message in messages]
+        prefix_tokens = []
+        total = 0
+        for message in messages:
+            total += _estimate_message_tokens(message)
+            prefix_tokens.append(total)
+
+        breakpoints = []
+        if messages[0].get("role") == "system" and prefix_tokens[0] >= min_tokens:
+            breakpoints.append(0)
+
+        previous = self._previous_index
+        if previous is not None and previous < len(messages) and previous not in breakpoints:
+            if self._prefix_digest(digests, previous) == self._previous_digest and prefix_tokens[previous] >= min_tokens:
+                breakpoints.append(previous)
+                self.reused_breakpoints += 1
+
+        # Latest turn boundary: the last message, which the next call will extend
+        latest = len(messages) - 1
+        if latest not in breakpoints and prefix_tokens[latest] >= min_tokens:
+            breakpoints.append(latest)
+
+        marked = []
+        for index in breakpoints[:MAX_CACHE_BREAKPOINTS]:
+            marked_message = _with_cache_breakpoint(messages[index])
+            if marked_message is not None:
+                messages[index] = marked_message
+                marked.append(index)
+        if marked and marked[-1] == latest:
+            self._previous_index = latest
+            self._previous_digest = self._prefix_digest(digests, latest)
+        logger.debug(f"Anthropic cache breakpoints at {marked} of {len(messages)} messages (~{total} tokens)")
+        return marked
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "reused_breakpoints": self.reused_breakpoints}
+
+    @staticmethod
+    def _prefix_digest(digests: List[bytes], index: int) -> bytes:
+        return hashlib.blake2b(b"".join(digests[:index + 1]), digest_size=16).digest()
+
+
+def _apply_anthropic_caching(messages: List[Dict[str, Any]], model_name: str, cache_planner: Optional[PromptCachePlanner] = None) -> None:
     """Apply Anthropic caching to the messages."""
+    (cache_planner or PromptCachePlanner()).apply(messages, model_name)
 
-    # Apply cache control to the first 4 text blocks across all messages
-    cache_control_count = 0
-    max_cache_control_blocks = 3
-    
-    for message in messages:
-        if cache_control_count >= max_cache_control_blocks:
-            break
-            
-        content = message.get("content")
-        
-        if isinstance(content, str):
-            message["content"] = [
-                {"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}
-            ]
-            cache_control_count += 1
-        elif isinstance(content, list):
-            for item in content:
-                if cache_control_count >= max_cache_control_blocks:
-                    break
-                if isinstance(item, dict) and item.get("type") == "text" and "cache_control" not in item:
-                    item["cache_control"] = {"type": "ephemeral"}
-                    cache_control_count += 1
-
-def _configure_anthopic(params: Dict[str, Any], model_name: str, messages: List[Dict[str, Any]]) -> None:
+def _configure_anthopic(params: Dict[str, Any], model_name: str, messages: List[Dict[str, Any]], cache_planner: Optional[PromptCachePlanner] = None) -> None:
     """Configure Anthropic-specific parameters."""
     if not ("claude" in model_name.lower() or "anthropic" in model_name.lower()):
         return
@@ -175,7 +276,7 @@ def _configure_anthopic(params: Dict[str, Any], model_name: str, messages: List[
         "anthropic-beta": "output-128k-2025-02-19"
     }
     logger.debug("Added Anthropic-specific headers")
-    _apply_anthropic_caching(messages)
+    _apply_anthropic_caching(messages, model_name, cache_planner)
 
 def _configure_openrouter(params: Dict[str, Any], model_name: str) -> None:
     """Configure OpenRouter-specific parameters."""
@@ -301,6 +402,7 @@ def prepare_params(
     model_id: Optional[str] = None,
     enable_thinking: Optional[bool] = False,
     reasoning_effort: Optional[str] = "low",
+    cache_planner: Optional[PromptCachePlanner] = None,
 ) -> Dict[str, Any]:
     from models import model_manager
     resolved_model_name = model_manager.resolve_model_id(model_name)
@@ -343,7 +445,7 @@ def prepare_params(
     # Add tools if provided
     _add_tools_config(params, tools, tool_choice)
     # Add Anthropic-specific parameters
-    _configure_anthopic(params, resolved_model_name, params["messages"])
+    _configure_anthopic(params, resolved_model_name, params["messages"], cache_planner)
     # Add OpenRouter-specific parameters
     _configure_openrouter(params, resolved_model_name)
     # Add Bedrock-specific parameters
@@ -373,6 +475,7 @@ async def make_llm_api_call(
     model_id: Optional[str] = None,
     enable_thinking: Optional[bool] = False,
     reasoning_effort: Optional[str] = "low",
+    cache_planner: Optional[PromptCachePlanner] = None,
 ) -> Union[Dict[str, Any], AsyncGenerator, ModelResponse]:
     """
     Make an API call to a language model using LiteLLM.
@@ -392,6 +495,7 @@ async def make_llm_api_call(
         model_id: Optional ARN for Bedrock inference profiles
         enable_thinking: Whether to enable thinking
         reasoning_effort: Level of reasoning effort
+        cache_planner: Keeps Anthropic cache breakpoints stable across the calls of a run
 
     Returns:
         Union[Dict[str, Any], AsyncGenerator]: API response or stream
@@ -418,6 +522,7 @@ async def make_llm_api_call(
         model_id=model_id,
         enable_thinking=enable_thinking,
         reasoning_effort=reasoning_effort,
+        cache_planner=cache_planner,
     )
     try:
         response = await provider_router.acompletion(**params)
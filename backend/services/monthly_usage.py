@@ -0,0 +1,117 @@
+"""
+Materialized monthly usage aggregate per account.
+
+Every assistant_response_end cost is added to a Redis hash keyed by account and
+UTC month, so billing checks read the month's usage in O(1) instead of paging
+through every usage message. The hash is seeded and periodically reconciled
+from the full usage scan in services.billing, which remains the source of truth.
+
+Hash fields:
+    cost: Total estimated cost in dollars for the month
+    count: Number of responses added since the last seed/reconciliation
+    reconciled_at: Unix time of the last seed/reconciliation
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from services import redis
+from utils.logger import logger
+
+# Keep last month's aggregate around for end-of-month audits
+USAGE_KEY_TTL = 3600 * 24 * 62
+# How stale an aggregate may get before a reconciliation is scheduled
+RECONCILE_INTERVAL_SECONDS = 3600
+RECONCILE_LOCK_TTL = 300
+
+# Only add to aggregates that were seeded from a full scan; a partial counter
+# would otherwise under-report usage until the next reconciliation.
+_INCREMENT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local total = redis.call('HINCRBYFLOAT', KEYS[1], 'cost', ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'count', 1)
+return total
+"""
+
+_SEED_SCRIPT = """
+if ARGV[3] == '0' and redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'cost', ARGV[1], 'count', 0, 'reconciled_at', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+def month_of(when: Optional[datetime] = None) -> str:
+    """Return the UTC month bucket ("YYYY-MM") of a timestamp, defaulting to now."""
+    when = when or datetime.now(timezone.utc)
+    return when.astimezone(timezone.utc).strftime("%Y-%m")
+
+
+def usage_key(account_id: str, month: Optional[str] = None) -> str:
+    """Redis key of the usage aggregate for an account and month."""
+    return f"monthly_usage:{account_id}:{month or month_of()}"
+
+
+async def increment_usage(account_id: str, cost: float, when: Optional[datetime] = None) -> Optional[float]:
+    """Atomically add a response cost to the account's aggregate for its month.
+
+    Args:
+        account_id: Account the usage is billed to
+        cost: Estimated cost in dollars
+        when: Time the usage was recorded, defaults to now
+
+    Returns:
+        The new monthly total, or None if the aggregate has not been seeded yet
+    """
+    redis_client = await redis.get_client()
+    total = await redis_client.eval(_INCREMENT_SCRIPT, 1, usage_key(account_id, month_of(when)), repr(float(cost)))
+    return float(total) if total is not None else None
+
+
+async def get_usage(account_id: str) -> Optional[float]:
+    """Return the current month's usage, or None if it is not materialized."""
+    cost = await redis.hget(usage_key(account_id), "cost")
+    return float(cost) if cost is not None else None
+
+
+async def seed_usage(account_id: str, total_cost: float, overwrite: bool = False, month: Optional[str] = None) -> bool:
+    """Store a total computed by a full scan.
+
+    Args:
+        account_id: Account the usage is billed to
+        total_cost: Month total in dollars from the usage scan
+        overwrite: Replace an existing aggregate (reconciliation) instead of
+            only creating a missing one
+        month: Month bucket, defaults to the current month
+
+    Returns:
+        True if the aggregate was written
+    """
+    redis_client = await redis.get_client()
+    written = await redis_client.eval(
+        _SEED_SCRIPT, 1, usage_key(account_id, month),
+        repr(float(total_cost)), int(time.time()), 1 if overwrite else 0, USAGE_KEY_TTL,
+    )
+    return bool(written)
+
+
+async def needs_reconcile(account_id: str) -> bool:
+    """Whether the aggregate is older than RECONCILE_INTERVAL_SECONDS."""
+    reconciled_at = await redis.hget(usage_key(account_id), "reconciled_at")
+    if reconciled_at is None:
+        return False
+    return time.time() - float(reconciled_at) >= RECONCILE_INTERVAL_SECONDS
+
+
+async def acquire_reconcile_lock(account_id: str) -> bool:
+    """Make sure only one process reconciles an account at a time."""
+    try:
+        return bool(await redis.set(f"{usage_key(account_id)}:reconcile_lock", "1", ex=RECONCILE_LOCK_TTL, nx=True))
+    except Exception as e:
+        logger.warning(f"Failed to acquire usage reconcile lock for {account_id}: {str(e)}")
+        return False
@@ -0,0 +1,233 @@
+"""
+Process-wide Redis pub/sub multiplexer.
+
+All local subscribers share one pubsub connection and one listener task.
+Subscriptions are reference-counted: the hub sends SUBSCRIBE/PSUBSCRIBE when
+the first local subscriber of a channel (or pattern) arrives and
+UNSUBSCRIBE/PUNSUBSCRIBE when the last one leaves. Incoming messages are routed
+by channel name to bounded per-subscriber queues, so a channel covered by a
+pattern subscription still reaches only the subscribers registered for it.
+
+Queues carry (channel, data, received_at) tuples; read them with
+PubSubHub.receive() so fan-out lag is recorded. A full queue drops the message,
+so subscribers should treat messages as wake-up notifications and keep the
+actual data elsewhere (e.g. a Redis stream).
+
+Use the process-wide pubsub_hub rather than creating pubsub objects per request.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from services import redis
+from utils.logger import logger
+
+DEFAULT_QUEUE_SIZE = 256
+GET_MESSAGE_TIMEOUT_SECONDS = 1.0
+MAX_RECONNECT_DELAY_SECONDS = 10.0
+
+HubMessage = Tuple[str, str, float]
+
+
+class PubSubHub:
+    """Shares one Redis pubsub connection between every subscriber in the process."""
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._queues: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        # Subscription key -> number of local subscribers relying on it
+        self._channel_refs: Dict[str, int] = {}
+        self._pattern_refs: Dict[str, int] = {}
+        self.messages_received = 0
+        self.messages_delivered = 0
+        self.messages_dropped = 0
+        self.reconnects = 0
+        self.lag_samples = 0
+        self.total_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    async def subscribe(self, channel: str, pattern: Optional[str] = None) -> asyncio.Queue:
+        """Register a local subscriber for channel and return its queue.
+
+        Args:
+            channel: Channel whose messages are delivered to the queue
+            pattern: Optional glob pattern covering channel; when given, the
+                hub shares one PSUBSCRIBE between all channels it matches
+                instead of subscribing to channel itself
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        async with self._lock:
+            refs = self._pattern_refs if pattern else self._channel_refs
+            key = pattern or channel
+            if refs.get(key, 0) == 0:
+                await self._ensure_connected()
+                if pattern:
+                    await self._pubsub.psubscribe(pattern)
+                else:
+                    await self._pubsub.subscribe(channel)
+            refs[key] = refs.get(key, 0) + 1
+            self._queues[channel].add(queue)
+        return queue
+
+    async def unsubscribe(self, channel: str, queue: asyncio.Queue, pattern: Optional[str] = None):
+        """Remove a subscriber registered with subscribe()."""
+        async with self._lock:
+            queues = self._queues.get(channel)
+            if queues is None or queue not in queues:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self._queues[channel]
+
+            refs = self._pattern_refs if pattern else self._channel_refs
+            key = pattern or channel
+            refs[key] -= 1
+            if refs[key] > 0:
+                return
+            del refs[key]
+            if self._pubsub is None:
+                return
+            try:
+                if pattern:
+                    await self._pubsub.punsubscribe(pattern)
+                else:
+                    await self._pubsub.unsubscribe(channel)
+            except Exception as e:
+                # The listener resubscribes from the ref counts after a reconnect
+                logger.warning(f"Failed to unsubscribe from {key}: {e}")
+
+            if not self._channel_refs and not self._pattern_refs:
+                await self._disconnect()
+
+    async def receive(self, queue: asyncio.Queue) -> Tuple[str, str]:
+        """Wait for the next message on a subscriber queue and return (channel, data)."""
+        channel, data, received_at = await queue.get()
+        lag_ms = (time.monotonic() - received_at) * 1000
+        self.lag_samples += 1
+        self.total_lag_ms += lag_ms
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        return channel, data
+
+    async def _ensure_connected(self):
+        if self._pubsub is None:
+            self._pubsub = await redis.create_pubsub()
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _disconnect(self):
+        listener, self._listener = self._listener, None
+        pubsub, self._pubsub = self._pubsub, None
+        if listener and not listener.done():
+            listener.cancel()
+            try:
+                await listener
+            except asyncio.CancelledError:
+                pass
+        if pubsub is not None:
+            try:
+                await pubsub.close()
+            except Exception as e:
+                logger.debug(f"Error closing shared pubsub connection: {str(e)}")
+
+    async def _listen(self):
+        reconnect_attempts = 0
+        try:
+            # Checked as well as cancellation, since a client can swallow
+            # CancelledError inside get_message
+            while self._listener is asyncio.current_task():
+                try:
+                    if self._pubsub is None or not self._pubsub.subscribed:
+                        # Nothing to read until the first SUBSCRIBE reply arrives
+                        await asyncio.sleep(0.05)
+                        continue
+                    message = await self._pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=GET_MESSAGE_TIMEOUT_SECONDS
+                    )
+                    reconnect_attempts = 0
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    reconnect_attempts += 1
+                    delay = min(2 ** reconnect_attempts, MAX_RECONNECT_DELAY_SECONDS)
+                    logger.warning(f"Shared pubsub connection failed, reconnecting in {delay}s: {e}")
+                    await asyncio.sleep(delay)
+                    await self._reconnect()
+                    continue
+
+                if message and message.get("type") in ("message", "pmessage"):
+                    self._fan_out(message)
+        except asyncio.CancelledError:
+            pass
+
+    async def _reconnect(self):
+        async with self._lock:
+            if self._listener is not asyncio.current_task():
+                # Disconnected while waiting for the lock
+                return
+            old_pubsub, self._pubsub = self._pubsub, None
+            if old_pubsub is not None:
+                try:
+                    await old_pubsub.close()
+                except Exception:
+                    pass
+            try:
+                self._pubsub = await redis.create_pubsub()
+                if self._channel_refs:
+                    await self._pubsub.subscribe(*self._channel_refs)
+                if self._pattern_refs:
+                    await self._pubsub.psubscribe(*self._pattern_refs)
+                self.reconnects += 1
+                logger.debug(f"Reconnected shared pubsub with {len(self._channel_refs)} channels and {len(self._pattern_refs)} patterns")
+            except Exception as e:
+                logger.error(f"Failed to reconnect shared pubsub: {e}")
+
+    def _fan_out(self, message: Dict[str, Any]):
+        self.messages_received += 1
+        channel = message.get("channel")
+        queues = self._queues.get(channel)
+        if not queues:
+            return
+        item: HubMessage = (channel, message.get("data"), time.monotonic())
+        for queue in queues:
+            try:
+                queue.put_nowait(item)
+                self.messages_delivered += 1
+            except asyncio.QueueFull:
+                self.messages_dropped += 1
+
+    def subscriber_count(self, channel: Optional[str] = None) -> int:
+        """Number of local subscribers of channel, or of every channel."""
+        if channel is not None:
+            return len(self._queues.get(channel, ()))
+        return sum(len(queues) for queues in self._queues.values())
+
+    async def close(self):
+        """Drop every subscription and close the shared connection."""
+        async with self._lock:
+            self._queues.clear()
+            self._channel_refs.clear()
+            self._pattern_refs.clear()
+            await self._disconnect()
+
+    def stats(self) -> Dict[str, float]:
+        """Return subscription counts, message counters and fan-out lag in milliseconds."""
+        return {
+            "channels": len(self._queues),
+            "subscribers": self.subscriber_count(),
+            "redis_channels": len(self._channel_refs),
+            "redis_patterns": len(self._pattern_refs),
+            "received": self.messages_received,
+            "delivered": self.messages_delivered,
+            "dropped": self.messages_dropped,
+            "reconnects": self.reconnects,
+            "avg_lag_ms": round(self.total_lag_ms / self.lag_samples, 2) if self.lag_samples else 0.0,
+            "max_lag_ms": round(self.max_lag_ms, 2),
+        }
+
+
+pubsub_hub = PubSubHub()
@@ -3,7 +3,7 @@ import os
 from dotenv import load_dotenv
 import asyncio
 from utils.logger import logger
-from typing import List, Any
+from typing import List, Any, Optional
 from utils.retry import retry
 
 # Redis client and connection pool
@@ -166,6 +166,32 @@ async def lrange(key: str, start: int, end: int) -> List[str]:
     return await redis_client.lrange(key, start, end)
 
 
+# Hash operations
+async def hget(key: str, field: str) -> Optional[str]:
+    """Get the value of a hash field."""
+    redis_client = await get_client()
+    return await redis_client.hget(key, field)
+
+
+# Stream operations
+async def xadd(key: str, fields: dict, maxlen: int = None, approximate: bool = True) -> str:
+    """Append an entry to a stream, optionally trimming it to maxlen entries."""
+    redis_client = await get_client()
+    return await redis_client.xadd(key, fields, maxlen=maxlen, approximate=approximate)
+
+
+async def xrange(key: str, min: str = "-", max: str = "+", count: int = None) -> List[Any]:
+    """Get a range of entries from a stream."""
+    redis_client = await get_client()
+    return await redis_client.xrange(key, min=min, max=max, count=count)
+
+
+async def xrevrange(key: str, max: str = "+", min: str = "-", count: int = None) -> List[Any]:
+    """Get a range of entries from a stream in reverse order."""
+    redis_client = await get_client()
+    return await redis_client.xrevrange(key, max=max, min=min, count=count)
+
+
 # Key management
 
 
@@ -0,0 +1,231 @@
+"""
+Leases and checkpoints that let an agent run move between workers.
+
+A worker executes a run only while it holds the run's lease, a short-lived key
+that it renews from its control loop:
+
+    agent_run_lock:{agent_run_id}       lease owner, expires after RUN_LEASE_TTL
+    agent_run:{agent_run_id}:checkpoint RunCheckpoint (JSON)
+    agent_run_checkpoints               runs with a checkpoint, scored by last save
+
+The checkpoint holds the actor arguments of the run and the AgentRunner loop
+state (iterations finished, auto-continue state, last processed message). A
+worker that shuts down saves it and hands the lease over to a resume message;
+a worker that dies simply lets its lease expire, and the orphan sweep re-sends
+every checkpointed run without a lease. The resumed run restarts the iteration
+that was in progress, so at most one iteration is paid for twice.
+"""
+
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from services import redis
+from utils.logger import logger
+
+RUN_LEASE_TTL = 60
+LEASE_RENEW_INTERVAL_SECONDS = 20
+# Minimum time between checkpoints written while a response streams
+CHECKPOINT_INTERVAL_SECONDS = 10
+CHECKPOINT_TTL = 3600 * 24
+# A run that keeps crashing its workers is failed after this many resumes
+MAX_RESUMES = 5
+ORPHAN_SWEEP_INTERVAL_SECONDS = 60
+
+CHECKPOINTED_RUNS_KEY = "agent_run_checkpoints"
+# Lease value while a resume message is waiting for a worker
+HANDOFF_OWNER = "handoff"
+
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Takes a free lease, or one handed over for this resume
+_ACQUIRE_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner and not (ARGV[3] == '1' and owner == ARGV[4]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+# Hands a held lease to the resume message, keeping it alive for one TTL
+_HANDOFF_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+@dataclass
+class RunCheckpoint:
+    """Resumable state of an agent run."""
+    agent_run_id: str
+    actor_kwargs: Dict[str, Any]
+    # Iterations finished before the one in progress
+    iteration_count: int = 0
+    # ThreadManager auto-continue state of the iteration in progress
+    continuous_state: Optional[Dict[str, Any]] = None
+    # Latest thread message when the iteration in progress started
+    last_message_id: Optional[str] = None
+    # Whether the last iteration ran to the end, tool execution included
+    iteration_finished: bool = False
+    resumes: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), default=str)
+
+    @classmethod
+    def from_json(cls, data: str) -> "RunCheckpoint":
+        return cls(**json.loads(data))
+
+
+def should_rerun_interrupted_iteration(checkpoint: Optional[RunCheckpoint], latest_message_id: Optional[str]) -> bool:
+    """Whether a resumed run must re-run its interrupted iteration although the thread ends with an assistant message.
+
+    An iteration saves its assistant message before the results of the tools
+    it calls, so a run interrupted in between looks finished while its tools
+    never ran. The message is told apart from one that ended an earlier
+    iteration by comparing it with the latest message when the interrupted
+    iteration started. The caller deletes that message before re-running, since
+    its tool calls have no results.
+    """
+    if checkpoint is None or not checkpoint.resumes or checkpoint.iteration_finished:
+        return False
+    return latest_message_id != checkpoint.last_message_id
+
+
+def lease_key(agent_run_id: str) -> str:
+    """Redis key of a run's lease (formerly its 24h run lock)."""
+    return f"agent_run_lock:{agent_run_id}"
+
+
+def checkpoint_key(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:checkpoint"
+
+
+async def acquire_lease(agent_run_id: str, owner: str, resume: bool = False) -> bool:
+    """Take the run's lease; a resume may also take a lease handed over to it."""
+    redis_client = await redis.get_client()
+    acquired = await redis_client.eval(
+        _ACQUIRE_SCRIPT, 1, lease_key(agent_run_id), owner, RUN_LEASE_TTL, "1" if resume else "0", HANDOFF_OWNER,
+    )
+    return bool(acquired)
+
+
+async def renew_lease(agent_run_id: str, owner: str) -> bool:
+    """Extend the lease by RUN_LEASE_TTL.
+
+    Returns:
+        False if owner no longer holds the lease and must stop working on the run
+    """
+    redis_client = await redis.get_client()
+    return bool(await redis_client.eval(_RENEW_SCRIPT, 1, lease_key(agent_run_id), owner, RUN_LEASE_TTL))
+
+
+async def release_lease(agent_run_id: str, owner: str):
+    redis_client = await redis.get_client()
+    await redis_client.eval(_RELEASE_SCRIPT, 1, lease_key(agent_run_id), owner)
+
+
+async def hand_off_lease(agent_run_id: str, owner: str) -> bool:
+    """Reserve the lease for a resume message, so the orphan sweep does not resume the run too.
+
+    If the message is lost, the reservation expires after RUN_LEASE_TTL and
+    the sweep takes over.
+    """
+    redis_client = await redis.get_client()
+    return bool(await redis_client.eval(
+        _HANDOFF_SCRIPT, 1, lease_key(agent_run_id), owner, HANDOFF_OWNER, RUN_LEASE_TTL,
+    ))
+
+
+async def reserve_for_resume(agent_run_id: str) -> bool:
+    """Reserve a free lease for a resume message, like hand_off_lease for orphaned runs."""
+    redis_client = await redis.get_client()
+    return bool(await redis_client.set(lease_key(agent_run_id), HANDOFF_OWNER, nx=True, ex=RUN_LEASE_TTL))
+
+
+async def save_checkpoint(checkpoint: RunCheckpoint):
+    checkpoint.updated_at = time.time()
+    redis_client = await redis.get_client()
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.set(checkpoint_key(checkpoint.agent_run_id), checkpoint.to_json(), ex=CHECKPOINT_TTL)
+    pipe.zadd(CHECKPOINTED_RUNS_KEY, {checkpoint.agent_run_id: checkpoint.updated_at})
+    await pipe.execute()
+
+
+async def load_checkpoint(agent_run_id: str) -> Optional[RunCheckpoint]:
+    data = await redis.get(checkpoint_key(agent_run_id))
+    if not data:
+        return None
+    try:
+        return RunCheckpoint.from_json(data)
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable checkpoint of agent run {agent_run_id}: {str(e)}")
+        return None
+
+
+async def clear_checkpoint(agent_run_id: str):
+    """Forget a run that reached a final status."""
+    redis_client = await redis.get_client()
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(checkpoint_key(agent_run_id))
+    pipe.zrem(CHECKPOINTED_RUNS_KEY, agent_run_id)
+    await pipe.execute()
+
+
+async def find_orphaned_runs(limit: int = 100) -> List[str]:
+    """Checkpointed runs that no worker holds a lease on, oldest checkpoint first.
+
+    Runs whose checkpoint already expired are dropped from the index.
+    """
+    redis_client = await redis.get_client()
+    # Checkpoints saved within one lease TTL may belong to a run still starting up
+    candidates = await redis_client.zrangebyscore(
+        CHECKPOINTED_RUNS_KEY, "-inf", time.time() - RUN_LEASE_TTL, start=0, num=limit,
+    )
+    if not candidates:
+        return []
+
+    pipe = redis_client.pipeline(transaction=False)
+    for agent_run_id in candidates:
+        pipe.exists(lease_key(agent_run_id))
+        pipe.exists(checkpoint_key(agent_run_id))
+    results = await pipe.execute()
+
+    orphaned, expired = [], []
+    for i, agent_run_id in enumerate(candidates):
+        has_lease, has_checkpoint = results[2 * i], results[2 * i + 1]
+        if not has_checkpoint:
+            expired.append(agent_run_id)
+        elif not has_lease:
+            orphaned.append(agent_run_id)
+    if expired:
+        await redis_client.zrem(CHECKPOINTED_RUNS_KEY, *expired)
+    return orphaned
+
+
+async def is_resumable(agent_run_id: str) -> bool:
+    """Whether a worker holds the run or it has a checkpoint to resume from."""
+    redis_client = await redis.get_client()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.exists(lease_key(agent_run_id))
+    pipe.exists(checkpoint_key(agent_run_id))
+    has_lease, has_checkpoint = await pipe.execute()
+    return bool(has_lease or has_checkpoint)
@@ -0,0 +1,547 @@
+"""
+Fair scheduling of agent runs in front of the run_agent_background actor.
+
+Agent runs are not sent to dramatiq directly. They are queued in Redis per
+flow, one flow per (account, origin), and dispatched to the actor only while
+the account and the run's LLM provider are under their concurrency quotas:
+
+    jobs                        agent_run_id -> queued job (JSON)
+    flow:<flow>                 FIFO of queued agent_run_ids of a flow
+    flows                       backlogged flows that may dispatch, scored by start tag
+    parked_account:<account>    flows blocked by the account quota, scored by start tag
+    parked_provider:<provider>  flows blocked by a provider quota, scored by start tag
+    parked_providers            providers with parked flows
+    flow_parked                 flow -> parked set holding it
+    flow_tag:<flow>             finish tag of the flow's last dispatched run
+    vtime                       virtual time (start tag of the last dispatch)
+    running                     dispatched agent_run_ids, scored by expiry
+    running_info                agent_run_id -> "<account_id>|<provider>"
+    account_running             account_id -> dispatched runs
+    account_queued              account_id -> queued runs
+    provider_running            provider -> dispatched runs
+    run_info                    agent_run_id -> account and origin, until the final status
+
+Every key starts with "{run_scheduler}:", so with Redis Cluster they share one
+hash slot. The scripts get the fixed keys through KEYS and derive the
+per-flow, per-account and per-provider keys from the same prefix.
+
+Flows are served by start-time fair queuing: whenever a slot is free, the
+eligible flow with the lowest start tag dispatches its oldest run, and its tag
+advances by 1/weight. A flow whose next run is over a quota is parked with its
+start tag until that quota frees a slot, so dispatching never rescans blocked
+flows: a released run returns its account's parked flows (at most one per
+origin), and dispatch returns as many flows parked on a provider as it has
+free slots. Interactive runs weigh more than trigger and workflow
+runs, so a bulk trigger start of one account neither starves other accounts
+nor the account's own interactive runs.
+
+Slots are released when the run's final status is written, and expire unless
+the worker heartbeats them, so a crashed worker cannot hold them forever;
+agent.utils.restore_running_agent_runs calls dispatch() periodically so that
+expired slots are reclaimed even when no run is submitted or released. A
+run resumed on another worker re-attaches to its slot, or queues for a new one
+if the slot already expired.
+"""
+
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from services import redis
+from services.active_runs import ACTIVE_RUN_TTL
+from utils.config import config
+from utils.logger import logger
+
+ORIGIN_INTERACTIVE = "interactive"
+ORIGIN_TRIGGER = "trigger"
+ORIGIN_WORKFLOW = "workflow"
+
+ORIGIN_WEIGHTS = {
+    ORIGIN_INTERACTIVE: 4.0,
+    ORIGIN_TRIGGER: 1.0,
+    ORIGIN_WORKFLOW: 1.0,
+}
+
+UNKNOWN_PROVIDER = "other"
+# Upper bound on runs dispatched by a single dispatch() call
+MAX_DISPATCH_BATCH = 100
+# An idle flow's finish tag only matters while it is ahead of the virtual time
+FLOW_TAG_TTL = 3600
+
+# Every key shares the {run_scheduler} hash tag, see the module docstring
+_PREFIX = "{run_scheduler}:"
+_KEYS = [
+    f"{_PREFIX}{name}" for name in (
+        "jobs", "flows", "vtime", "running", "running_info", "account_running",
+        "account_queued", "provider_running", "run_info", "flow_parked", "parked_providers",
+    )
+]
+
+# Every script is called with _KEYS
+_KEYS_HEADER = """
+local jobs_key, flows_key, vtime_key, running_key, running_info_key = KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5]
+local account_running_key, account_queued_key, provider_running_key = KEYS[6], KEYS[7], KEYS[8]
+local run_info_key, flow_parked_key, parked_providers_key = KEYS[9], KEYS[10], KEYS[11]
+local prefix = string.match(jobs_key, '^(.*:)')
+local function flow_queue_key(flow) return prefix .. 'flow:' .. flow end
+local function flow_tag_key(flow) return prefix .. 'flow_tag:' .. flow end
+local function parked_account_key(account_id) return prefix .. 'parked_account:' .. account_id end
+local function parked_provider_key(provider) return prefix .. 'parked_provider:' .. provider end
+
+local function unpark(flow, start_tag)
+    redis.call('ZADD', flows_key, start_tag, flow)
+    redis.call('HDEL', flow_parked_key, flow)
+end
+"""
+
+# Frees the slot of a dispatched run, or drops a run that is still queued
+_RELEASE_FUNCTION = _KEYS_HEADER + """
+local function release(run_id)
+    local info = redis.call('HGET', running_info_key, run_id)
+    if info then
+        local account_id, provider = string.match(info, '^(.*)|([^|]*)$')
+        redis.call('HDEL', running_info_key, run_id)
+        redis.call('ZREM', running_key, run_id)
+        if redis.call('HINCRBY', account_running_key, account_id, -1) <= 0 then
+            redis.call('HDEL', account_running_key, account_id)
+        end
+        if redis.call('HINCRBY', provider_running_key, provider, -1) <= 0 then
+            redis.call('HDEL', provider_running_key, provider)
+        end
+        -- The account has a free slot again; flows parked on the provider are
+        -- returned by dispatch, which knows the provider limits
+        local parked_key = parked_account_key(account_id)
+        local parked = redis.call('ZRANGE', parked_key, 0, -1, 'WITHSCORES')
+        for i = 1, #parked, 2 do
+            unpark(parked[i], parked[i + 1])
+        end
+        redis.call('DEL', parked_key)
+        return 1
+    end
+    local job = redis.call('HGET', jobs_key, run_id)
+    if job then
+        -- The id stays in its flow list and is skipped when it reaches the head
+        redis.call('HDEL', jobs_key, run_id)
+        local account_id = cjson.decode(job)['account_id']
+        if redis.call('HINCRBY', account_queued_key, account_id, -1) <= 0 then
+            redis.call('HDEL', account_queued_key, account_id)
+        end
+        return 2
+    end
+    return 0
+end
+"""
+
+_ENQUEUE_SCRIPT = _KEYS_HEADER + """
+local run_id, flow, job, account_id, max_queued, run_info = ARGV[1], ARGV[2], ARGV[3], ARGV[4], tonumber(ARGV[5]), ARGV[6]
+if redis.call('HEXISTS', jobs_key, run_id) == 1 or redis.call('HEXISTS', running_info_key, run_id) == 1 then
+    return 0
+end
+if tonumber(redis.call('HGET', account_queued_key, account_id) or '0') >= max_queued then
+    return -1
+end
+redis.call('HSET', jobs_key, run_id, job)
+redis.call('HSET', run_info_key, run_id, run_info)
+redis.call('HINCRBY', account_queued_key, account_id, 1)
+redis.call('RPUSH', flow_queue_key(flow), run_id)
+if not redis.call('ZSCORE', flows_key, flow) and redis.call('HEXISTS', flow_parked_key, flow) == 0 then
+    local vtime = tonumber(redis.call('GET', vtime_key) or '0')
+    local last_finish = tonumber(redis.call('GET', flow_tag_key(flow)) or '0')
+    redis.call('ZADD', flows_key, math.max(vtime, last_finish), flow)
+    redis.call('DEL', flow_tag_key(flow))
+end
+return 1
+"""
+
+# ARGV: now, slot expiry, account limit, default provider limit, provider
+# limits (JSON), max runs to dispatch, flow tag TTL. Returns the dispatched jobs.
+_DISPATCH_SCRIPT = _RELEASE_FUNCTION + """
+for _, run_id in ipairs(redis.call('ZRANGEBYSCORE', running_key, '-inf', ARGV[1])) do
+    release(run_id)
+end
+
+local expires_at, account_limit, default_provider_limit = tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local provider_limits = cjson.decode(ARGV[5])
+local max_dispatch, flow_tag_ttl = tonumber(ARGV[6]), ARGV[7]
+local dispatched = {}
+
+local function provider_limit(provider)
+    return tonumber(provider_limits[provider] or default_provider_limit)
+end
+
+local function running(key, field)
+    return tonumber(redis.call('HGET', key, field) or '0')
+end
+
+local function park(flow, start_tag, parked_key)
+    redis.call('ZREM', flows_key, flow)
+    redis.call('ZADD', parked_key, start_tag, flow)
+    redis.call('HSET', flow_parked_key, flow, parked_key)
+end
+
+-- Returns up to count flows parked on the provider, lowest start tag first
+local function unpark_provider(provider, count)
+    local parked_key = parked_provider_key(provider)
+    local popped = redis.call('ZPOPMIN', parked_key, count)
+    for i = 1, #popped, 2 do
+        unpark(popped[i], popped[i + 1])
+    end
+    if redis.call('EXISTS', parked_key) == 0 then
+        redis.call('SREM', parked_providers_key, provider)
+    end
+end
+
+local function head_job(flow)
+    local queue = flow_queue_key(flow)
+    while true do
+        local run_id = redis.call('LINDEX', queue, 0)
+        if not run_id then
+            return nil, nil
+        end
+        local job = redis.call('HGET', jobs_key, run_id)
+        if job then
+            return run_id, job
+        end
+        redis.call('LPOP', queue)
+    end
+end
+
+for _, provider in ipairs(redis.call('SMEMBERS', parked_providers_key)) do
+    local free = provider_limit(provider) - running(provider_running_key, provider)
+    if free > 0 then
+        unpark_provider(provider, math.min(free, max_dispatch))
+    end
+end
+
+-- Each step dispatches a run, or parks or drops a flow that cannot dispatch
+while #dispatched < max_dispatch do
+    local head = redis.call('ZRANGE', flows_key, 0, 0, 'WITHSCORES')
+    if #head == 0 then
+        break
+    end
+    local flow, start_tag = head[1], tonumber(head[2])
+    local run_id, job = head_job(flow)
+    if not run_id then
+        redis.call('ZREM', flows_key, flow)
+    else
+        local decoded = cjson.decode(job)
+        local account_id, provider = decoded['account_id'], decoded['provider']
+        if running(provider_running_key, provider) >= provider_limit(provider) then
+            park(flow, start_tag, parked_provider_key(provider))
+            redis.call('SADD', parked_providers_key, provider)
+        elseif running(account_running_key, account_id) >= account_limit then
+            park(flow, start_tag, parked_account_key(account_id))
+            -- The provider slot this flow cannot use goes to the next flow parked on the provider
+            unpark_provider(provider, 1)
+        else
+            local queue = flow_queue_key(flow)
+            redis.call('LPOP', queue)
+            redis.call('HDEL', jobs_key, run_id)
+            if redis.call('HINCRBY', account_queued_key, account_id, -1) <= 0 then
+                redis.call('HDEL', account_queued_key, account_id)
+            end
+            redis.call('HINCRBY', account_running_key, account_id, 1)
+            redis.call('HINCRBY', provider_running_key, provider, 1)
+            redis.call('HSET', running_info_key, run_id, account_id .. '|' .. provider)
+            redis.call('ZADD', running_key, expires_at, run_id)
+
+            local finish_tag = start_tag + 1 / tonumber(decoded['weight'])
+            redis.call('SET', vtime_key, tostring(start_tag))
+            if redis.call('LLEN', queue) > 0 then
+                redis.call('ZADD', flows_key, finish_tag, flow)
+            else
+                redis.call('ZREM', flows_key, flow)
+                redis.call('SET', flow_tag_key(flow), tostring(finish_tag), 'EX', flow_tag_ttl)
+            end
+            table.insert(dispatched, job)
+        end
+    end
+end
+return dispatched
+"""
+
+_RELEASE_SCRIPT = _RELEASE_FUNCTION + """
+redis.call('HDEL', run_info_key, ARGV[1])
+return release(ARGV[1])
+"""
+
+# Extends the slot of a resumed run if it has not expired yet
+_REATTACH_SCRIPT = _KEYS_HEADER + """
+if redis.call('HEXISTS', running_info_key, ARGV[1]) == 1 then
+    redis.call('ZADD', running_key, ARGV[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+class RunQueueFullError(Exception):
+    """Raised when an account already has the maximum number of queued runs."""
+    pass
+
+
+# Process-local counters for stats()
+_stats = {
+    "submitted": 0,
+    "dispatched": 0,
+    "queued": 0,
+    "rejected": 0,
+    "total_wait_ms": 0.0,
+    "max_wait_ms": 0.0,
+}
+
+
+def model_provider(model_name: Optional[str]) -> str:
+    """LLM provider a model's requests go to, used for provider quotas."""
+    if not model_name:
+        return UNKNOWN_PROVIDER
+    from models import model_manager
+    model = model_manager.get_model(model_name)
+    if model:
+        return model.provider.value
+    if "/" in model_name:
+        return model_name.split("/", 1)[0].lower()
+    return UNKNOWN_PROVIDER
+
+
+def provider_limits() -> Dict[str, int]:
+    """Per-provider overrides of AGENT_RUN_PROVIDER_CONCURRENCY ("anthropic=200,openai=100")."""
+    limits = {}
+    for item in (config.AGENT_RUN_PROVIDER_CONCURRENCY_OVERRIDES or "").split(","):
+        provider, _, limit = item.partition("=")
+        if provider.strip() and limit.strip():
+            try:
+                limits[provider.strip().lower()] = int(limit)
+            except ValueError:
+                logger.warning(f"Invalid provider concurrency override: {item}")
+    return limits
+
+
+def _flow(account_id: str, origin: str) -> str:
+    return f"{account_id}:{origin}"
+
+
+async def queued_count(account_id: str) -> int:
+    """Number of the account's runs waiting for a slot."""
+    redis_client = await redis.get_client()
+    return int(await redis_client.hget(f"{_PREFIX}account_queued", account_id) or 0)
+
+
+async def queued_runs(agent_run_ids: Iterable[str]) -> Set[str]:
+    """The given runs that are still waiting for a slot."""
+    agent_run_ids = list(agent_run_ids)
+    if not agent_run_ids:
+        return set()
+    redis_client = await redis.get_client()
+    jobs = await redis_client.hmget(f"{_PREFIX}jobs", agent_run_ids)
+    return {agent_run_id for agent_run_id, job in zip(agent_run_ids, jobs) if job is not None}
+
+
+async def admit(client, account_id: str) -> Dict[str, Any]:
+    """Admission check for trigger and workflow runs, made before the run is created.
+
+    Reuses check_agent_run_limit: an account below its parallel run limit is
+    admitted outright; at the limit, the run is admitted to wait in the queue
+    unless the account already has AGENT_RUN_MAX_QUEUED_PER_ACCOUNT queued runs.
+
+    Returns:
+        The check_agent_run_limit result with an added 'queued_count'
+
+    Raises:
+        RunQueueFullError: If the run can neither start nor be queued
+    """
+    from agent.utils import check_agent_run_limit
+
+    limit_check = await check_agent_run_limit(client, account_id)
+    limit_check['queued_count'] = 0
+    if limit_check['can_start']:
+        return limit_check
+
+    queued = await queued_count(account_id)
+    limit_check['queued_count'] = queued
+    if queued >= config.AGENT_RUN_MAX_QUEUED_PER_ACCOUNT:
+        _stats["rejected"] += 1
+        raise RunQueueFullError(
+            f"Account {account_id} has {limit_check['running_count']} running and {queued} queued agent runs"
+        )
+    return limit_check
+
+
+async def submit(
+    account_id: str,
+    agent_run_id: str,
+    origin: str = ORIGIN_INTERACTIVE,
+    **actor_kwargs,
+) -> bool:
+    """Queue an agent run and dispatch whatever the quotas allow.
+
+    Args:
+        account_id: Account the run is billed to
+        agent_run_id: ID of the agent_runs row
+        origin: ORIGIN_INTERACTIVE, ORIGIN_TRIGGER or ORIGIN_WORKFLOW; sets the weight
+        **actor_kwargs: Arguments for run_agent_background, except agent_run_id;
+            model_name selects the provider quota
+
+    Returns:
+        True if the run was dispatched right away, False if it is waiting for a slot
+
+    Raises:
+        RunQueueFullError: If the account already has the maximum number of queued runs
+    """
+    result = await _enqueue(account_id, agent_run_id, origin, actor_kwargs, config.AGENT_RUN_MAX_QUEUED_PER_ACCOUNT)
+    if result < 0:
+        _stats["rejected"] += 1
+        raise RunQueueFullError(f"Account {account_id} has too many queued agent runs")
+    _stats["submitted"] += 1
+
+    dispatched = await dispatch()
+    if agent_run_id in dispatched:
+        return True
+    _stats["queued"] += 1
+    logger.debug(f"Agent run {agent_run_id} is queued for account {account_id} ({origin})")
+    return False
+
+
+async def _enqueue(account_id: str, agent_run_id: str, origin: str, actor_kwargs: Dict[str, Any], max_queued: int) -> int:
+    job = {
+        "agent_run_id": agent_run_id,
+        "account_id": account_id,
+        "provider": model_provider(actor_kwargs.get("model_name")),
+        "weight": ORIGIN_WEIGHTS.get(origin, 1.0),
+        "enqueued_at": time.time(),
+        "kwargs": actor_kwargs,
+    }
+    run_info = json.dumps({"account_id": account_id, "origin": origin})
+    redis_client = await redis.get_client()
+    result = await redis_client.eval(
+        _ENQUEUE_SCRIPT, len(_KEYS), *_KEYS, agent_run_id, _flow(account_id, origin), json.dumps(job),
+        account_id, max_queued, run_info,
+    )
+    return int(result)
+
+
+async def submit_resume(agent_run_id: str, **actor_kwargs) -> bool:
+    """Send a run interrupted on one worker to another, inside its account and provider quotas.
+
+    The run keeps its slot if the slot has not expired yet; otherwise it is
+    queued again in its original flow, ahead of the account's queue limit.
+
+    Args:
+        agent_run_id: ID of the agent_runs row
+        **actor_kwargs: Arguments of the interrupted run_agent_background call,
+            except agent_run_id; resume=True is added
+
+    Returns:
+        True if the run was sent to the worker, False if it is waiting for a slot
+    """
+    from run_agent_background import run_agent_background
+
+    actor_kwargs["resume"] = True
+    redis_client = await redis.get_client()
+    run_info = await redis_client.hget(f"{_PREFIX}run_info", agent_run_id)
+    if run_info is None:
+        # Submitted before run_info existed; nothing to account it against
+        logger.warning(f"Scheduler has no record of agent run {agent_run_id}; resuming it outside the quotas")
+        run_agent_background.send(agent_run_id=agent_run_id, **actor_kwargs)
+        return True
+
+    if await redis_client.eval(_REATTACH_SCRIPT, len(_KEYS), *_KEYS, agent_run_id, time.time() + ACTIVE_RUN_TTL):
+        run_agent_background.send(agent_run_id=agent_run_id, **actor_kwargs)
+        return True
+
+    info = json.loads(run_info)
+    # A run resumed through the queue must not be rejected by the queue limit
+    await _enqueue(info["account_id"], agent_run_id, info["origin"], actor_kwargs, 2 ** 31)
+    dispatched = await dispatch()
+    if agent_run_id in dispatched:
+        return True
+    logger.debug(f"Resumed agent run {agent_run_id} is queued for a new slot")
+    return False
+
+
+async def dispatch() -> List[str]:
+    """Send every run the quotas allow to the worker, in fair order.
+
+    Returns:
+        IDs of the dispatched agent runs
+    """
+    from run_agent_background import run_agent_background
+
+    redis_client = await redis.get_client()
+    now = time.time()
+    jobs = await redis_client.eval(
+        _DISPATCH_SCRIPT, len(_KEYS), *_KEYS, now, now + ACTIVE_RUN_TTL, config.MAX_PARALLEL_AGENT_RUNS,
+        config.AGENT_RUN_PROVIDER_CONCURRENCY, json.dumps(provider_limits()), MAX_DISPATCH_BATCH, FLOW_TAG_TTL,
+    )
+
+    dispatched = []
+    for job_json in jobs:
+        job = json.loads(job_json)
+        wait_ms = max(0.0, (now - job["enqueued_at"]) * 1000)
+        _stats["dispatched"] += 1
+        _stats["total_wait_ms"] += wait_ms
+        _stats["max_wait_ms"] = max(_stats["max_wait_ms"], wait_ms)
+        try:
+            run_agent_background.send(agent_run_id=job["agent_run_id"], **job["kwargs"])
+        except Exception as e:
+            logger.error(f"Failed to send agent run {job['agent_run_id']} to the worker: {str(e)}")
+            await release(job["agent_run_id"], dispatch_next=False)
+            continue
+        if wait_ms >= 1000:
+            logger.debug(f"Dispatched agent run {job['agent_run_id']} after waiting {wait_ms:.0f}ms")
+        dispatched.append(job["agent_run_id"])
+    return dispatched
+
+
+async def release(agent_run_id: str, dispatch_next: bool = True) -> bool:
+    """Free the slot of a finished run, or drop it from the queue if it never started.
+
+    Called when the run's final status is written; dispatches waiting runs
+    into the freed slot unless dispatch_next is False.
+
+    Returns:
+        False if the scheduler did not know the run
+    """
+    redis_client = await redis.get_client()
+    released = await redis_client.eval(_RELEASE_SCRIPT, len(_KEYS), *_KEYS, agent_run_id)
+    if released and dispatch_next:
+        await dispatch()
+    return bool(released)
+
+
+async def heartbeat(agent_run_id: str):
+    """Keep a dispatched run's slot from expiring; called periodically by the worker."""
+    redis_client = await redis.get_client()
+    await redis_client.zadd(f"{_PREFIX}running", {agent_run_id: time.time() + ACTIVE_RUN_TTL}, xx=True)
+
+
+async def queue_stats() -> Dict[str, Any]:
+    """Queue depth and slot usage across all processes."""
+    redis_client = await redis.get_client()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hlen(f"{_PREFIX}jobs")
+    pipe.zcard(f"{_PREFIX}flows")
+    pipe.hlen(f"{_PREFIX}flow_parked")
+    pipe.zcard(f"{_PREFIX}running")
+    pipe.hgetall(f"{_PREFIX}provider_running")
+    queued, eligible_flows, parked_flows, running, provider_running = await pipe.execute()
+    return {
+        "queued": queued,
+        "backlogged_flows": eligible_flows + parked_flows,
+        "parked_flows": parked_flows,
+        "running": running,
+        "provider_running": {provider: int(count) for provider, count in provider_running.items()},
+    }
+
+
+def stats() -> Dict[str, float]:
+    """Return this process's submission counters and queue wait time in milliseconds."""
+    dispatched = _stats["dispatched"]
+    return {
+        "submitted": _stats["submitted"],
+        "dispatched": dispatched,
+        "queued": _stats["queued"],
+        "rejected": _stats["rejected"],
+        "avg_wait_ms": round(_stats["total_wait_ms"] / dispatched, 2) if dispatched else 0.0,
+        "max_wait_ms": round(_stats["max_wait_ms"], 2),
+    }
@@ -0,0 +1,362 @@
+"""
+Redis Streams transport for agent run responses.
+
+The background worker appends every response of an agent run to a per-run
+stream with XADD (trimmed with MAXLEN), and SSE viewers read it back by entry
+ID. Entry IDs double as SSE event IDs, so a reconnecting client resumes from
+its Last-Event-ID instead of re-reading the whole run.
+
+Every append also publishes a wake-up notification on the run's notify
+channel. Within an API process, all viewers of the same run share one
+RunStreamConsumer, which waits for those notifications through the
+process-wide pubsub_hub (one pattern subscription for all runs), reads the new
+entries with a non-blocking XRANGE and fans them out to per-viewer queues.
+"""
+
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from services import redis
+from services.pubsub_hub import pubsub_hub
+from utils.logger import logger
+
+# Approximate cap on entries kept per run; long runs produce 10k+ chunks
+STREAM_MAXLEN = 50000
+XREAD_COUNT = 500
+# Consumers re-read the stream this often without a notification, which
+# covers notifications lost while the shared pubsub connection reconnects
+IDLE_POLL_SECONDS = 5.0
+NOTIFY_PATTERN = "agent_run:*:new"
+
+# Write-behind defaults for RunResponseWriter
+FLUSH_INTERVAL_MS = 50
+FLUSH_BATCH_SIZE = 100
+MAX_PENDING_ENTRIES = 5000
+
+DATA_FIELD = "data"
+CONTROL_FIELD = "control"
+
+TERMINAL_STATUSES = frozenset({"completed", "failed", "stopped"})
+# How json.dumps renders the discriminator of status responses; quotes inside
+# string values are escaped, so chunk content cannot contain this sequence
+_STATUS_TYPE_MARKER = '"type": "status"'
+
+StreamEntry = Tuple[str, Dict[str, str]]
+
+
+def stream_key(agent_run_id: str) -> str:
+    """Redis key of the response stream for an agent run."""
+    return f"agent_run:{agent_run_id}:stream"
+
+
+def notify_channel(agent_run_id: str) -> str:
+    """Pub/sub channel notified whenever entries are appended to a run's stream."""
+    return f"agent_run:{agent_run_id}:new"
+
+
+def parse_entry_id(entry_id: str) -> Tuple[int, int]:
+    """Parse a stream entry ID ("<ms>-<seq>") into a comparable tuple."""
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def response_status(response_json: str) -> Optional[str]:
+    """Return the status of a stored status response, or None for any other response.
+
+    Only responses that contain the status marker are parsed, so the SSE path
+    can forward the thousands of content chunks of a run without decoding them.
+    """
+    if _STATUS_TYPE_MARKER not in response_json:
+        return None
+    try:
+        response = json.loads(response_json)
+    except ValueError:
+        return None
+    if isinstance(response, dict) and response.get("type") == "status":
+        return response.get("status")
+    return None
+
+
+class RunResponseStream:
+    """Append-only response log of a single agent run."""
+
+    def __init__(self, agent_run_id: str, maxlen: int = STREAM_MAXLEN):
+        self.agent_run_id = agent_run_id
+        self.key = stream_key(agent_run_id)
+        self.notify_channel = notify_channel(agent_run_id)
+        self.maxlen = maxlen
+
+    async def _append_entries(self, entries: List[Dict[str, str]]) -> List[str]:
+        """XADD entries and notify viewers in one pipelined round trip."""
+        redis_client = await redis.get_client()
+        pipe = redis_client.pipeline(transaction=False)
+        for fields in entries:
+            pipe.xadd(self.key, fields, maxlen=self.maxlen, approximate=True)
+        pipe.publish(self.notify_channel, "1")
+        results = await pipe.execute()
+        return results[:-1]
+
+    async def append(self, response_json: str) -> str:
+        """Append a JSON-encoded response and return its entry ID."""
+        return (await self._append_entries([{DATA_FIELD: response_json}]))[0]
+
+    async def append_many(self, responses_json: List[str]) -> List[str]:
+        """Append several JSON-encoded responses in one pipelined round trip."""
+        return await self._append_entries([{DATA_FIELD: response_json} for response_json in responses_json])
+
+    async def append_control(self, signal: str) -> str:
+        """Append a control signal (STOP, END_STREAM, ERROR) for viewers."""
+        return (await self._append_entries([{CONTROL_FIELD: signal}]))[0]
+
+    async def read(self, after_id: Optional[str] = None, count: Optional[int] = None) -> List[StreamEntry]:
+        """Read entries strictly after after_id, or from the start of the stream."""
+        entries = await redis.xrange(self.key, min=after_id or "-", count=count)
+        if after_id:
+            entries = [entry for entry in entries if entry[0] != after_id]
+        return entries
+
+    async def read_responses(self) -> List[str]:
+        """Read every stored JSON response, skipping control entries."""
+        return [fields[DATA_FIELD] for _, fields in await self.read() if DATA_FIELD in fields]
+
+    async def expire(self, seconds: int):
+        await redis.expire(self.key, seconds)
+
+    async def delete(self):
+        await redis.delete(self.key)
+
+
+class RunResponseWriter:
+    """Write-behind buffer that coalesces a run's responses into pipelined XADD batches.
+
+    Responses are flushed every flush_interval_ms or as soon as flush_batch_size
+    are buffered. A full buffer makes write() wait for the flush, which applies
+    backpressure to the producer instead of piling up in-flight Redis commands.
+    Flushes are serialized, so entries keep the order they were written in;
+    a failed batch is retried on the next flush until max_pending_entries
+    responses are waiting.
+    """
+
+    def __init__(
+        self,
+        stream: RunResponseStream,
+        flush_interval_ms: int = FLUSH_INTERVAL_MS,
+        flush_batch_size: int = FLUSH_BATCH_SIZE,
+        max_pending_entries: int = MAX_PENDING_ENTRIES,
+    ):
+        self.stream = stream
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_batch_size = flush_batch_size
+        self.max_pending_entries = max_pending_entries
+        self._buffer: List[str] = []
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        # Set by close() to end the flusher's wait without cancelling a write
+        self._wake = asyncio.Event()
+        self._closed = False
+        self.flush_count = 0
+        self.entries_written = 0
+        self.total_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def write(self, response_json: str):
+        """Buffer a JSON-encoded response, flushing if the batch is full."""
+        if self._closed:
+            raise RuntimeError(f"Response writer for agent run {self.stream.agent_run_id} is closed")
+        self._buffer.append(response_json)
+        if len(self._buffer) >= self.flush_batch_size:
+            try:
+                await self.flush()
+            except Exception as e:
+                if len(self._buffer) >= self.max_pending_entries:
+                    raise
+                logger.warning(f"Failed to flush responses for agent run {self.stream.agent_run_id}, {len(self._buffer)} pending: {e}")
+
+    async def flush(self):
+        """Write all buffered responses to the stream."""
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+            start = time.monotonic()
+            try:
+                await self.stream.append_many(batch)
+            except BaseException:
+                # Keep the batch at the front of the buffer so order is preserved
+                # on retry, also when the write is cancelled
+                self._buffer = batch + self._buffer
+                raise
+            elapsed_ms = (time.monotonic() - start) * 1000
+            self.flush_count += 1
+            self.entries_written += len(batch)
+            self.total_flush_ms += elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+
+    async def _flush_periodically(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._closed:
+                return
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Failed to flush responses for agent run {self.stream.agent_run_id}: {e}")
+
+    async def close(self):
+        """Stop the periodic flusher and write anything still buffered.
+
+        A flush in progress is awaited rather than cancelled, so its batch is
+        written before the final flush.
+        """
+        self._closed = True
+        self._wake.set()
+        if self._flusher:
+            await self._flusher
+        await self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        """Return flush counters and latency in milliseconds."""
+        return {
+            "flushes": self.flush_count,
+            "entries": self.entries_written,
+            "pending": len(self._buffer),
+            "avg_flush_ms": round(self.total_flush_ms / self.flush_count, 2) if self.flush_count else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+
+class RunStreamConsumer:
+    """Single reader of one run's stream, shared by every local viewer."""
+
+    def __init__(self, agent_run_id: str):
+        self.agent_run_id = agent_run_id
+        self.key = stream_key(agent_run_id)
+        self.channel = notify_channel(agent_run_id)
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.last_id: Optional[str] = None
+        self._notifications: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Listen for notifications, pin the read position to the end of the stream and start reading.
+
+        Subscribing before pinning means an entry appended in between is
+        either after last_id or announced by a later notification.
+        """
+        self._notifications = await pubsub_hub.subscribe(self.channel, pattern=NOTIFY_PATTERN)
+        try:
+            latest = await redis.xrevrange(self.key, count=1)
+        except Exception:
+            await pubsub_hub.unsubscribe(self.channel, self._notifications, pattern=NOTIFY_PATTERN)
+            raise
+        self.last_id = latest[0][0] if latest else "0-0"
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while self.subscribers:
+                try:
+                    await asyncio.wait_for(pubsub_hub.receive(self._notifications), timeout=IDLE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                # One read covers every notification queued so far
+                while not self._notifications.empty():
+                    self._notifications.get_nowait()
+
+                try:
+                    await self._read_new_entries()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"XRANGE failed for agent run {self.agent_run_id}: {e}")
+                    await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Stream consumer for agent run {self.agent_run_id} failed: {e}", exc_info=True)
+            for queue in self.subscribers:
+                queue.put_nowait(None)
+        finally:
+            await pubsub_hub.unsubscribe(self.channel, self._notifications, pattern=NOTIFY_PATTERN)
+
+    async def _read_new_entries(self):
+        while True:
+            entries = await redis.xrange(self.key, min=self.last_id, count=XREAD_COUNT)
+            has_more = len(entries) == XREAD_COUNT
+            for entry in entries:
+                if entry[0] == self.last_id:
+                    continue
+                # No await between advancing last_id and fan-out, so a viewer
+                # that subscribes concurrently either gets the entry here or
+                # finds it in its own backlog read.
+                self.last_id = entry[0]
+                for queue in self.subscribers:
+                    queue.put_nowait(entry)
+            if not has_more:
+                return
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def stop(self):
+        if self.running:
+            self._task.cancel()
+
+
+class RunStreamHub:
+    """Registry of shared per-run consumers for this process."""
+
+    def __init__(self):
+        self._consumers: Dict[str, RunStreamConsumer] = {}
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, agent_run_id: str) -> asyncio.Queue:
+        """Register a viewer and return the queue that receives new entries.
+
+        A None item on the queue means the shared consumer failed.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        async with self._lock:
+            consumer = self._consumers.get(agent_run_id)
+            if consumer is None or not consumer.running:
+                consumer = RunStreamConsumer(agent_run_id)
+                consumer.subscribers.add(queue)
+                await consumer.start()
+                self._consumers[agent_run_id] = consumer
+            else:
+                consumer.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, agent_run_id: str, queue: asyncio.Queue):
+        consumer = self._consumers.get(agent_run_id)
+        if consumer is None:
+            return
+        consumer.subscribers.discard(queue)
+        if not consumer.subscribers:
+            consumer.stop()
+            del self._consumers[agent_run_id]
+
+    def viewer_count(self, agent_run_id: str) -> int:
+        consumer = self._consumers.get(agent_run_id)
+        return len(consumer.subscribers) if consumer else 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return local run and viewer counts with the shared pubsub hub's metrics."""
+        return {
+            "runs": len(self._consumers),
+            "viewers": sum(len(consumer.subscribers) for consumer in self._consumers.values()),
+            **pubsub_hub.stats(),
+        }
+
+
+hub = RunStreamHub()
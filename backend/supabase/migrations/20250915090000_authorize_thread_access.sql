@@ -0,0 +1,54 @@
+BEGIN;
+
+-- Resolves a thread access decision in one round trip instead of querying
+-- threads, projects and basejump.account_user separately.
+-- Returns one of: 'not_found', 'owner', 'public', 'member', 'denied'.
+CREATE OR REPLACE FUNCTION public.authorize_thread_access(p_thread_id uuid, p_user_id uuid)
+RETURNS json
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_account_id uuid;
+    v_project_id uuid;
+    v_access text;
+BEGIN
+    SELECT t.account_id, t.project_id INTO v_account_id, v_project_id
+    FROM threads t
+    WHERE t.thread_id = p_thread_id;
+
+    IF NOT FOUND THEN
+        RETURN json_build_object('access', 'not_found');
+    END IF;
+
+    IF v_account_id = p_user_id THEN
+        v_access := 'owner';
+    ELSIF v_project_id IS NOT NULL AND EXISTS (
+        SELECT 1 FROM projects p WHERE p.project_id = v_project_id AND p.is_public = TRUE
+    ) THEN
+        v_access := 'public';
+    ELSIF v_account_id IS NOT NULL AND EXISTS (
+        SELECT 1 FROM basejump.account_user au WHERE au.account_id = v_account_id AND au.user_id = p_user_id
+    ) THEN
+        v_access := 'member';
+    ELSE
+        v_access := 'denied';
+    END IF;
+
+    RETURN json_build_object(
+        'access', v_access,
+        'account_id', v_account_id,
+        'project_id', v_project_id
+    );
+END;
+$$;
+
+-- Takes an arbitrary user id, so it must only be callable by the backend
+REVOKE EXECUTE ON FUNCTION public.authorize_thread_access(uuid, uuid) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.authorize_thread_access(uuid, uuid) TO service_role;
+
+COMMENT ON FUNCTION public.authorize_thread_access(uuid, uuid) IS 'Resolves whether a user can access a thread (owner, public project or account member). Used by the backend authorization cache.';
+
+COMMIT;
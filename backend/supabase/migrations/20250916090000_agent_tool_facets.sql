@@ -0,0 +1,114 @@
+BEGIN;
+
+-- Denormalized tool facets of each agent's current version, so agent listing
+-- can filter and sort on them in the database instead of loading every
+-- agent and version into the API.
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS has_mcp_tools BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS has_agentpress_tools BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS tools_count INTEGER NOT NULL DEFAULT 0;
+-- 'mcp:<name>' for configured MCPs and 'agentpress:<tool>' for enabled tools
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS tool_names TEXT[] NOT NULL DEFAULT '{}';
+
+-- Mirrors extract_agent_config: configured MCPs come from config.tools.mcp and
+-- an agentpress tool counts when its value is true or {"enabled": true}.
+-- Agents without a current version get empty facets.
+CREATE OR REPLACE FUNCTION public.agent_tool_facets(p_config JSONB)
+RETURNS TABLE (has_mcp_tools BOOLEAN, has_agentpress_tools BOOLEAN, tools_count INTEGER, tool_names TEXT[])
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    WITH mcps AS (
+        SELECT value AS mcp
+        FROM jsonb_array_elements(
+            CASE WHEN jsonb_typeof(p_config->'tools'->'mcp') = 'array' THEN p_config->'tools'->'mcp' ELSE '[]'::jsonb END
+        )
+    ),
+    agentpress AS (
+        SELECT key AS tool_name
+        FROM jsonb_each(
+            CASE WHEN jsonb_typeof(p_config->'tools'->'agentpress') = 'object' THEN p_config->'tools'->'agentpress' ELSE '{}'::jsonb END
+        )
+        WHERE value = 'true'::jsonb OR (jsonb_typeof(value) = 'object' AND value->'enabled' = 'true'::jsonb)
+    )
+    SELECT
+        (SELECT count(*) FROM mcps) > 0,
+        (SELECT count(*) FROM agentpress) > 0,
+        ((SELECT count(*) FROM mcps) + (SELECT count(*) FROM agentpress))::INTEGER,
+        ARRAY(
+            SELECT 'mcp:' || (mcp->>'name') FROM mcps WHERE jsonb_typeof(mcp) = 'object' AND mcp->>'name' IS NOT NULL
+            UNION
+            SELECT 'agentpress:' || tool_name FROM agentpress
+        );
+$$;
+
+CREATE OR REPLACE FUNCTION public.set_agent_tool_facets()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_config JSONB;
+BEGIN
+    SELECT config INTO v_config FROM agent_versions WHERE version_id = NEW.current_version_id;
+
+    SELECT f.has_mcp_tools, f.has_agentpress_tools, f.tools_count, f.tool_names
+    INTO NEW.has_mcp_tools, NEW.has_agentpress_tools, NEW.tools_count, NEW.tool_names
+    FROM public.agent_tool_facets(v_config) f;
+
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trigger_agents_tool_facets ON agents;
+CREATE TRIGGER trigger_agents_tool_facets
+    BEFORE INSERT OR UPDATE OF current_version_id ON agents
+    FOR EACH ROW
+    EXECUTE FUNCTION public.set_agent_tool_facets();
+
+-- Versions are normally immutable, but keep the facets right if the config of
+-- a current version is edited in place.
+CREATE OR REPLACE FUNCTION public.refresh_agent_tool_facets_from_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE agents a
+    SET (has_mcp_tools, has_agentpress_tools, tools_count, tool_names) = (
+        SELECT f.has_mcp_tools, f.has_agentpress_tools, f.tools_count, f.tool_names
+        FROM public.agent_tool_facets(NEW.config) f
+    )
+    WHERE a.current_version_id = NEW.version_id;
+
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trigger_agent_versions_tool_facets ON agent_versions;
+CREATE TRIGGER trigger_agent_versions_tool_facets
+    AFTER UPDATE OF config ON agent_versions
+    FOR EACH ROW
+    WHEN (OLD.config IS DISTINCT FROM NEW.config)
+    EXECUTE FUNCTION public.refresh_agent_tool_facets_from_version();
+
+-- Backfill without touching updated_at
+ALTER TABLE agents DISABLE TRIGGER trigger_agents_updated_at;
+
+UPDATE agents a
+SET (has_mcp_tools, has_agentpress_tools, tools_count, tool_names) = (
+    SELECT f.has_mcp_tools, f.has_agentpress_tools, f.tools_count, f.tool_names
+    FROM public.agent_tool_facets(v.config) f
+)
+FROM agent_versions v
+WHERE v.version_id = a.current_version_id;
+
+ALTER TABLE agents ENABLE TRIGGER trigger_agents_updated_at;
+
+-- Keyset pagination indexes: each listing sort, tie-broken by agent_id
+CREATE INDEX IF NOT EXISTS idx_agents_account_created_at_keyset ON agents(account_id, created_at DESC, agent_id DESC);
+CREATE INDEX IF NOT EXISTS idx_agents_account_updated_at_keyset ON agents(account_id, updated_at DESC, agent_id DESC);
+CREATE INDEX IF NOT EXISTS idx_agents_account_name_keyset ON agents(account_id, name, agent_id);
+CREATE INDEX IF NOT EXISTS idx_agents_account_tools_count_keyset ON agents(account_id, tools_count DESC, agent_id DESC);
+CREATE INDEX IF NOT EXISTS idx_agents_tool_names ON agents USING gin(tool_names);
+
+COMMENT ON COLUMN agents.tool_names IS 'Tools of the current version (mcp:<name>, agentpress:<tool>), maintained by trigger_agents_tool_facets';
+
+COMMIT;
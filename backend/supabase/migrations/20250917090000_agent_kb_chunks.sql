@@ -0,0 +1,61 @@
+BEGIN;
+
+-- Chunks of agent knowledge base entries for retrieval: the prompt builder
+-- ranks them with BM25 (term_freqs) and optionally embeddings, and includes
+-- only the chunks relevant to the latest user message.
+CREATE TABLE IF NOT EXISTS agent_knowledge_base_chunks (
+    chunk_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    entry_id UUID NOT NULL REFERENCES agent_knowledge_base_entries(entry_id) ON DELETE CASCADE,
+    agent_id UUID NOT NULL REFERENCES agents(agent_id) ON DELETE CASCADE,
+    chunk_index INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    term_freqs JSONB NOT NULL DEFAULT '{}'::jsonb,
+    token_count INTEGER NOT NULL DEFAULT 0,
+    embedding REAL[],
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+
+    CONSTRAINT agent_kb_chunks_entry_chunk_unique UNIQUE (entry_id, chunk_index)
+);
+
+-- What each entry was last indexed from, so only changed entries are re-chunked
+CREATE TABLE IF NOT EXISTS agent_knowledge_base_index_state (
+    entry_id UUID PRIMARY KEY REFERENCES agent_knowledge_base_entries(entry_id) ON DELETE CASCADE,
+    agent_id UUID NOT NULL REFERENCES agents(agent_id) ON DELETE CASCADE,
+    entry_updated_at TIMESTAMPTZ,
+    content_hash TEXT NOT NULL,
+    embedding_model TEXT,
+    indexed_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_agent_kb_chunks_agent_id ON agent_knowledge_base_chunks(agent_id);
+CREATE INDEX IF NOT EXISTS idx_agent_kb_index_state_agent_id ON agent_knowledge_base_index_state(agent_id);
+
+ALTER TABLE agent_knowledge_base_chunks ENABLE ROW LEVEL SECURITY;
+ALTER TABLE agent_knowledge_base_index_state ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY agent_kb_chunks_user_access ON agent_knowledge_base_chunks
+    FOR ALL
+    USING (
+        EXISTS (
+            SELECT 1 FROM agents a
+            WHERE a.agent_id = agent_knowledge_base_chunks.agent_id
+            AND basejump.has_role_on_account(a.account_id) = true
+        )
+    );
+
+CREATE POLICY agent_kb_index_state_user_access ON agent_knowledge_base_index_state
+    FOR ALL
+    USING (
+        EXISTS (
+            SELECT 1 FROM agents a
+            WHERE a.agent_id = agent_knowledge_base_index_state.agent_id
+            AND basejump.has_role_on_account(a.account_id) = true
+        )
+    );
+
+GRANT ALL PRIVILEGES ON TABLE agent_knowledge_base_chunks TO authenticated, service_role;
+GRANT ALL PRIVILEGES ON TABLE agent_knowledge_base_index_state TO authenticated, service_role;
+
+COMMENT ON TABLE agent_knowledge_base_chunks IS 'Retrieval chunks of agent knowledge base entries, maintained by the backend knowledge base indexer';
+
+COMMIT;
@@ -0,0 +1,32 @@
+BEGIN;
+
+-- Content hash of each knowledge base entry, so ZIP and git imports can skip
+-- files whose content the agent already has.
+ALTER TABLE agent_knowledge_base_entries ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+CREATE OR REPLACE FUNCTION set_agent_kb_entry_content_hash()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.content_hash = encode(sha256(convert_to(NEW.content, 'UTF8')), 'hex');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_agent_kb_entries_content_hash ON agent_knowledge_base_entries;
+CREATE TRIGGER trigger_agent_kb_entries_content_hash
+    BEFORE INSERT OR UPDATE OF content ON agent_knowledge_base_entries
+    FOR EACH ROW
+    EXECUTE FUNCTION set_agent_kb_entry_content_hash();
+
+-- Backfill without touching updated_at
+ALTER TABLE agent_knowledge_base_entries DISABLE TRIGGER trigger_agent_kb_entries_updated_at;
+
+UPDATE agent_knowledge_base_entries
+SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')
+WHERE content_hash IS NULL;
+
+ALTER TABLE agent_knowledge_base_entries ENABLE TRIGGER trigger_agent_kb_entries_updated_at;
+
+CREATE INDEX IF NOT EXISTS idx_agent_kb_entries_agent_content_hash ON agent_knowledge_base_entries(agent_id, content_hash);
+
+COMMIT;
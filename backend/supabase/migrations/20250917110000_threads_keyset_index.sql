@@ -0,0 +1,6 @@
+BEGIN;
+
+-- Thread list pages by (created_at, thread_id) per account
+CREATE INDEX IF NOT EXISTS idx_threads_account_created_at_keyset ON threads(account_id, created_at DESC, thread_id DESC);
+
+COMMIT;
@@ -0,0 +1,6 @@
+BEGIN;
+
+-- Thread message pages and delta fetches by (created_at, message_id)
+CREATE INDEX IF NOT EXISTS idx_messages_thread_created_at_keyset ON messages(thread_id, created_at, message_id);
+
+COMMIT;
@@ -0,0 +1,142 @@
+BEGIN;
+
+-- extract_agent_config does not always take agentpress tools from the current
+-- version: Suna default agents use the central SUNA_CONFIG, and agents without
+-- a version fall back to the default tool set. Both live in the backend, which
+-- writes them here on startup (sync_agent_tool_defaults) so the tool facets
+-- can be computed the same way.
+CREATE TABLE IF NOT EXISTS agent_tool_defaults (
+    kind TEXT PRIMARY KEY CHECK (kind IN ('suna_default', 'no_version')),
+    agentpress_tools JSONB NOT NULL DEFAULT '{}'::jsonb,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE agent_tool_defaults ENABLE ROW LEVEL SECURITY;
+
+-- Facets of an agent as extract_agent_config sees it; p_config is the config
+-- of its current version, NULL when it has none.
+CREATE OR REPLACE FUNCTION public.agent_tool_facets_for_agent(p_metadata JSONB, p_config JSONB)
+RETURNS TABLE (has_mcp_tools BOOLEAN, has_agentpress_tools BOOLEAN, tools_count INTEGER, tool_names TEXT[])
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT f.*
+    FROM public.agent_tool_facets(
+        CASE
+            WHEN COALESCE((p_metadata->>'is_suna_default')::boolean, false) OR p_config IS NULL THEN
+                jsonb_build_object('tools', jsonb_build_object(
+                    'mcp', COALESCE(p_config->'tools'->'mcp', '[]'::jsonb),
+                    'agentpress', COALESCE(
+                        (SELECT d.agentpress_tools FROM agent_tool_defaults d
+                         WHERE d.kind = CASE WHEN COALESCE((p_metadata->>'is_suna_default')::boolean, false)
+                                             THEN 'suna_default' ELSE 'no_version' END),
+                        '{}'::jsonb
+                    )
+                ))
+            ELSE p_config
+        END
+    ) f;
+$$;
+
+CREATE OR REPLACE FUNCTION public.set_agent_tool_facets()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_config JSONB;
+BEGIN
+    SELECT config INTO v_config FROM agent_versions WHERE version_id = NEW.current_version_id;
+
+    SELECT f.has_mcp_tools, f.has_agentpress_tools, f.tools_count, f.tool_names
+    INTO NEW.has_mcp_tools, NEW.has_agentpress_tools, NEW.tools_count, NEW.tool_names
+    FROM public.agent_tool_facets_for_agent(NEW.metadata, v_config) f;
+
+    RETURN NEW;
+END;
+$$;
+
+-- is_suna_default lives in metadata, which can change after insert
+DROP TRIGGER IF EXISTS trigger_agents_tool_facets ON agents;
+CREATE TRIGGER trigger_agents_tool_facets
+    BEFORE INSERT OR UPDATE OF current_version_id, metadata ON agents
+    FOR EACH ROW
+    EXECUTE FUNCTION public.set_agent_tool_facets();
+
+CREATE OR REPLACE FUNCTION public.refresh_agent_tool_facets_from_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE agents a
+    SET (has_mcp_tools, has_agentpress_tools, tools_count, tool_names) = (
+        SELECT f.has_mcp_tools, f.has_agentpress_tools, f.tools_count, f.tool_names
+        FROM public.agent_tool_facets_for_agent(a.metadata, NEW.config) f
+    )
+    WHERE a.current_version_id = NEW.version_id;
+
+    RETURN NEW;
+END;
+$$;
+
+-- Refresh the agents that take their tools from a default set when it changes
+CREATE OR REPLACE FUNCTION public.refresh_agent_tool_facets_from_defaults()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE agents a
+    SET (has_mcp_tools, has_agentpress_tools, tools_count, tool_names) = (
+        SELECT f.has_mcp_tools, f.has_agentpress_tools, f.tools_count, f.tool_names
+        FROM public.agent_tool_facets_for_agent(a.metadata, v.config) f
+    )
+    FROM agents a2
+    LEFT JOIN agent_versions v ON v.version_id = a2.current_version_id
+    WHERE a2.agent_id = a.agent_id
+      AND CASE
+              WHEN NEW.kind = 'suna_default' THEN COALESCE((a.metadata->>'is_suna_default')::boolean, false)
+              ELSE NOT COALESCE((a.metadata->>'is_suna_default')::boolean, false) AND v.config IS NULL
+          END;
+
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trigger_agent_tool_defaults_refresh ON agent_tool_defaults;
+CREATE TRIGGER trigger_agent_tool_defaults_refresh
+    AFTER INSERT OR UPDATE OF agentpress_tools ON agent_tool_defaults
+    FOR EACH ROW
+    EXECUTE FUNCTION public.refresh_agent_tool_facets_from_defaults();
+
+-- Refreshing the derived tool facets is not an edit of the agent, so it keeps
+-- updated_at (and the updated_at sort of the listing) as it was.
+CREATE OR REPLACE FUNCTION update_agents_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (NEW.has_mcp_tools, NEW.has_agentpress_tools, NEW.tools_count, NEW.tool_names)
+           IS DISTINCT FROM (OLD.has_mcp_tools, OLD.has_agentpress_tools, OLD.tools_count, OLD.tool_names)
+       AND to_jsonb(NEW) - ARRAY['has_mcp_tools', 'has_agentpress_tools', 'tools_count', 'tool_names', 'updated_at']
+           = to_jsonb(OLD) - ARRAY['has_mcp_tools', 'has_agentpress_tools', 'tools_count', 'tool_names', 'updated_at'] THEN
+        NEW.updated_at = OLD.updated_at;
+    ELSE
+        NEW.updated_at = NOW();
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill the agents whose facets no longer come from their version alone;
+-- Suna default agents and agents without a version are refreshed again once
+-- the backend writes agent_tool_defaults.
+UPDATE agents a
+SET (has_mcp_tools, has_agentpress_tools, tools_count, tool_names) = (
+    SELECT f.has_mcp_tools, f.has_agentpress_tools, f.tools_count, f.tool_names
+    FROM public.agent_tool_facets_for_agent(a.metadata, v.config) f
+)
+FROM agents a2
+LEFT JOIN agent_versions v ON v.version_id = a2.current_version_id
+WHERE a2.agent_id = a.agent_id
+  AND (COALESCE((a.metadata->>'is_suna_default')::boolean, false) OR v.config IS NULL);
+
+COMMENT ON TABLE agent_tool_defaults IS 'Agentpress tools of Suna default agents and of agents without a version, written by the backend on startup for the tool facets';
+
+COMMIT;
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tests for knowledge base chunking and ranking: chunk_text boundaries and
+overlap, BM25 scoring and reciprocal rank fusion with embeddings.
+"""
+
+import sys
+import os
+import asyncio
+import glob
+import re
+from collections import Counter
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from knowledge_base.retrieval import (
+    INDEXED_USAGE_CONTEXTS,
+    BM25Index,
+    EmbeddingBackend,
+    KnowledgeBaseIndex,
+    KnowledgeChunk,
+    chunk_text,
+    tokenize,
+)
+
+
+def make_chunk(entry_id: str, content: str, chunk_index: int = 0, embedding=None) -> KnowledgeChunk:
+    term_freqs = Counter(tokenize(content))
+    return KnowledgeChunk(
+        entry_id=entry_id,
+        chunk_index=chunk_index,
+        content=content,
+        term_freqs=dict(term_freqs),
+        length=sum(term_freqs.values()),
+        embedding=embedding,
+    )
+
+
+class FixedEmbeddingBackend(EmbeddingBackend):
+    model_name = "test-embedding"
+
+    def __init__(self, query_embedding=None, error: Exception = None):
+        self.query_embedding = query_embedding
+        self.error = error
+
+    async def embed(self, texts):
+        if self.error:
+            raise self.error
+        return [self.query_embedding for _ in texts]
+
+
+def test_chunk_text_short_and_empty_text():
+    assert chunk_text("  short entry  ") == ["short entry"]
+    assert chunk_text("   ") == []
+
+
+def test_chunk_text_respects_max_chars_and_covers_text():
+    words = [f"word{i}" for i in range(400)]
+    text = " ".join(words)
+    chunks = chunk_text(text, max_chars=200, overlap=50)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    chunked_words = set(" ".join(chunks).split())
+    assert chunked_words == set(words)
+
+
+def test_chunk_text_overlaps_on_word_boundaries():
+    text = " ".join(f"word{i}" for i in range(400))
+    chunks = chunk_text(text, max_chars=200, overlap=50)
+
+    for previous, current in zip(chunks, chunks[1:]):
+        first_word = current.split()[0]
+        # The chunk starts on a whole word that the previous chunk ended with
+        assert first_word in previous.split()
+        assert previous.index(first_word) >= len(previous) - 50 - len(first_word)
+
+
+def test_chunk_text_prefers_paragraph_breaks():
+    first = "First paragraph sentence. " * 6
+    second = "Second paragraph sentence. " * 6
+    chunks = chunk_text(first.strip() + "\n\n" + second.strip(), max_chars=200, overlap=0)
+
+    assert chunks[0] == first.strip()
+    assert chunks[1].startswith("Second paragraph")
+
+
+def test_bm25_ranks_by_term_frequency_and_rarity():
+    index = BM25Index([
+        make_chunk("common", "deploy the service with docker"),
+        make_chunk("rare", "rotate the kubernetes credentials"),
+        make_chunk("repeated", "kubernetes kubernetes cluster upgrade"),
+        make_chunk("unrelated", "quarterly revenue report"),
+    ])
+
+    results = index.search("kubernetes credentials", top_k=10)
+    ranked = [chunk.entry_id for chunk, _ in results]
+
+    assert ranked[0] == "rare"
+    assert set(ranked) == {"rare", "repeated"}
+    assert all(score > 0 for _, score in results)
+
+
+def test_bm25_top_k_and_no_match():
+    index = BM25Index([make_chunk(f"entry{i}", f"python tips part {i}") for i in range(5)])
+
+    assert len(index.search("python", top_k=3)) == 3
+    assert index.search("haskell", top_k=3) == []
+    assert BM25Index([]).search("python", top_k=3) == []
+
+
+def test_rrf_promotes_chunks_ranked_by_both_retrievers():
+    lexical_best = make_chunk("lexical", "billing billing invoice")
+    both = make_chunk("both", "billing refund policy", embedding=[1.0, 0.0])
+    dense_only = make_chunk("dense", "how money is returned to customers", embedding=[0.9, 0.1])
+    index = BM25Index([lexical_best, both, dense_only])
+    knowledge_base = KnowledgeBaseIndex(embedding_backend=FixedEmbeddingBackend([1.0, 0.0]))
+
+    results = asyncio.run(knowledge_base.search(index, "billing", top_k=3))
+
+    assert [chunk.entry_id for chunk in results] == ["both", "lexical", "dense"]
+
+
+def test_search_falls_back_to_bm25_when_embedding_fails():
+    index = BM25Index([make_chunk("a", "billing invoice"), make_chunk("b", "travel policy")])
+    knowledge_base = KnowledgeBaseIndex(embedding_backend=FixedEmbeddingBackend(error=RuntimeError("down")))
+
+    results = asyncio.run(knowledge_base.search(index, "billing", top_k=3))
+
+    assert [chunk.entry_id for chunk in results] == ["a"]
+
+
+def test_embedding_backend_requires_embed():
+    class IncompleteBackend(EmbeddingBackend):
+        model_name = "incomplete"
+
+    with pytest.raises(TypeError):
+        IncompleteBackend()
+
+
+def test_indexed_usage_contexts_match_full_context_rpc():
+    # Small knowledge bases go through the RPC, large ones through retrieval;
+    # both must draw on the same entries
+    migrations_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "supabase", "migrations")
+    latest = None
+    for path in sorted(glob.glob(os.path.join(migrations_dir, "*.sql"))):
+        with open(path) as f:
+            sql = f.read()
+        match = re.search(
+            r"CREATE OR REPLACE FUNCTION get_agent_knowledge_base_context\(.*?usage_context IN \(([^)]*)\)",
+            sql,
+            re.DOTALL,
+        )
+        if match:
+            latest = match.group(1)
+
+    assert latest is not None
+    assert re.findall(r"'(\w+)'", latest) == INDEXED_USAGE_CONTEXTS
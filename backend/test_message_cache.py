@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tests for MessageCache: incremental loads above the watermark, the lookback
+re-read that picks up rows committed out of order, and reloads when the
+thread's epoch changes.
+"""
+
+import sys
+import os
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from agentpress import message_cache
+from agentpress.message_cache import MessageCache
+
+T0 = datetime(2025, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+class FakeQuery:
+    """Just enough of the PostgREST query builder for MessageCache._fetch_rows."""
+
+    def __init__(self, table):
+        self.table = table
+        self.filters = {}
+        self.since = None
+        self.bounds = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def gte(self, column, value):
+        self.since = datetime.fromisoformat(value)
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    async def execute(self):
+        self.table.queries.append(self.since)
+        rows = [
+            row for row in sorted(self.table.rows, key=lambda row: row['created_at'])
+            if row['thread_id'] == self.filters['thread_id']
+            and (self.since is None or datetime.fromisoformat(row['created_at']) >= self.since)
+        ]
+        start, end = self.bounds
+        return type("Result", (), {"data": rows[start:end + 1]})()
+
+
+class FakeMessagesTable:
+    def __init__(self):
+        self.rows = []
+        self.queries = []
+
+    def insert(self, message_id, seconds, thread_id="thread-1"):
+        self.rows.append({
+            'thread_id': thread_id,
+            'message_id': message_id,
+            'content': json.dumps({"role": "user", "content": message_id}),
+            'created_at': (T0 + timedelta(seconds=seconds)).isoformat(),
+        })
+
+    def delete(self, message_id):
+        self.rows = [row for row in self.rows if row['message_id'] != message_id]
+
+
+class FakeDB:
+    def __init__(self, table):
+        self.table_data = table
+
+    @property
+    async def client(self):
+        table = self.table_data
+        return type("Client", (), {"table": lambda _, name: FakeQuery(table)})()
+
+
+@pytest.fixture
+def messages(monkeypatch):
+    table = FakeMessagesTable()
+    epochs = {}
+
+    async def fake_get(key):
+        return epochs.get(key)
+
+    monkeypatch.setattr(message_cache.redis, "get", fake_get)
+    table.epochs = epochs
+    return table
+
+
+def ids(messages_list):
+    return [message['message_id'] for message in messages_list]
+
+
+def test_incremental_load_only_reads_from_the_watermark(messages):
+    messages.insert("m1", 0)
+    messages.insert("m2", 60)
+    cache = MessageCache(FakeDB(messages))
+
+    assert ids(asyncio.run(cache.get_messages("thread-1"))) == ["m1", "m2"]
+    messages.insert("m3", 120)
+    assert ids(asyncio.run(cache.get_messages("thread-1"))) == ["m1", "m2", "m3"]
+
+    # The second load starts one lookback window before the newest row seen
+    assert messages.queries == [None, T0 + timedelta(seconds=60) - message_cache.LOOKBACK_WINDOW]
+    assert cache.stats()["full_loads"] == 1
+    assert cache.stats()["incremental_loads"] == 1
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 3
+
+
+def test_lookback_picks_up_late_rows_in_order_without_duplicates(messages):
+    messages.insert("m1", 0)
+    messages.insert("m3", 10)
+    cache = MessageCache(FakeDB(messages))
+    asyncio.run(cache.get_messages("thread-1"))
+
+    # Committed after m3 was read, but stamped before it and within the window
+    messages.insert("m2", 7)
+    result = asyncio.run(cache.get_messages("thread-1"))
+
+    assert ids(result) == ["m1", "m2", "m3"]
+    assert cache.stats()["misses"] == 3
+
+
+def test_epoch_change_reloads_thread(messages):
+    messages.insert("m1", 0)
+    messages.insert("m2", 60)
+    cache = MessageCache(FakeDB(messages))
+    asyncio.run(cache.get_messages("thread-1"))
+
+    messages.delete("m1")
+    # Without an epoch bump the deleted row stays cached
+    assert ids(asyncio.run(cache.get_messages("thread-1"))) == ["m1", "m2"]
+
+    messages.epochs[message_cache._epoch_key("thread-1")] = "1"
+    assert ids(asyncio.run(cache.get_messages("thread-1"))) == ["m2"]
+    assert cache.stats()["full_loads"] == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_returned_list_is_a_copy_of_shared_messages(messages):
+    messages.insert("m1", 0)
+    cache = MessageCache(FakeDB(messages))
+
+    first = asyncio.run(cache.get_messages("thread-1"))
+    first.append({"role": "user", "content": "temporary"})
+    second = asyncio.run(cache.get_messages("thread-1"))
+
+    assert ids(second) == ["m1"]
+    assert second[0] is first[0]
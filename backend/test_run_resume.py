@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Tests for the decision a resumed agent run makes when its thread ends with an
+assistant message.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.run_checkpoint import RunCheckpoint, should_rerun_interrupted_iteration
+
+
+def make_checkpoint(**kwargs) -> RunCheckpoint:
+    values = {"agent_run_id": "run-1", "actor_kwargs": {}, "last_message_id": "msg-user", "resumes": 1}
+    values.update(kwargs)
+    return RunCheckpoint(**values)
+
+
+def test_fresh_run_stops_on_assistant_message():
+    assert not should_rerun_interrupted_iteration(None, "msg-assistant")
+    assert not should_rerun_interrupted_iteration(make_checkpoint(resumes=0), "msg-assistant")
+
+
+def test_reruns_iteration_interrupted_after_saving_assistant_message():
+    # The assistant message was saved during the interrupted iteration, its tool results were not
+    assert should_rerun_interrupted_iteration(make_checkpoint(), "msg-assistant")
+
+
+def test_stops_when_interrupted_iteration_had_finished():
+    checkpoint = make_checkpoint(iteration_finished=True)
+    assert not should_rerun_interrupted_iteration(checkpoint, "msg-assistant")
+
+
+def test_stops_when_assistant_message_predates_interrupted_iteration():
+    checkpoint = make_checkpoint(last_message_id="msg-assistant")
+    assert not should_rerun_interrupted_iteration(checkpoint, "msg-assistant")
+
+
+def test_decision_survives_checkpoint_round_trip():
+    checkpoint = RunCheckpoint.from_json(make_checkpoint(iteration_count=3).to_json())
+    assert checkpoint.iteration_count == 3
+    assert should_rerun_interrupted_iteration(checkpoint, "msg-assistant")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for RunResponseWriter: responses buffered by an agent run reach the
+stream in order, also when the writer is closed while a flush is in progress.
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.run_stream import RunResponseWriter
+
+
+class SlowStream:
+    """Stand-in for RunResponseStream whose writes wait until released."""
+
+    def __init__(self):
+        self.agent_run_id = "run-1"
+        self.entries = []
+        self.write_started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.fail_next = False
+
+    async def append_many(self, batch):
+        self.write_started.set()
+        await self.release.wait()
+        if self.fail_next:
+            self.fail_next = False
+            raise ConnectionError("redis unavailable")
+        self.entries.extend(batch)
+
+
+def test_close_during_flush_keeps_every_response():
+    async def scenario():
+        stream = SlowStream()
+        writer = RunResponseWriter(stream, flush_interval_ms=1)
+        writer.start()
+        await writer.write("chunk-1")
+        await asyncio.wait_for(stream.write_started.wait(), 1)
+
+        # The periodic flusher is now mid-write; the final responses arrive and the run ends
+        await writer.write("completed")
+        close = asyncio.create_task(writer.close())
+        await asyncio.sleep(0.01)
+        stream.release.set()
+        await asyncio.wait_for(close, 1)
+        return stream.entries, writer.stats()
+
+    entries, stats = asyncio.run(scenario())
+    assert entries == ["chunk-1", "completed"]
+    assert stats["pending"] == 0
+
+
+def test_cancelled_flush_puts_batch_back():
+    async def scenario():
+        stream = SlowStream()
+        writer = RunResponseWriter(stream)
+        await writer.write("chunk-1")
+        flush = asyncio.create_task(writer.flush())
+        await asyncio.wait_for(stream.write_started.wait(), 1)
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+
+        await writer.write("chunk-2")
+        stream.release.set()
+        await writer.close()
+        return stream.entries
+
+    assert asyncio.run(scenario()) == ["chunk-1", "chunk-2"]
+
+
+def test_failed_flush_is_retried_in_order():
+    async def scenario():
+        stream = SlowStream()
+        stream.release.set()
+        stream.fail_next = True
+        writer = RunResponseWriter(stream, flush_batch_size=2)
+        await writer.write("chunk-1")
+        await writer.write("chunk-2")
+        await writer.write("chunk-3")
+        await writer.close()
+        return stream.entries
+
+    assert asyncio.run(scenario()) == ["chunk-1", "chunk-2", "chunk-3"]
@@ -7,7 +7,8 @@ from services.supabase import DBConnection
 from services import redis
 from utils.logger import logger, structlog
 from utils.config import config
-from run_agent_background import run_agent_background
+from services import run_scheduler, active_runs
+from run_agent_background import update_agent_run_status
 from .trigger_service import TriggerEvent, TriggerResult
 from .utils import format_workflow_for_llm
 
@@ -389,6 +390,8 @@ class AgentExecutor:
         if not can_run:
             raise ValueError(f"Billing check failed: {message}")
         
+        await run_scheduler.admit(client, account_id)
+        
         agent_run = await client.table('agent_runs').insert({
             "thread_id": thread_id,
             "status": "running",
@@ -407,31 +410,41 @@ class AgentExecutor:
         
         agent_run_id = agent_run.data[0]['id']
         
-        await self._register_agent_run(agent_run_id)
-        
-        run_agent_background.send(
-            agent_run_id=agent_run_id,
-            thread_id=thread_id,
-            instance_id="trigger_executor",
-            project_id=project_id,
-            model_name=model_name,
-            enable_thinking=False,
-            reasoning_effort="low",
-            stream=False,
-            enable_context_manager=True,
-            agent_config=agent_config,
-            request_id=structlog.contextvars.get_contextvars().get('request_id'),
-        )
+        await self._register_agent_run(account_id, agent_run_id, thread_id)
+        
+        try:
+            await run_scheduler.submit(
+                account_id,
+                agent_run_id,
+                origin=run_scheduler.ORIGIN_TRIGGER,
+                thread_id=thread_id,
+                instance_id="trigger_executor",
+                project_id=project_id,
+                model_name=model_name,
+                enable_thinking=False,
+                reasoning_effort="low",
+                stream=False,
+                enable_context_manager=True,
+                agent_config=agent_config,
+                request_id=structlog.contextvars.get_contextvars().get('request_id'),
+            )
+        except run_scheduler.RunQueueFullError as e:
+            await update_agent_run_status(client, agent_run_id, "failed", error=str(e))
+            raise
         
         logger.debug(f"Started agent execution: {agent_run_id}")
         return agent_run_id
     
-    async def _register_agent_run(self, agent_run_id: str) -> None:
+    async def _register_agent_run(self, account_id: str, agent_run_id: str, thread_id: str) -> None:
         try:
             instance_key = f"active_run:trigger_executor:{agent_run_id}"
             await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
         except Exception as e:
             logger.warning(f"Failed to register agent run in Redis: {e}")
+        try:
+            await active_runs.register_run(account_id, agent_run_id, thread_id)
+        except Exception as e:
+            logger.warning(f"Failed to add agent run {agent_run_id} to active runs of {account_id}: {str(e)}")
 
 
 class WorkflowExecutor:
@@ -696,6 +709,8 @@ class WorkflowExecutor:
         if not can_run:
             raise ValueError(f"Billing check failed for workflow: {message}")
         
+        await run_scheduler.admit(client, account_id)
+        
         agent_run = await client.table('agent_runs').insert({
             "thread_id": thread_id,
             "status": "running",
@@ -713,32 +728,42 @@ class WorkflowExecutor:
         
         agent_run_id = agent_run.data[0]['id']
         
-        await self._register_workflow_run(agent_run_id)
-        
-        run_agent_background.send(
-            agent_run_id=agent_run_id,
-            thread_id=thread_id,
-            instance_id=getattr(config, 'INSTANCE_ID', 'default'),
-            project_id=project_id,
-            model_name=model_name,
-            enable_thinking=False,
-            reasoning_effort='medium',
-            stream=False,
-            enable_context_manager=True,
-            agent_config=agent_config,
-            request_id=None,
-        )
+        await self._register_workflow_run(account_id, agent_run_id, thread_id)
+        
+        try:
+            await run_scheduler.submit(
+                account_id,
+                agent_run_id,
+                origin=run_scheduler.ORIGIN_WORKFLOW,
+                thread_id=thread_id,
+                instance_id=getattr(config, 'INSTANCE_ID', 'default'),
+                project_id=project_id,
+                model_name=model_name,
+                enable_thinking=False,
+                reasoning_effort='medium',
+                stream=False,
+                enable_context_manager=True,
+                agent_config=agent_config,
+                request_id=None,
+            )
+        except run_scheduler.RunQueueFullError as e:
+            await update_agent_run_status(client, agent_run_id, "failed", error=str(e))
+            raise
         
         logger.debug(f"Started workflow agent execution: {agent_run_id}")
         return agent_run_id
     
-    async def _register_workflow_run(self, agent_run_id: str) -> None:
+    async def _register_workflow_run(self, account_id: str, agent_run_id: str, thread_id: str) -> None:
         try:
             instance_id = getattr(config, 'INSTANCE_ID', 'default')
             instance_key = f"active_run:{instance_id}:{agent_run_id}"
             await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
         except Exception as e:
             logger.warning(f"Failed to register workflow run in Redis: {e}")
+        try:
+            await active_runs.register_run(account_id, agent_run_id, thread_id)
+        except Exception as e:
+            logger.warning(f"Failed to add workflow run {agent_run_id} to active runs of {account_id}: {str(e)}")
 
 
 def get_execution_service(db_connection: DBConnection) -> ExecutionService:
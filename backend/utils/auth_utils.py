@@ -9,6 +9,7 @@ import os
 import base64
 import hashlib
 import hmac
+import time
 from services.supabase import DBConnection
 from services import redis
 
@@ -396,10 +397,50 @@ async def verify_and_get_agent_authorization(client, agent_id: str, user_id: str
         structlog.error(f"Error verifying agent access for agent {agent_id}, user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to verify agent access")
 
+# Positive thread access decisions are cached per thread in a Redis hash of
+# user_id -> access. Nothing invalidates them: threads and projects are deleted,
+# sharing is toggled and account members are removed by the frontend directly
+# in Supabase, so a revoked user keeps access for at most this TTL.
+THREAD_ACCESS_TTL = 30
+
+
+def _thread_access_key(thread_id: str) -> str:
+    return f"thread_access:{thread_id}"
+
+
+async def _get_cached_thread_access(thread_id: str, user_id: str) -> Optional[str]:
+    try:
+        cached = await redis.hget(_thread_access_key(thread_id), user_id)
+    except Exception as e:
+        structlog.get_logger().warning(f"Thread access cache lookup failed for thread {thread_id}: {e}")
+        return None
+    if not cached:
+        return None
+    # Entries carry their own timestamp, since writes for other users refresh the hash TTL
+    access, _, cached_at = cached.partition(":")
+    if not cached_at or time.time() - float(cached_at) > THREAD_ACCESS_TTL:
+        return None
+    return access
+
+
+async def _cache_thread_access(thread_id: str, user_id: str, access: str):
+    try:
+        redis_client = await redis.get_client()
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hset(_thread_access_key(thread_id), user_id, f"{access}:{time.time()}")
+        pipe.expire(_thread_access_key(thread_id), THREAD_ACCESS_TTL)
+        await pipe.execute()
+    except Exception as e:
+        structlog.get_logger().warning(f"Failed to cache thread access for thread {thread_id}: {e}")
+
+
 async def verify_and_authorize_thread_access(client, thread_id: str, user_id: str):
     """
     Verify that a user has access to a specific thread based on account membership.
     
+    Granted decisions are cached for THREAD_ACCESS_TTL seconds; on a miss the
+    thread, project and membership checks run in a single authorize_thread_access RPC.
+    
     Args:
         client: The Supabase client
         thread_id: The thread ID to check access for
@@ -411,32 +452,21 @@ async def verify_and_authorize_thread_access(client, thread_id: str, user_id: st
     Raises:
         HTTPException: If the user doesn't have access to the thread
     """
+    if await _get_cached_thread_access(thread_id, user_id):
+        return True
+
     try:
-        # Query the thread to get account information
-        thread_result = await client.table('threads').select('*').eq('thread_id', thread_id).execute()
+        result = await client.rpc('authorize_thread_access', {
+            'p_thread_id': thread_id,
+            'p_user_id': user_id
+        }).execute()
+        access = (result.data or {}).get('access')
 
-        if not thread_result.data or len(thread_result.data) == 0:
+        if access == 'not_found':
             raise HTTPException(status_code=404, detail="Thread not found")
-        
-        thread_data = thread_result.data[0]
-
-        if thread_data['account_id'] == user_id:
+        if access in ('owner', 'public', 'member'):
+            await _cache_thread_access(thread_id, user_id, access)
             return True
-        
-        # Check if project is public
-        project_id = thread_data.get('project_id')
-        if project_id:
-            project_result = await client.table('projects').select('is_public').eq('project_id', project_id).execute()
-            if project_result.data and len(project_result.data) > 0:
-                if project_result.data[0].get('is_public'):
-                    return True
-            
-        account_id = thread_data.get('account_id')
-        # When using service role, we need to manually check account membership instead of using current_user_account_role
-        if account_id:
-            account_user_result = await client.schema('basejump').from_('account_user').select('account_role').eq('user_id', user_id).eq('account_id', account_id).execute()
-            if account_user_result.data and len(account_user_result.data) > 0:
-                return True
         raise HTTPException(status_code=403, detail="Not authorized to access this thread")
     except HTTPException:
         # Re-raise HTTP exceptions as they are
@@ -1,26 +1,215 @@
+"""
+Two-tier JSON cache: a bounded in-process LRU (L1) in front of Redis (L2).
+
+L1 entries live for at most L1_MAX_TTL seconds, never longer than the Redis
+key. set() and invalidate() publish the key on INVALIDATION_CHANNEL, so every
+API and worker process drops its L1 copy. Concurrent misses for the same key
+share a single Redis read, and get_or_set() also shares a single loader call.
+
+Hit, miss and L2 latency counters are kept per key prefix (the part of the key
+before the first ':') and returned by stats().
+"""
+
+import asyncio
+import copy
 import json
-from typing import Any
-from services.redis import get_client
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from services.redis import get_client, create_pubsub
+from utils.logger import logger
+
+L1_MAX_ENTRIES = 10000
+L1_MAX_TTL = 60
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+_PROCESS_ID = uuid.uuid4().hex
+
+
+class _PrefixStats:
+    __slots__ = ("l1_hits", "l2_hits", "misses", "l2_reads", "l2_read_ms")
+
+    def __init__(self):
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.l2_reads = 0
+        self.l2_read_ms = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "avg_l2_read_ms": round(self.l2_read_ms / self.l2_reads, 3) if self.l2_reads else 0.0,
+        }
 
 
 class _cache:
-    async def get(self, key: str):
+    def __init__(self, max_entries: int = L1_MAX_ENTRIES, l1_max_ttl: int = L1_MAX_TTL):
+        self.max_entries = max_entries
+        self.l1_max_ttl = l1_max_ttl
+        self._l1: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats: Dict[str, _PrefixStats] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._listener_retry_at = 0.0
+        # Bumped on every invalidation so in-flight L2 reads don't refill L1 with stale values
+        self._epoch = 0
+
+    def _prefix_stats(self, key: str) -> _PrefixStats:
+        prefix = key.split(":", 1)[0]
+        stats = self._stats.get(prefix)
+        if stats is None:
+            stats = self._stats[prefix] = _PrefixStats()
+        return stats
+
+    def _l1_get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._l1.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._l1[key]
+            return False, None
+        self._l1.move_to_end(key)
+        return True, value
+
+    def _l1_set(self, key: str, value: Any, ttl: float):
+        if ttl <= 0:
+            self._l1.pop(key, None)
+            return
+        self._l1[key] = (time.monotonic() + min(ttl, self.l1_max_ttl), value)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.max_entries:
+            self._l1.popitem(last=False)
+
+    def _drop_l1(self, key: str):
+        self._l1.pop(key, None)
+        self._inflight.pop(key, None)
+        self._epoch += 1
+
+    def _ensure_listener(self):
+        if (self._listener is None or self._listener.done()) and time.monotonic() >= self._listener_retry_at:
+            self._listener = asyncio.create_task(self._listen_for_invalidations())
+
+    async def _listen_for_invalidations(self):
+        pubsub = None
+        try:
+            pubsub = await create_pubsub()
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                origin, _, key = message["data"].partition(":")
+                if origin != _PROCESS_ID:
+                    self._drop_l1(key)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Entries still expire after l1_max_ttl; the listener restarts on a later call
+            logger.warning(f"Cache invalidation listener stopped: {e}")
+            self._l1.clear()
+            self._epoch += 1
+            self._listener_retry_at = time.monotonic() + 5
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.unsubscribe(INVALIDATION_CHANNEL)
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    async def _publish_invalidation(self, key: str):
+        try:
+            redis = await get_client()
+            await redis.publish(INVALIDATION_CHANNEL, f"{_PROCESS_ID}:{key}")
+        except Exception as e:
+            logger.warning(f"Failed to publish cache invalidation for {key}: {e}")
+
+    async def _read_l2(self, key: str) -> Any:
+        stats = self._prefix_stats(key)
+        epoch = self._epoch
+        start = time.monotonic()
         redis = await get_client()
-        key = f"cache:{key}"
-        result = await redis.get(key)
-        if result:
-            return json.loads(result)
-        return None
+        pipe = redis.pipeline(transaction=False)
+        pipe.get(f"cache:{key}")
+        pipe.pttl(f"cache:{key}")
+        raw, pttl = await pipe.execute()
+        stats.l2_reads += 1
+        stats.l2_read_ms += (time.monotonic() - start) * 1000
+
+        value = json.loads(raw) if raw else None
+        if value is not None and pttl and pttl > 0 and epoch == self._epoch:
+            self._l1_set(key, value, pttl / 1000)
+        return value
+
+    async def get(self, key: str):
+        self._ensure_listener()
+        stats = self._prefix_stats(key)
+        found, value = self._l1_get(key)
+        if found:
+            stats.l1_hits += 1
+            return copy.deepcopy(value)
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._read_l2(key))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda done: self._inflight.get(key) is done and self._inflight.pop(key))
+        value = await asyncio.shield(inflight)
+
+        if value is None:
+            stats.misses += 1
+            return None
+        stats.l2_hits += 1
+        return copy.deepcopy(value)
 
     async def set(self, key: str, value: Any, ttl: int = 15 * 60):
+        self._ensure_listener()
         redis = await get_client()
-        key = f"cache:{key}"
-        await redis.set(key, json.dumps(value), ex=ttl)
+        await redis.set(f"cache:{key}", json.dumps(value), ex=ttl)
+        self._drop_l1(key)
+        if value is not None:
+            self._l1_set(key, copy.deepcopy(value), ttl)
+        await self._publish_invalidation(key)
+
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int = 15 * 60):
+        """Get a cached value, calling loader once per process on a miss.
+
+        Concurrent callers that miss on the same key wait for the same loader
+        call instead of each recomputing the value.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        load_key = f"load:{key}"
+        inflight = self._inflight.get(load_key)
+        if inflight is None:
+            async def load():
+                result = await loader()
+                await self.set(key, result, ttl=ttl)
+                return result
+
+            inflight = asyncio.ensure_future(load())
+            self._inflight[load_key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(load_key, None))
+        return copy.deepcopy(await asyncio.shield(inflight))
 
     async def invalidate(self, key: str):
+        self._drop_l1(key)
         redis = await get_client()
-        key = f"cache:{key}"
-        await redis.delete(key)
+        await redis.delete(f"cache:{key}")
+        await self._publish_invalidation(key)
+
+    delete = invalidate
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return hit/miss counters and L2 read latency per key prefix."""
+        return {prefix: stats.as_dict() for prefix, stats in self._stats.items()}
 
 
 Cache = _cache()
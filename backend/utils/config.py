@@ -331,6 +331,9 @@ class Configuration:
     LANGFUSE_SECRET_KEY: Optional[str] = None
     LANGFUSE_HOST: str = "https://cloud.langfuse.com"
 
+    # Knowledge base retrieval: embedding model used alongside BM25 (BM25 only when unset)
+    KB_EMBEDDING_MODEL: Optional[str] = None
+
     # Admin API key for server-side operations
     KORTIX_ADMIN_API_KEY: Optional[str] = None
 
@@ -340,6 +343,14 @@ class Configuration:
     
     # Agent execution limits (can be overridden via environment variable)
     _MAX_PARALLEL_AGENT_RUNS_ENV: Optional[str] = None
+
+    # Agent run scheduler (services.run_scheduler): concurrent runs per LLM
+    # provider across all workers, optional per-provider overrides such as
+    # "anthropic=200,openai=100", and how many runs an account may have waiting.
+    # Runs per account are bounded by MAX_PARALLEL_AGENT_RUNS.
+    AGENT_RUN_PROVIDER_CONCURRENCY: int = 100
+    AGENT_RUN_PROVIDER_CONCURRENCY_OVERRIDES: Optional[str] = None
+    AGENT_RUN_MAX_QUEUED_PER_ACCOUNT: int = 100
     
     # Agent limits per billing tier
     # Note: These limits are bypassed in local mode (ENV_MODE=local) where unlimited agents are allowed
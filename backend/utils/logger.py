@@ -1,40 +1,288 @@
-import structlog, logging, os
+"""
+Structured logging setup shared by the API and the worker.
 
-ENV_MODE = os.getenv("ENV_MODE", "LOCAL")
+Environment:
+    LOGGING_LEVEL: Global level (default INFO)
+    LOGGING_LEVEL_OVERRIDES: Per-module levels, e.g.
+        "agentpress.response_processor=WARNING,services.redis=DEBUG"; a
+        module takes the level of its longest matching package prefix
+    LOGGING_SAMPLE_PER_SECOND: Below WARNING, at most this many events per
+        second are kept from each call site (0 disables sampling); the next
+        kept event carries the number dropped as sampled_out
+    LOGGING_BACKGROUND: "true" to render and write events on a background
+        thread, so callers only pay for a queue put (default outside LOCAL)
+
+Disabled levels cost a no-op call, provided hot paths pass %-style arguments
+(logger.debug("Executing tool %s", name)) rather than building an f-string.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
 
-# Set default logging level based on environment
-if ENV_MODE.upper() == "PRODUCTION":
-    default_level = "DEBUG"
-else:
-    default_level = "INFO"
+import structlog
+
+ENV_MODE = os.getenv("ENV_MODE", "LOCAL")
 
 LOGGING_LEVEL = logging.getLevelNamesMapping().get(
-    os.getenv("LOGGING_LEVEL", default_level).upper(), 
-    logging.DEBUG if ENV_MODE.upper() == "PRODUCTION" else logging.INFO
+    os.getenv("LOGGING_LEVEL", "INFO").upper(),
+    logging.INFO
+)
+
+_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "warn": logging.WARNING,
+    "error": logging.ERROR,
+    "exception": logging.ERROR,
+    "critical": logging.CRITICAL,
+    "fatal": logging.CRITICAL,
+}
+
+
+def _parse_level_overrides(value: str) -> Dict[str, int]:
+    overrides = {}
+    for item in value.split(","):
+        module, _, level = item.partition("=")
+        level_no = logging.getLevelNamesMapping().get(level.strip().upper())
+        if module.strip() and level_no is not None:
+            overrides[module.strip()] = level_no
+    return overrides
+
+
+LEVEL_OVERRIDES = _parse_level_overrides(os.getenv("LOGGING_LEVEL_OVERRIDES", ""))
+SAMPLE_PER_SECOND = int(os.getenv("LOGGING_SAMPLE_PER_SECOND", "0" if ENV_MODE.upper() == "LOCAL" else "20"))
+BACKGROUND_LOGGING = os.getenv("LOGGING_BACKGROUND", "false" if ENV_MODE.upper() == "LOCAL" else "true").lower() == "true"
+LOG_QUEUE_SIZE = 10000
+
+
+def _caller_frame():
+    """First frame outside structlog and this module, found without inspect."""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get("__name__", "").startswith(("structlog", __name__)):
+        frame = frame.f_back
+    return frame
+
+
+class HotPathFilter:
+    """Applies per-module levels and samples repeated low-level events per call site.
+
+    Looks up the caller with one frame walk, and only when an override or
+    sampling is configured.
+    """
+
+    def __init__(self, default_level: int, overrides: Dict[str, int], sample_per_second: int):
+        self.default_level = default_level
+        self.overrides = overrides
+        self.sample_per_second = sample_per_second
+        self._module_levels: Dict[str, int] = {}
+        # (filename, lineno) -> [window start, events kept, events dropped]
+        self._windows: Dict[Tuple[str, int], list] = {}
+
+    def _module_level(self, module: str) -> int:
+        level = self._module_levels.get(module)
+        if level is None:
+            level = self.default_level
+            matched = ""
+            for prefix, override in self.overrides.items():
+                if (module == prefix or module.startswith(prefix + ".")) and len(prefix) > len(matched):
+                    matched, level = prefix, override
+            self._module_levels[module] = level
+        return level
+
+    def __call__(self, logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+        level = _LEVELS.get(method_name, logging.INFO)
+        sample = self.sample_per_second and level < logging.WARNING
+        if not self.overrides and not sample:
+            return event_dict
+
+        frame = _caller_frame()
+        if frame is None:
+            return event_dict
+        if self.overrides and level < self._module_level(frame.f_globals.get("__name__", "")):
+            raise structlog.DropEvent
+
+        if sample:
+            now = time.monotonic()
+            window = self._windows.get((frame.f_code.co_filename, frame.f_lineno))
+            if window is None:
+                self._windows[(frame.f_code.co_filename, frame.f_lineno)] = [now, 1, 0]
+            elif now - window[0] >= 1.0:
+                if window[2]:
+                    event_dict["sampled_out"] = window[2]
+                window[:] = [now, 1, 0]
+            elif window[1] < self.sample_per_second:
+                window[1] += 1
+            else:
+                window[2] += 1
+                raise structlog.DropEvent
+        return event_dict
+
+
+_callsite_adder = structlog.processors.CallsiteParameterAdder(
+    {
+        structlog.processors.CallsiteParameter.FILENAME,
+        structlog.processors.CallsiteParameter.FUNC_NAME,
+        structlog.processors.CallsiteParameter.LINENO,
+    },
+    additional_ignores=[__name__],
 )
 
-renderer = [structlog.processors.JSONRenderer()]
-# if ENV_MODE.lower() == "local".lower() or ENV_MODE.lower() == "staging".lower():
-#     renderer = [structlog.dev.ConsoleRenderer()]
 
-structlog.configure(
-    processors=[
-        structlog.stdlib.add_log_level,
+def add_callsite_for_warnings(logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Add filename, function and line number to WARNING and above only."""
+    if _LEVELS.get(method_name, logging.INFO) >= logging.WARNING:
+        return _callsite_adder(logger, method_name, event_dict)
+    return event_dict
+
+
+def add_raw_timestamp(logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Record the event time cheaply; BackgroundLogWriter formats it as ISO 8601."""
+    event_dict["timestamp"] = time.time()
+    return event_dict
+
+
+class BackgroundLogWriter:
+    """Renders events as JSON and writes them to stdout from a daemon thread.
+
+    A full queue drops events rather than blocking the caller; the writer
+    reports how many were dropped.
+    """
+
+    def __init__(self, max_queue_size: int = LOG_QUEUE_SIZE):
+        self.max_queue_size = max_queue_size
+        self._renderer = structlog.processors.JSONRenderer()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.events_written = 0
+        self.events_dropped = 0
+        self._dropped_reported = 0
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # The writer thread does not survive a fork
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def enqueue(self, event_dict: Dict[str, Any]):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(event_dict)
+        except queue.Full:
+            self.events_dropped += 1
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 512:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for event_dict in batch:
+                try:
+                    timestamp = event_dict.get("timestamp")
+                    if isinstance(timestamp, float):
+                        event_dict["timestamp"] = datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace("+00:00", "Z")
+                    lines.append(self._renderer(None, "", event_dict))
+                except Exception as e:
+                    lines.append(f'{{"event": "Failed to render log event: {type(e).__name__}", "level": "error"}}')
+            if self.events_dropped > self._dropped_reported:
+                lines.append(f'{{"event": "Dropped {self.events_dropped - self._dropped_reported} log events on a full queue", "level": "warning"}}')
+                self._dropped_reported = self.events_dropped
+            try:
+                sys.stdout.write("\n".join(lines) + "\n")
+                sys.stdout.flush()
+            except Exception:
+                pass
+            self.events_written += len(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self, timeout: float = 2.0):
+        """Wait up to timeout seconds for queued events to be written."""
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.events_written,
+            "dropped": self.events_dropped,
+        }
+
+
+class BackgroundLogger:
+    """structlog logger that hands processed event dicts to a BackgroundLogWriter."""
+
+    def __init__(self, writer: BackgroundLogWriter):
+        self._writer = writer
+
+    def msg(self, **event_dict):
+        self._writer.enqueue(event_dict)
+
+    debug = info = warning = warn = error = critical = exception = fatal = failure = err = msg
+
+
+def configure_logging(
+    level: int = LOGGING_LEVEL,
+    overrides: Dict[str, int] = LEVEL_OVERRIDES,
+    sample_per_second: int = SAMPLE_PER_SECOND,
+    background: bool = BACKGROUND_LOGGING,
+) -> Optional[BackgroundLogWriter]:
+    """(Re)configure structlog; loggers created afterwards use the new setup.
+
+    Returns:
+        The background writer, or None when events are written synchronously
+    """
+    writer = BackgroundLogWriter() if background else None
+    processors = [structlog.stdlib.add_log_level]
+    if overrides or sample_per_second:
+        processors.append(HotPathFilter(level, overrides, sample_per_second))
+    processors += [
         structlog.stdlib.PositionalArgumentsFormatter(),
         structlog.processors.dict_tracebacks,
-        structlog.processors.CallsiteParameterAdder(
-            {
-                structlog.processors.CallsiteParameter.FILENAME,
-                structlog.processors.CallsiteParameter.FUNC_NAME,
-                structlog.processors.CallsiteParameter.LINENO,
-            }
-        ),
-        structlog.processors.TimeStamper(fmt="iso"),
+        add_callsite_for_warnings,
+        add_raw_timestamp if writer else structlog.processors.TimeStamper(fmt="iso"),
         structlog.contextvars.merge_contextvars,
-        *renderer,
-    ],
-    cache_logger_on_first_use=True,
-    wrapper_class=structlog.make_filtering_bound_logger(LOGGING_LEVEL),
-)
+    ]
+    if writer is None:
+        processors.append(structlog.processors.JSONRenderer())
+
+    # Overridden modules may log below the global level, so the fast level
+    # check passes the lowest level in use and HotPathFilter does the rest
+    min_level = min([level, *overrides.values()])
+    structlog.configure(
+        processors=processors,
+        cache_logger_on_first_use=True,
+        wrapper_class=structlog.make_filtering_bound_logger(min_level),
+        logger_factory=(lambda *args: BackgroundLogger(writer)) if writer else structlog.PrintLoggerFactory(),
+    )
+    if writer is not None:
+        atexit.register(writer.flush)
+    return writer
+
+
+log_writer = configure_logging()
 
 logger: structlog.stdlib.BoundLogger = structlog.get_logger()
@@ -25,10 +25,11 @@ class PaginationParams:
     page: int = 1
     page_size: int = 20
     cursor: Optional[str] = None
+    max_page_size: int = 100
     
     def __post_init__(self):
         self.page = max(1, self.page)
-        self.page_size = min(max(1, self.page_size), 100)
+        self.page_size = min(max(1, self.page_size), self.max_page_size)
 
 class PaginationService:
     @staticmethod
@@ -159,6 +160,86 @@ class PaginationService:
             pagination=pagination_meta
         )
 
+    @staticmethod
+    async def paginate_keyset(
+        base_query: Any,
+        params: PaginationParams,
+        sort_field: str,
+        descending: bool,
+        id_field: str,
+        count_query: Optional[Any] = None
+    ) -> PaginatedResponse[Dict[str, Any]]:
+        """
+        Paginate by (sort_field, id_field) position instead of OFFSET, so a page
+        costs the same however deep it is. base_query must not be ordered yet.
+        
+        The position of the last row is returned as pagination.next_cursor;
+        pass it back as params.cursor to fetch the next page.
+        """
+        try:
+            if count_query:
+                count_result = await count_query.execute()
+                total_count = count_result.count if count_result.count else 0
+            else:
+                total_count = None
+            
+            query = base_query
+            cursor = PaginationService.parse_cursor(params.cursor) if params.cursor else None
+            if cursor and cursor.get("sort_field") == sort_field:
+                query = PaginationService.apply_keyset_cursor(
+                    query, sort_field, cursor["sort_value"], id_field, cursor["id"], descending
+                )
+            
+            # One extra row tells whether there is a next page
+            query = query.order(sort_field, desc=descending).order(id_field, desc=descending).limit(params.page_size + 1)
+            data_result = await query.execute()
+            items = data_result.data or []
+            has_next = len(items) > params.page_size
+            items = items[:params.page_size]
+            
+            next_cursor = None
+            if has_next and items:
+                last = items[-1]
+                next_cursor = PaginationService.create_cursor(last[id_field], sort_field, last[sort_field])
+            
+            if total_count is None:
+                total_count = len(items)
+            total_pages = max(1, math.ceil(total_count / params.page_size)) if total_count else 0
+            
+            pagination_meta = PaginationMeta(
+                current_page=params.page,
+                page_size=params.page_size,
+                total_items=total_count,
+                total_pages=total_pages,
+                has_next=has_next,
+                has_previous=cursor is not None or params.page > 1,
+                next_cursor=next_cursor
+            )
+            
+            return PaginatedResponse(
+                data=items,
+                pagination=pagination_meta
+            )
+            
+        except Exception as e:
+            logger.error(f"Keyset pagination error: {e}", exc_info=True)
+            raise
+
+    @staticmethod
+    def apply_keyset_cursor(
+        query: Any,
+        sort_field: str,
+        sort_value: Any,
+        id_field: str,
+        item_id: Any,
+        descending: bool
+    ) -> Any:
+        """Restrict query to rows after (sort_value, item_id) in (sort_field, id_field) order."""
+        op = "lt" if descending else "gt"
+        value = _quote_filter_value(sort_value)
+        quoted_id = _quote_filter_value(item_id)
+        return query.or_(f"{sort_field}.{op}.{value},and({sort_field}.eq.{value},{id_field}.{op}.{quoted_id})")
+
     @staticmethod
     def create_cursor(item_id: str, sort_field: str, sort_value: Any) -> str:
         import base64
@@ -182,4 +263,10 @@ class PaginationService:
             return json.loads(cursor_json)
         except Exception as e:
             logger.warning(f"Failed to parse cursor: {e}")
-            return None 
\ No newline at end of file
+            return None 
+
+
+def _quote_filter_value(value: Any) -> str:
+    """Quote a value for a PostgREST logical filter, where , . : ( ) are reserved."""
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
@@ -1,5 +1,5 @@
 from dataclasses import dataclass, asdict
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 import httpx
 from datetime import datetime
 
@@ -96,6 +96,9 @@ class Message:
     agent_id: str
     agent_version_id: str
     metadata: Any
+    retry_of: Optional[str] = None
+    attempt: Optional[int] = None
+    idempotency_key: Optional[str] = None
 
     @property
     def message_type(self) -> MessageType:
@@ -132,6 +135,7 @@ class PaginationInfo:
     limit: int
     total: int
     pages: int
+    next_cursor: Optional[str] = None
 
 
 @dataclass
@@ -140,9 +144,18 @@ class ThreadsResponse:
     pagination: PaginationInfo
 
 
+@dataclass
+class MessagesPaginationInfo:
+    limit: int
+    has_more: bool
+    before_cursor: Optional[str] = None
+    after_cursor: Optional[str] = None
+
+
 @dataclass
 class MessagesResponse:
     messages: List[Message]
+    pagination: Optional[MessagesPaginationInfo] = None
 
 
 @dataclass
@@ -323,12 +336,14 @@ class ThreadsClient:
         self,
         page: int = 1,
         limit: int = 1000,
+        cursor: Optional[str] = None,
     ) -> ThreadsResponse:
-        """Get all threads for the current user with associated project data.
+        """Get threads for the current user with associated project data, newest first.
 
         Args:
-            page: Page number (1-based)
+            page: Page number (1-based); ignored when cursor is given
             limit: Number of items per page (max 1000)
+            cursor: pagination.next_cursor of the previous page
 
         Returns:
             ThreadsResponse containing paginated threads
@@ -337,6 +352,8 @@ class ThreadsClient:
             "page": page,
             "limit": limit,
         }
+        if cursor:
+            params["cursor"] = cursor
 
         response = await self.client.get("/threads", params=params)
         data = self._handle_response(response)
@@ -369,6 +386,26 @@ class ThreadsClient:
 
         return ThreadsResponse(threads=threads, pagination=pagination)
 
+    async def iter_threads(self, page_size: int = 100) -> AsyncIterator[Thread]:
+        """Iterate over all threads of the current user, newest first.
+
+        Pages are fetched lazily as the iteration reaches them.
+
+        Args:
+            page_size: Number of threads fetched per request (max 1000)
+
+        Yields:
+            Thread
+        """
+        cursor = None
+        while True:
+            result = await self.get_threads(limit=page_size, cursor=cursor)
+            for thread in result.threads:
+                yield thread
+            cursor = result.pagination.next_cursor
+            if not cursor:
+                break
+
     async def get_thread(self, thread_id: str) -> Thread:
         """Get a specific thread by ID with complete related data.
 
@@ -400,25 +437,97 @@ class ThreadsClient:
         )
 
     async def get_thread_messages(
-        self, thread_id: str, order: str = "desc"
+        self,
+        thread_id: str,
+        order: str = "desc",
+        limit: Optional[int] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        since_message_id: Optional[str] = None,
+        exclude_types: Optional[List[str]] = None,
     ) -> MessagesResponse:
-        """Get ALL messages for a thread.
+        """Get messages for a thread.
+
+        Without limit or a cursor, ALL messages are returned. Otherwise one page
+        is returned, with cursors in the response pagination.
 
         Args:
             thread_id: The thread ID
             order: Order by created_at: 'asc' or 'desc'
+            limit: Page size (max 1000)
+            before: pagination.before_cursor of a page, to get the older messages
+            after: pagination.after_cursor of a page, to get the newer messages
+            since_message_id: Get the messages created after this message
+            exclude_types: Message types to skip, e.g. ["tool", "cost"]
 
         Returns:
-            MessagesResponse containing all messages
+            MessagesResponse containing the messages
+
+        Raises:
+            RuntimeError: If the server failed partway through streaming the
+                messages, so the response is incomplete
         """
-        params = {"order": order}
+        params: Dict[str, Any] = {"order": order}
+        if limit is not None:
+            params["limit"] = limit
+        if before:
+            params["before"] = before
+        if after:
+            params["after"] = after
+        if since_message_id:
+            params["since_message_id"] = since_message_id
+        if exclude_types:
+            params["exclude_types"] = ",".join(exclude_types)
+
         response = await self.client.get(
             f"/threads/{thread_id}/messages", params=params
         )
         data = self._handle_response(response)
+        if data.get("error"):
+            # Sent with a 200 when a later page failed after streaming began
+            raise RuntimeError(
+                f"Incomplete messages for thread {thread_id} "
+                f"({len(data.get('messages', []))} received): {data['error']}"
+            )
 
         messages = [from_dict(Message, msg_data) for msg_data in data["messages"]]
-        return MessagesResponse(messages=messages)
+        pagination = None
+        if data.get("pagination"):
+            pagination = from_dict(MessagesPaginationInfo, data["pagination"])
+        return MessagesResponse(messages=messages, pagination=pagination)
+
+    async def iter_thread_messages(
+        self,
+        thread_id: str,
+        page_size: int = 100,
+        exclude_types: Optional[List[str]] = None,
+    ) -> AsyncIterator[Message]:
+        """Iterate over the messages of a thread from the newest to the oldest.
+
+        Older pages are fetched lazily as the iteration reaches them.
+
+        Args:
+            thread_id: The thread ID
+            page_size: Number of messages fetched per request (max 1000)
+            exclude_types: Message types to skip, e.g. ["tool", "cost"]
+
+        Yields:
+            Message
+        """
+        before = None
+        while True:
+            result = await self.get_thread_messages(
+                thread_id,
+                order="desc",
+                limit=page_size,
+                before=before,
+                exclude_types=exclude_types,
+            )
+            for message in result.messages:
+                yield message
+            if not result.pagination or not result.pagination.has_more:
+                break
+            before = result.pagination.before_cursor
 
     async def add_message_to_thread(self, thread_id: str, message: str) -> Message:
         """Add a simple message to a thread.